@@ -0,0 +1,481 @@
+__author__ = 'Christopher Bock'
+
+import bisect
+from array import array
+
+from RootEnvironment import get_root_environment
+
+
+def _double_buffer(values):
+    """
+    Returns values as a contiguous buffer of doubles which can be handed to ROOT, copying only if necessary.
+    """
+    if isinstance(values, array) and values.typecode == 'd':
+        return values
+    try:
+        numpy = get_root_environment().import_module('numpy')
+    except ImportError:
+        return array('d', values)
+    values = numpy.ascontiguousarray(values, 'float64')
+    if not values.flags.writeable:
+        # e.g. views onto a memory mapped HistogramStore, ROOT does not accept read-only buffers everywhere
+        values = values.copy()
+    return values
+
+
+def _get_axis_attributes(axis, n_bins=None):
+    attributes = dict([(name, getattr(axis, 'Get' + name)()) for name, default in ArrayAxis.attribute_defaults])
+    attributes['CenterTitle'] = bool(axis.GetCenterTitle())
+    if n_bins is not None:
+        first, last = axis.GetFirst(), axis.GetLast()
+        if first > 1 or last < n_bins:
+            attributes['Range'] = (first, last)
+    return attributes
+
+
+def _apply_axis_attributes(axis, attributes):
+    for name, value in sorted(attributes.items()):
+        if name == 'CenterTitle':
+            axis.CenterTitle(value)
+        elif name in ('Range', 'RangeUser'):
+            getattr(axis, 'Set' + name)(*value)
+        else:
+            getattr(axis, 'Set' + name)(value)
+
+    pass
+
+
+class ArrayAxis(object):
+    """
+    Stands in for the TAxis returned by GetXaxis() and GetYaxis() of an ArrayHistogram, so that stylers calling e.g.
+    histogram.GetXaxis().SetTitle('p_T') or SetLabelSize work on ArrayHistograms as well. The title is stored in
+    x_title/y_title of the histogram. The attributes listed in attribute_defaults, CenterTitle and the ranges set by
+    SetRange/SetRangeUser are recorded in x_axis_attributes/y_axis_attributes and applied to the axes by to_root.
+    """
+
+    __slots__ = ('histogram', 'axis')
+
+    # TAxis setters/getters, e.g. SetLabelSize/GetLabelSize, together with ROOT's default values
+    attribute_defaults = (('TitleSize', 0.035), ('TitleOffset', 1.), ('TitleColor', 1), ('TitleFont', 42),
+                          ('LabelSize', 0.035), ('LabelOffset', 0.005), ('LabelColor', 1), ('LabelFont', 42),
+                          ('TickLength', 0.03), ('Ndivisions', 510), ('MoreLogLabels', False), ('NoExponent', False))
+    _defaults = dict(attribute_defaults)
+
+    def __init__(self, histogram, axis):
+        self.histogram = histogram
+        self.axis = axis
+
+        pass
+
+    def _get(self, name):
+        attributes = getattr(self.histogram, self.axis + '_axis_attributes')
+        if attributes and name in attributes:
+            return attributes[name]
+        return self._defaults.get(name)
+
+    def _set(self, name, value):
+        attributes = getattr(self.histogram, self.axis + '_axis_attributes')
+        if attributes is None:
+            attributes = {}
+            setattr(self.histogram, self.axis + '_axis_attributes', attributes)
+        attributes[name] = value
+
+        pass
+
+    def __getattr__(self, name):
+        if name[3:] in self._defaults:
+            if name.startswith('Set'):
+                return lambda value: self._set(name[3:], value)
+            if name.startswith('Get'):
+                return lambda: self._get(name[3:])
+        raise AttributeError('ArrayAxis has no attribute %s' % name)
+
+    def GetTitle(self):
+        return getattr(self.histogram, self.axis + '_title')
+
+    def SetTitle(self, title):
+        setattr(self.histogram, self.axis + '_title', title)
+
+    def CenterTitle(self, center=True):
+        self._set('CenterTitle', bool(center))
+
+    def GetCenterTitle(self):
+        return bool(self._get('CenterTitle'))
+
+    def SetRange(self, first=0, last=0):
+        # both set the same range of the TAxis, only the last one set is kept
+        self._set('Range', (first, last))
+        getattr(self.histogram, self.axis + '_axis_attributes').pop('RangeUser', None)
+
+    def SetRangeUser(self, minimum, maximum):
+        self._set('RangeUser', (minimum, maximum))
+        getattr(self.histogram, self.axis + '_axis_attributes').pop('Range', None)
+
+    def GetNbins(self):
+        if self.axis == 'x':
+            return self.histogram.GetNbinsX()
+        return 1
+
+    def GetFirst(self):
+        return self._get_bin_range()[0]
+
+    def GetLast(self):
+        return self._get_bin_range()[1]
+
+    def _get_bin_range(self):
+        """
+        Returns the first and last bin shown, as TAxis::GetFirst and GetLast would after to_root applied the recorded
+        range.
+        """
+        n_bins = self.GetNbins()
+        attributes = getattr(self.histogram, self.axis + '_axis_attributes') or {}
+        if self.axis != 'x' or not ('Range' in attributes or 'RangeUser' in attributes):
+            return 1, n_bins
+
+        edges = self.histogram.edges
+        if 'RangeUser' in attributes:
+            minimum, maximum = attributes['RangeUser']
+            first = self._find_bin(minimum)
+            last = self._find_bin(maximum)
+            # same corrections as in TAxis::SetRangeUser
+            if first <= n_bins and edges[first] <= minimum:
+                first += 1
+            if last >= 1 and edges[last - 1] >= maximum:
+                last -= 1
+        else:
+            first, last = attributes['Range']
+
+        # TAxis::SetRange resets the range for invalid bin numbers
+        if last < first or (first == 0 and last == 0) or (first < 0 and last < 0) or \
+                (first > n_bins + 1 and last > n_bins + 1):
+            return 1, n_bins
+        return max(first, 0), min(last, n_bins + 1)
+
+    def _find_bin(self, value):
+        edges = self.histogram.edges
+        if value < edges[0]:
+            return 0
+        if value >= edges[-1]:
+            return len(edges)
+        return bisect.bisect_right(edges, value)
+
+    def GetXmin(self):
+        if self.axis == 'x':
+            return self.histogram.edges[0]
+        return 0.
+
+    def GetXmax(self):
+        if self.axis == 'x':
+            return self.histogram.edges[-1]
+        return 1.
+
+    def GetBinLowEdge(self, i):
+        return self.histogram.edges[i - 1]
+
+    def GetBinUpEdge(self, i):
+        return self.histogram.edges[i]
+
+
+class ArrayHistogram(object):
+    """
+    Lightweight one dimensional histogram holding its bin edges, bin contents and bin errors in contiguous arrays
+    instead of a ROOT object. Bin contents and errors include under- and overflow, i.e. just like in ROOT bin 0 is the
+    underflow and bin n+1 the overflow bin. Any buffer supporting indexing and len() can be used for the arrays, e.g.
+    array.array or numpy arrays. If no errors are supplied, the square root of the bin contents is used.
+
+    The class mimics the part of the TH1 interface used by RatioHistogram and by typical histogram stylers (SetLineColor,
+    SetMarkerStyle, GetXaxis().SetTitle, ...), hence it can be passed to RatioHistogram.add_histogram like any ROOT
+    histogram. The axes are ArrayAxis objects supporting titles, ranges and the attributes listed in
+    ArrayAxis.attribute_defaults, anything else (e.g. bin labels) is not supported. A ROOT histogram is only created by
+    to_root(), which RatioHistogram.plot calls right before drawing. Everything else works without importing ROOT at
+    all.
+    """
+
+    __slots__ = ('name', 'title', 'x_title', 'y_title', 'edges', 'contents', 'errors', 'entries', 'maximum', 'minimum',
+                 'line_color', 'line_style', 'line_width', 'marker_color', 'marker_style', 'marker_size', 'fill_color',
+                 'fill_style', 'x_axis_attributes', 'y_axis_attributes')
+
+    # ROOT style setters/getters, e.g. SetLineColor/GetLineColor, together with the slot they are stored in
+    style_attributes = (('LineColor', 'line_color'), ('LineStyle', 'line_style'), ('LineWidth', 'line_width'),
+                        ('MarkerColor', 'marker_color'), ('MarkerStyle', 'marker_style'),
+                        ('MarkerSize', 'marker_size'), ('FillColor', 'fill_color'), ('FillStyle', 'fill_style'))
+
+    def __init__(self, name, edges, contents=None, errors=None, title='', entries=0.):
+        if len(edges) < 2:
+            raise ValueError('ArrayHistogram %s needs at least two bin edges!' % name)
+
+        n_cells = len(edges) + 1
+        if contents is None:
+            contents = array('d', [0.]) * n_cells
+        if len(contents) != n_cells:
+            raise ValueError('ArrayHistogram %s: expected %i bin contents (including under- and overflow), got %i.' % (
+                             name, n_cells, len(contents)))
+        if errors is not None and len(errors) != n_cells:
+            raise ValueError('ArrayHistogram %s: expected %i bin errors (including under- and overflow), got %i.' % (
+                             name, n_cells, len(errors)))
+
+        self.name = name
+        self.title = title
+        self.x_title = ''
+        self.y_title = ''
+        self.edges = edges
+        self.contents = contents
+        self.errors = errors
+        self.entries = entries
+        self.maximum = -1111.
+        self.minimum = -1111.
+
+        self.line_color = 1
+        self.line_style = 1
+        self.line_width = 1
+        self.marker_color = 1
+        self.marker_style = 1
+        self.marker_size = 1.
+        self.fill_color = 0
+        self.fill_style = 1001
+
+        # axis attributes set through GetXaxis()/GetYaxis(), created on first use
+        self.x_axis_attributes = None
+        self.y_axis_attributes = None
+
+        pass
+
+    @classmethod
+    def from_root(cls, histogram):
+        """
+        Copies bin edges, contents, errors, titles, style and axis attributes of a one dimensional ROOT histogram.
+        """
+        n_bins = histogram.GetNbinsX()
+        x_axis = histogram.GetXaxis()
+
+        edges = array('d', [x_axis.GetBinLowEdge(i) for i in range(1, n_bins + 2)])
+        try:
+            from RatioEngine import get_bin_arrays
+            contents, errors = get_bin_arrays(histogram)
+            contents = array('d', contents.tobytes())
+            errors = array('d', errors.tobytes())
+        except ImportError:
+            contents = array('d', [histogram.GetBinContent(i) for i in range(n_bins + 2)])
+            errors = array('d', [histogram.GetBinError(i) for i in range(n_bins + 2)])
+
+        array_histogram = cls(histogram.GetName(), edges, contents, errors, histogram.GetTitle(),
+                              histogram.GetEntries())
+        array_histogram.x_title = x_axis.GetTitle()
+        array_histogram.y_title = histogram.GetYaxis().GetTitle()
+        array_histogram.x_axis_attributes = _get_axis_attributes(x_axis, n_bins)
+        array_histogram.y_axis_attributes = _get_axis_attributes(histogram.GetYaxis())
+        array_histogram.maximum = histogram.GetMaximumStored()
+        array_histogram.minimum = histogram.GetMinimumStored()
+
+        for root_name, slot in cls.style_attributes:
+            setattr(array_histogram, slot, getattr(histogram, 'Get' + root_name)())
+
+        return array_histogram
+
+    def to_root(self, ROOT=None):
+        """
+        Creates a ROOT.TH1D holding the same bins, titles, style and axis attributes, which is not attached to any
+        directory.
+        """
+        if ROOT is None:
+            ROOT = get_root_environment().get_root()
+
+        add_directory = ROOT.TH1.AddDirectoryStatus()
+        ROOT.TH1.AddDirectory(False)
+        try:
+            histogram = ROOT.TH1D(self.name, self.title, self.GetNbinsX(), _double_buffer(self.edges))
+        finally:
+            ROOT.TH1.AddDirectory(add_directory)
+
+        histogram.Set(len(self.contents), _double_buffer(self.contents))
+        if self.errors is not None:
+            histogram.SetError(_double_buffer(self.errors))
+        histogram.SetEntries(self.entries)
+        histogram.GetXaxis().SetTitle(self.x_title)
+        histogram.GetYaxis().SetTitle(self.y_title)
+        if self.x_axis_attributes:
+            _apply_axis_attributes(histogram.GetXaxis(), self.x_axis_attributes)
+        if self.y_axis_attributes:
+            _apply_axis_attributes(histogram.GetYaxis(), self.y_axis_attributes)
+
+        if self.maximum != -1111.:
+            histogram.SetMaximum(self.maximum)
+        if self.minimum != -1111.:
+            histogram.SetMinimum(self.minimum)
+
+        for root_name, slot in self.style_attributes:
+            getattr(histogram, 'Set' + root_name)(getattr(self, slot))
+
+        return histogram
+
+    def rebinned(self, n_group):
+        """
+        Returns a copy in which every n_group neighbouring bins are merged into one, adding up their contents and
+        adding their errors in quadrature. If the number of bins is not a multiple of n_group, the last bin merges the
+        remaining bins. Under- and overflow are kept. Requires numpy.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        n_bins = self.GetNbinsX()
+        starts = numpy.arange(0, n_bins, n_group)
+
+        edges = numpy.asarray(self.edges, 'float64')
+        contents = numpy.asarray(self.contents, 'float64')
+        if self.errors is None:
+            squared_errors = numpy.abs(contents)
+        else:
+            squared_errors = numpy.square(numpy.asarray(self.errors, 'float64'))
+
+        merged_contents = numpy.concatenate((contents[:1], numpy.add.reduceat(contents[1:-1], starts), contents[-1:]))
+        merged_errors = numpy.sqrt(numpy.concatenate((squared_errors[:1],
+                                                      numpy.add.reduceat(squared_errors[1:-1], starts),
+                                                      squared_errors[-1:])))
+
+        histogram = ArrayHistogram(self.name, numpy.append(edges[starts], edges[-1]), merged_contents, merged_errors,
+                                   self.title, self.entries)
+        histogram.x_title = self.x_title
+        histogram.y_title = self.y_title
+        histogram.maximum = self.maximum
+        histogram.minimum = self.minimum
+        for root_name, slot in self.style_attributes:
+            setattr(histogram, slot, getattr(self, slot))
+
+        if self.x_axis_attributes:
+            histogram.x_axis_attributes = dict(self.x_axis_attributes)
+            if 'Range' in histogram.x_axis_attributes:
+                # bin numbers change with the binning, the range in x does not
+                first, last = histogram.x_axis_attributes.pop('Range')
+                if first > 0 and last >= first:
+                    histogram.x_axis_attributes['RangeUser'] = (edges[max(first, 1) - 1], edges[min(last, n_bins)])
+        if self.y_axis_attributes:
+            histogram.y_axis_attributes = dict(self.y_axis_attributes)
+
+        return histogram
+
+    def __getstate__(self):
+        return tuple([getattr(self, slot) for slot in self.__slots__])
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def GetName(self):
+        return self.name
+
+    def SetName(self, name):
+        self.name = name
+
+    def GetTitle(self):
+        return self.title
+
+    def SetTitle(self, title):
+        self.title = title
+
+    def SetXTitle(self, title):
+        self.x_title = title
+
+    def SetYTitle(self, title):
+        self.y_title = title
+
+    def GetXaxis(self):
+        return ArrayAxis(self, 'x')
+
+    def GetYaxis(self):
+        return ArrayAxis(self, 'y')
+
+    def GetNbinsX(self):
+        return len(self.edges) - 1
+
+    def GetEntries(self):
+        return self.entries
+
+    def SetEntries(self, entries):
+        self.entries = entries
+
+    def GetBinContent(self, i):
+        return self.contents[i]
+
+    def GetBinError(self, i):
+        if self.errors is None:
+            return abs(self.contents[i]) ** 0.5
+        return self.errors[i]
+
+    def GetMaximum(self):
+        if self.maximum != -1111.:
+            return self.maximum
+        return max(self.contents[1:-1])
+
+    def SetMaximum(self, maximum=-1111.):
+        self.maximum = maximum
+
+    def GetMinimum(self):
+        if self.minimum != -1111.:
+            return self.minimum
+        return min(self.contents[1:-1])
+
+    def SetMinimum(self, minimum=-1111.):
+        self.minimum = minimum
+
+    def GetSumOfWeights(self):
+        return sum(self.contents[1:-1])
+
+    def Integral(self):
+        return self.GetSumOfWeights()
+
+    def Scale(self, factor):
+        """
+        Scales contents and errors, replacing the arrays instead of modifying them as they might be shared.
+        """
+        errors = [self.GetBinError(i) * abs(factor) for i in range(len(self.contents))]
+        self.contents = array('d', [content * factor for content in self.contents])
+        self.errors = array('d', errors)
+
+        pass
+
+    def GetLineColor(self):
+        return self.line_color
+
+    def SetLineColor(self, line_color):
+        self.line_color = line_color
+
+    def GetLineStyle(self):
+        return self.line_style
+
+    def SetLineStyle(self, line_style):
+        self.line_style = line_style
+
+    def GetLineWidth(self):
+        return self.line_width
+
+    def SetLineWidth(self, line_width):
+        self.line_width = line_width
+
+    def GetMarkerColor(self):
+        return self.marker_color
+
+    def SetMarkerColor(self, marker_color):
+        self.marker_color = marker_color
+
+    def GetMarkerStyle(self):
+        return self.marker_style
+
+    def SetMarkerStyle(self, marker_style):
+        self.marker_style = marker_style
+
+    def GetMarkerSize(self):
+        return self.marker_size
+
+    def SetMarkerSize(self, marker_size):
+        self.marker_size = marker_size
+
+    def GetFillColor(self):
+        return self.fill_color
+
+    def SetFillColor(self, fill_color):
+        self.fill_color = fill_color
+
+    def GetFillStyle(self):
+        return self.fill_style
+
+    def SetFillStyle(self, fill_style):
+        self.fill_style = fill_style
@@ -0,0 +1,131 @@
+__author__ = 'Christopher Bock'
+
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from LoggingClass import LOG_LEVELS, format_timestamp
+
+
+class BufferedLogger(object):
+    """
+    Logger which can be passed to any LoggingClass (OptionHandler, RatioHistogram, ...) as logger. Instead of printing
+    the message right away, print_log only puts the message on a queue. A background thread takes the messages from the
+    queue, formats them exactly like LoggingClass does and writes them in batches, i.e. one write (and flush) per batch
+    instead of one print per message. As the timestamp only has a resolution of one second, it is formatted only once
+    per second.
+    Messages below level are dropped in print_log, before the timestamp or the line is formatted.
+    Either a stream (default sys.stdout) or a file_name, which is opened in append mode, can be supplied. Pending
+    messages are written on flush() and close(), which is also called when the interpreter exits:
+
+        logger = BufferedLogger(file_name='plots.log', level='INFO')
+        plotter = RatioHistogram(logger=logger)
+    """
+
+    # put on the queue by close to stop the writer thread
+    _stop = object()
+
+    def __init__(self, stream=None, file_name=None, level='DEBUG', max_batch_size=1000):
+        self.file_name = file_name
+        if file_name:
+            self.stream = open(file_name, 'a')
+        else:
+            self.stream = stream if stream is not None else sys.stdout
+
+        self.level = LOG_LEVELS[level]
+        self.max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._write_messages, name='BufferedLogger')
+        self._thread.daemon = True
+        self._thread.start()
+
+        import atexit
+        atexit.register(self.close)
+
+        pass
+
+    def set_level(self, level):
+        self.level = LOG_LEVELS[level]
+
+        pass
+
+    def is_enabled(self, msg_type):
+        return LOG_LEVELS.get(msg_type, 20) >= self.level
+
+    def print_log(self, message, msg_type='INFO', suppress_timestamp=False):
+        if LOG_LEVELS.get(msg_type, 20) < self.level or self._closed:
+            return
+        self._queue.put((time.time(), message, msg_type, suppress_timestamp))
+
+        pass
+
+    def flush(self):
+        """
+        Blocks until all messages put on the queue so far have been written.
+        """
+        if not self._closed:
+            self._queue.join()
+
+        pass
+
+    def close(self):
+        """
+        Writes all pending messages and stops the writer thread. Messages logged afterwards are dropped.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        self._queue.put(self._stop)
+        self._thread.join()
+
+        if self.file_name:
+            self.stream.close()
+
+        pass
+
+    @staticmethod
+    def format_message(record):
+        created, message, msg_type, suppress_timestamp = record
+        if suppress_timestamp:
+            return "%s: %s\n" % (msg_type, message)
+        return "%s-%s: %s\n" % (format_timestamp(created), msg_type, message)
+
+    def _write_messages(self):
+        stop = False
+        while not stop:
+            # block until there is at least one message, then take whatever else is already waiting
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            for record in batch:
+                if record is self._stop:
+                    stop = True
+                else:
+                    lines.append(self.format_message(record))
+
+            try:
+                if lines:
+                    self.stream.write(''.join(lines))
+                    self.stream.flush()
+            except (IOError, OSError, ValueError):
+                # nothing sensible left to report the error to, drop the batch instead of killing the writer thread
+                pass
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+        pass
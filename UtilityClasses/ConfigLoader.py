@@ -0,0 +1,184 @@
+__author__ = 'Christopher Bock'
+
+import ast
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+from LoggingClass import LoggingClass
+
+
+def _to_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', 'yes', 'on', '1'):
+        return True
+    if lowered in ('false', 'no', 'off', '0', ''):
+        return False
+    raise ValueError('%s is not a boolean value' % value)
+
+
+def _literal(expected_type):
+    def convert(value):
+        converted = ast.literal_eval(value)
+        if not isinstance(converted, expected_type):
+            raise ValueError('%s is not a %s' % (value, expected_type.__name__))
+        return converted
+    return convert
+
+
+try:
+    _long = long
+except NameError:
+    _long = int
+
+
+class ConfigLoader(LoggingClass):
+    """
+    Reads config files in the format understood by OptionHandler.parse_arguments_config_file:
+     name;value;type        the value is converted to the given type
+     name;value             the value is kept as a string
+     name                   the option is set to True
+     # comment              lines starting with # as well as empty lines are ignored
+     include path           reads another config file at this point, relative paths are relative to the including file
+    The value is converted using the fixed table of converters below instead of eval, hence config files can no longer
+    execute arbitrary code. bool accepts true/false, yes/no, on/off and 1/0, list, tuple and dict accept Python literals.
+
+    Files are read line by line. The parsed entries are cached in a compact binary (marshal) file inside
+    cache_directory, keyed on the path of the config file. The cache is used as long as modification time and size of
+    the file and of all files it includes are unchanged.
+    """
+
+    converters = {
+        'str': str,
+        'string': str,
+        'int': int,
+        'long': _long,
+        'float': float,
+        'bool': _to_bool,
+        'list': _literal(list),
+        'tuple': _literal(tuple),
+        'dict': _literal(dict),
+    }
+
+    cache_version = 1
+
+    def __init__(self, logger=None, cache_directory=None, use_cache=True):
+        LoggingClass.__init__(self, logger=logger)
+
+        if not cache_directory:
+            cache_directory = os.path.join(tempfile.gettempdir(), 'pyUtilityClasses_config_cache')
+
+        self.cache_directory = cache_directory
+        self.use_cache = use_cache
+
+        pass
+
+    def load(self, path_config_file):
+        """
+        Returns the list of (option name, value) pairs defined in the config file, in the order they appear. Raises an
+        IOError if a file can not be read and a ValueError if a line can not be parsed.
+        """
+        path_config_file = os.path.abspath(path_config_file)
+
+        if self.use_cache:
+            entries = self._read_cache(path_config_file)
+            if entries is not None:
+                self.print_log('Using cached version of %s', 'DEBUG', args=(path_config_file,))
+                return entries
+
+        entries, dependencies = self.parse(path_config_file)
+
+        if self.use_cache:
+            self._write_cache(path_config_file, entries, dependencies)
+
+        return entries
+
+    def parse(self, path_config_file):
+        """
+        Parses the config file without using the cache. Returns the list of (option name, value) pairs and the list of
+        (path, modification time, size) of the file and all files it includes.
+        """
+        entries = []
+        dependencies = []
+        self._parse_file(os.path.abspath(path_config_file), entries, dependencies, [])
+
+        return entries, dependencies
+
+    def _parse_file(self, path_config_file, entries, dependencies, include_stack):
+        if path_config_file in include_stack:
+            raise ValueError('Recursive include of config file %s' % path_config_file)
+
+        status = os.stat(path_config_file)
+        dependencies.append((path_config_file, status.st_mtime, status.st_size))
+
+        include_stack.append(path_config_file)
+        with open(path_config_file) as config_file:
+            for line_number, line in enumerate(config_file, 1):
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+
+                if line.startswith('include ') or line.startswith('include\t'):
+                    include_path = os.path.join(os.path.dirname(path_config_file), line[8:].strip())
+                    self._parse_file(os.path.abspath(include_path), entries, dependencies, include_stack)
+                    continue
+
+                try:
+                    entries.append(self.parse_line(line))
+                except (KeyError, ValueError, SyntaxError) as exception:
+                    raise ValueError('%s:%i: unable to parse option %s (%s)' % (path_config_file, line_number, line,
+                                                                               str(exception)))
+        include_stack.pop()
+
+        pass
+
+    def parse_line(self, line):
+        option_array = line.split(';')
+
+        if len(option_array) > 2:
+            option_type = option_array[2].strip().lower()
+            converter = self.converters.get(option_type)
+            if converter is None:
+                raise KeyError('unknown type %s' % option_type)
+            return option_array[0].strip(), converter(option_array[1].strip())
+        elif len(option_array) == 2:
+            return option_array[0].strip(), option_array[1].strip()
+
+        return option_array[0].strip(), True
+
+    def _cache_file_name(self, path_config_file):
+        key = '%s|%i|%i.%i' % (path_config_file, self.cache_version, sys.version_info[0], sys.version_info[1])
+        return os.path.join(self.cache_directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.cfgc')
+
+    def _read_cache(self, path_config_file):
+        try:
+            with open(self._cache_file_name(path_config_file), 'rb') as cache_file:
+                dependencies, entries = marshal.load(cache_file)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+
+        for path, mtime, size in dependencies:
+            try:
+                status = os.stat(path)
+            except OSError:
+                return None
+            if status.st_mtime != mtime or status.st_size != size:
+                return None
+
+        return [tuple(entry) for entry in entries]
+
+    def _write_cache(self, path_config_file, entries, dependencies):
+        cache_file_name = self._cache_file_name(path_config_file)
+        temporary_file_name = '%s.%i.tmp' % (cache_file_name, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_directory):
+                os.makedirs(self.cache_directory)
+            with open(temporary_file_name, 'wb') as cache_file:
+                marshal.dump((dependencies, entries), cache_file)
+            os.rename(temporary_file_name, cache_file_name)
+        except (IOError, OSError, ValueError) as exception:
+            self.print_log('Could not write config cache %s: %s', 'DEBUG', args=(cache_file_name, exception))
+
+        pass
@@ -0,0 +1,183 @@
+__author__ = 'Christopher Bock'
+
+import os
+
+from ConfigLoader import ConfigLoader
+from LoggingClass import LoggingClass
+
+
+def _same_value(first, second):
+    # 1, 1.0 and True compare equal, but changing the type of an option is a change nonetheless
+    return type(first) is type(second) and first == second
+
+
+class ConfigWatcher(LoggingClass):
+    """
+    Keeps the options of an OptionHandler in sync with a config file (in the format read by ConfigLoader) while a
+    long-running process keeps using them. poll() only checks whether the file or any file it includes has changed,
+    using inotify if the inotify_simple package is available and comparing modification time and size of the files
+    otherwise. Only if they changed, the file is parsed again and the entries are compared to the current options; just
+    the options whose value differs are set (and hence validated), after which the callbacks are called with a
+    dictionary option name -> (old value, new value) of the changes.
+
+        watcher = options.watch_config('plots.cfg', on_change)
+        while serving:
+            handle_next_request()
+            watcher.poll()
+
+    Options removed from the file get back the value they had before the watcher first set them. If the file can not be
+    parsed, e.g. while it is being written, or a value is rejected by its validator, the current values are kept and an
+    error is printed; the file is read again on its next change.
+    """
+
+    def __init__(self, options, path_config_file, logger=None, callbacks=None, use_inotify=True, log_level=None):
+        LoggingClass.__init__(self, logger=logger, log_level=log_level)
+        if log_level is None:
+            self.log_level = options.log_level
+
+        self.options = options
+        self.path_config_file = os.path.abspath(path_config_file)
+        self.callbacks = list(callbacks or [])
+
+        self.loader = ConfigLoader(logger, use_cache=False)
+        self.loader.log_level = self.log_level
+
+        # value of each option set by the watcher before it was first set, to restore options removed from the file
+        self._previous_values = {}
+        self._entries = {}
+        self._dependencies = []
+
+        self._use_inotify = use_inotify
+        self._inotify = None
+        self._watched_directories = set()
+        self._watched_names = set()
+
+        self.reload()
+
+        pass
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+        pass
+
+    def has_changed(self):
+        """
+        Returns whether the config file or one of the files it includes changed since it was read the last time.
+        """
+        if self._inotify is not None:
+            return any([event.name in self._watched_names for event in self._inotify.read(timeout=0)])
+
+        for path, mtime, size in self._dependencies:
+            try:
+                status = os.stat(path)
+            except OSError:
+                # a file which did not exist the last time does not cause a reload until it is back
+                if mtime is not None:
+                    return True
+                continue
+            if status.st_mtime != mtime or status.st_size != size:
+                return True
+
+        return False
+
+    def poll(self):
+        """
+        Applies the changes of the config file if it changed. Returns the dictionary of changed options, which is empty
+        if nothing changed.
+        """
+        if not self.has_changed():
+            return {}
+        return self.reload()
+
+    def reload(self):
+        """
+        Reads the config file and applies all options whose value differs from the current one. Returns the dictionary
+        option name -> (old value, new value) of the options which have been changed.
+        """
+        try:
+            entries, dependencies = self.loader.parse(self.path_config_file)
+        except (IOError, OSError, ValueError) as exception:
+            self.print_log('Unable to reload config file %s: %s', 'ERROR', args=(self.path_config_file, exception))
+            self._dependencies = self._stat_files([path for path, mtime, size in self._dependencies] or
+                                                  [self.path_config_file])
+            self._watch(self._dependencies)
+            return {}
+
+        self._dependencies = dependencies
+        self._watch(dependencies)
+
+        # later lines override earlier ones
+        entries = dict(entries)
+        current_options = self.options.Options
+
+        changes = {}
+        for key, value in entries.items():
+            if key in current_options and _same_value(current_options[key], value):
+                continue
+            old_value = current_options.get(key)
+            if key not in self._previous_values:
+                self._previous_values[key] = (key in current_options, old_value)
+            if self.options.set_option(key, value):
+                changes[key] = (old_value, value)
+
+        for key in set(self._entries) - set(entries):
+            had_value, previous_value = self._previous_values.pop(key, (False, None))
+            if had_value and not _same_value(current_options.get(key), previous_value):
+                old_value = current_options.get(key)
+                if self.options.set_option(key, previous_value):
+                    changes[key] = (old_value, previous_value)
+
+        self._entries = entries
+
+        if changes:
+            self.print_log('Applied %i changed options from %s: %s', args=(len(changes), self.path_config_file,
+                                                                          ', '.join(sorted(changes))),
+                           fields={'config_file': self.path_config_file, 'changed': sorted(changes)})
+            for callback in self.callbacks:
+                callback(changes)
+
+        return changes
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+        pass
+
+    @staticmethod
+    def _stat_files(paths):
+        dependencies = []
+        for path in paths:
+            try:
+                status = os.stat(path)
+                dependencies.append((path, status.st_mtime, status.st_size))
+            except OSError:
+                dependencies.append((path, None, None))
+        return dependencies
+
+    def _watch(self, dependencies):
+        if not self._use_inotify:
+            return
+
+        # editors often replace files instead of writing them, hence the directories are watched
+        directories = set([os.path.dirname(path) for path, mtime, size in dependencies])
+        self._watched_names = set([os.path.basename(path) for path, mtime, size in dependencies])
+        if directories == self._watched_directories:
+            return
+
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            self._use_inotify = False
+            return
+
+        self.close()
+        self._inotify = INotify()
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE | flags.ATTRIB
+        for directory in directories:
+            self._inotify.add_watch(directory, mask)
+        self._watched_directories = directories
+
+        pass
@@ -0,0 +1,320 @@
+__author__ = 'Christopher Bock'
+
+import time
+from collections import namedtuple
+
+from LoggingClass import LoggingClass
+from RatioEngine import get_bin_arrays
+from RootEnvironment import get_root_environment
+from RootFilePool import LazyHistogram
+
+
+ComparisonResult = namedtuple('ComparisonResult', ['output_file_name', 'numerator', 'denominator', 'numerator_name',
+                                                   'denominator_name', 'chi2', 'ndf', 'chi2_ndf', 'ks_distance',
+                                                   'ks_probability', 'maximum_deviation', 'n_outside_range',
+                                                   'failed_tests', 'passed'])
+
+
+def kolmogorov_probability(values):
+    """
+    Returns the Kolmogorov distribution function Q(x) = 2 sum_k (-1)^(k-1) exp(-2 k^2 x^2) (as TMath::KolmogorovProb)
+    for a numpy array of values.
+    """
+    numpy = get_root_environment().import_module('numpy')
+
+    values = numpy.asarray(values, 'float64')
+    k = numpy.arange(1, 101, dtype='float64')
+    signs = numpy.where(k % 2 == 1, 1., -1.)
+    terms = signs * numpy.exp(-2. * numpy.outer(values * values, k * k))
+    probabilities = numpy.clip(2. * terms.sum(axis=1), 0., 1.)
+    # the series does not converge for small values, where the probability is one anyway
+    return numpy.where(values < 0.2, 1., probabilities)
+
+
+class HistogramComparator(LoggingClass):
+    """
+    Compares many pairs of histograms at once in order to draw only those which disagree. Comparisons are added like
+    the jobs of RatioHistogram.plot_many, i.e. an output file name, a list of histograms and optionally a ratio_map and
+    further arguments of plot(); every numerator/denominator pair of the ratio map is compared. compare() stacks the
+    bin contents of all pairs with the same number of bins into arrays and evaluates all metrics in a few vectorised
+    steps:
+     chi2 / ndf             sum over bins of (a - b)^2 / (err_a^2 + err_b^2), ndf being the number of bins with a
+                            non-zero error; with normalize=True the chi2 of TH1::Chi2Test for histograms of unknown
+                            normalisation
+     Kolmogorov-Smirnov     largest distance of the cumulative distributions and the corresponding probability,
+                            using the effective number of entries of both histograms
+     ratio deviation        largest deviation of numerator / denominator from one and the number of bins outside of
+                            [ratio_minimum, ratio_maximum] by more than ratio_n_sigma times the error of the ratio,
+                            ignoring bins which are empty in either histogram
+    A pair fails if chi2 / ndf exceeds chi2_ndf_threshold, the Kolmogorov probability is below ks_threshold or any bin
+    is outside of the ratio range; a test is disabled by setting its threshold (ratio_minimum for the ratio test) to
+    None. With normalize=True shapes are compared, the histograms being scaled to unit area first. Under- and overflow
+    are ignored.
+
+        comparator = HistogramComparator()
+        for name, reference, candidate in pairs:
+            comparator.add_comparison(name, [(reference, 'Reference'), (candidate, 'Candidate')])
+        results = comparator.compare()
+        comparator.print_report(results)
+        comparator.plot_failed(plotter, results)
+
+    plot_failed draws only the comparisons with at least one failing pair, showing only the ratios of failing pairs.
+    The plotter is either a RatioHistogram or a ParallelPlotter.
+    """
+
+    def __init__(self, logger=None, chi2_ndf_threshold=3., ks_threshold=0.01, ratio_minimum=0.5, ratio_maximum=2.0,
+                 ratio_n_sigma=3., normalize=False, chunk_size=4096):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.chi2_ndf_threshold = chi2_ndf_threshold
+        self.ks_threshold = ks_threshold
+        self.ratio_minimum = ratio_minimum
+        self.ratio_maximum = ratio_maximum
+        self.ratio_n_sigma = ratio_n_sigma
+        self.normalize = normalize
+        self.chunk_size = chunk_size
+
+        self.comparisons = []
+
+        pass
+
+    def add_comparison(self, output_file_name, histograms, ratio_map=None, **plot_arguments):
+        """
+        histograms is a list of (histogram, name_in_legend) tuples or a dictionary name -> histogram, ratio_map and the
+        histogram indices it refers to have the same meaning as for RatioHistogram.plot (and default to comparing all
+        histograms to the first one).
+        """
+        if isinstance(histograms, dict):
+            histograms = [(histogram, name) for name, histogram in histograms.items()]
+
+        entries = []
+        for entry in histograms:
+            histogram = entry[0]
+            if isinstance(histogram, LazyHistogram):
+                histogram = histogram.load()
+            name_in_legend = entry[1] if len(entry) > 1 and entry[1] else histogram.GetName()
+            entries.append((histogram, name_in_legend) + tuple(entry[2:]))
+
+        self.comparisons.append((output_file_name, entries, ratio_map, plot_arguments))
+
+        pass
+
+    @staticmethod
+    def get_histogram_order(names, sort_function=None):
+        """
+        Returns the names in the order RatioHistogram uses for the indices of the ratio map.
+        """
+        ordered = dict([(name, None) for name in names])
+        if sort_function:
+            return sorted(ordered.keys(), sort_function)
+        return list(ordered.keys())
+
+    def _get_pairs(self, entries, ratio_map, sort_function=None):
+        # returns the (numerator index, denominator index, numerator name, denominator name) tuples of one comparison
+        # together with a dictionary name -> histogram
+        histograms = dict([(entry[1], entry[0]) for entry in entries])
+        keys = self.get_histogram_order([entry[1] for entry in entries], sort_function)
+
+        if not ratio_map:
+            ratio_map = dict([(i, 0) for i in range(1, len(keys))])
+
+        return [(numerator, denominator, keys[numerator], keys[denominator])
+                for numerator, denominator in sorted(ratio_map.items())
+                if numerator < len(keys) and denominator < len(keys)], histograms
+
+    def compare(self):
+        """
+        Compares all pairs of all comparisons added so far. Returns a list of ComparisonResult tuples ranked by how
+        badly the pairs disagree, failing pairs first.
+        """
+        start_time = time.time()
+
+        groups = {}
+        for output_file_name, entries, ratio_map, plot_arguments in self.comparisons:
+            pairs, histograms = self._get_pairs(entries, ratio_map, plot_arguments.get('sort_function'))
+            for numerator, denominator, numerator_name, denominator_name in pairs:
+                numerator_histogram = histograms[numerator_name]
+                n_cells = numerator_histogram.GetNbinsX() + 2
+                if histograms[denominator_name].GetNbinsX() + 2 != n_cells:
+                    self.print_log('Can not compare %s and %s in %s, the number of bins differs.', 'WARNING',
+                                   args=(numerator_name, denominator_name, output_file_name))
+                    continue
+                groups.setdefault(n_cells, []).append((output_file_name, numerator, denominator, numerator_name,
+                                                       denominator_name, numerator_histogram,
+                                                       histograms[denominator_name]))
+
+        results = []
+        for n_cells, pairs in groups.items():
+            for start in range(0, len(pairs), self.chunk_size):
+                results.extend(self._compare_pairs(pairs[start:start + self.chunk_size]))
+
+        results.sort(key=self._rank)
+
+        n_failed = len([result for result in results if not result.passed])
+        elapsed_time = time.time() - start_time
+        self.print_log('Compared %i pairs of histograms in %.2f s, %i failed.', args=(len(results), elapsed_time,
+                                                                                     n_failed),
+                       fields={'n_pairs': len(results), 'n_failed': n_failed, 'duration': elapsed_time})
+
+        return results
+
+    def get_failed_jobs(self, results):
+        """
+        Returns jobs for RatioHistogram.plot_many for all comparisons with at least one failing pair. The ratio map of
+        each job is reduced to the failing pairs.
+        """
+        failed_pairs = {}
+        for result in results:
+            if not result.passed:
+                failed_pairs.setdefault(result.output_file_name, {})[result.numerator] = result.denominator
+
+        jobs = []
+        for output_file_name, entries, ratio_map, plot_arguments in self.comparisons:
+            if output_file_name not in failed_pairs:
+                continue
+            job = dict(plot_arguments)
+            job['output_file_name'] = output_file_name
+            job['histograms'] = entries
+            job['ratio_map'] = failed_pairs[output_file_name]
+            jobs.append(job)
+
+        return jobs
+
+    def plot_failed(self, plotter, results):
+        """
+        Draws the comparisons which failed using a RatioHistogram (via plot_many) or a ParallelPlotter and returns the
+        list of PlotResult tuples.
+        """
+        jobs = self.get_failed_jobs(results)
+        self.print_log('Plotting %i of %i comparisons.', args=(len(jobs), len(self.comparisons)))
+
+        if hasattr(plotter, 'plot_many'):
+            return plotter.plot_many(jobs)
+
+        for job in jobs:
+            output_file_name = job.pop('output_file_name')
+            plotter.add_plot(output_file_name, job.pop('histograms'), **job)
+        return plotter.run()
+
+    def print_report(self, results, msg_type='INFO', n_shown=20):
+        """
+        Prints the n_shown worst pairs (all of them if n_shown is None) and the number of failed pairs.
+        """
+        if not self.is_enabled(msg_type):
+            return
+
+        n_failed = len([result for result in results if not result.passed])
+
+        self.print_line(msg_type)
+        self.print_log('  Comparison report: %i of %i pairs failed  ', msg_type, args=(n_failed, len(results)))
+        for result in results[:n_shown]:
+            self.print_log('    %s  %s / %s  chi2/ndf %.2f (%i), KS %.3g, max. deviation %.3f, %i bins outside  %s',
+                           msg_type, args=(result.output_file_name, result.numerator_name, result.denominator_name,
+                                           result.chi2_ndf, result.ndf, result.ks_probability,
+                                           result.maximum_deviation, result.n_outside_range,
+                                           ','.join(result.failed_tests) if result.failed_tests else 'ok'))
+        self.print_line(msg_type)
+
+        pass
+
+    @staticmethod
+    def _rank(result):
+        return result.passed, -len(result.failed_tests), -result.chi2_ndf, result.ks_probability
+
+    def _compare_pairs(self, pairs):
+        numpy = get_root_environment().import_module('numpy')
+
+        n_pairs = len(pairs)
+        n_cells = len(get_bin_arrays(pairs[0][5])[0])
+        numerator_contents = numpy.empty((n_pairs, n_cells), 'float64')
+        numerator_errors = numpy.empty((n_pairs, n_cells), 'float64')
+        denominator_contents = numpy.empty((n_pairs, n_cells), 'float64')
+        denominator_errors = numpy.empty((n_pairs, n_cells), 'float64')
+        for i, pair in enumerate(pairs):
+            numerator_contents[i], numerator_errors[i] = get_bin_arrays(pair[5])
+            denominator_contents[i], denominator_errors[i] = get_bin_arrays(pair[6])
+
+        # under- and overflow are not compared
+        a = numerator_contents[:, 1:-1]
+        b = denominator_contents[:, 1:-1]
+        a_errors = numerator_errors[:, 1:-1]
+        b_errors = denominator_errors[:, 1:-1]
+
+        sum_a = a.sum(axis=1)
+        sum_b = b.sum(axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            # effective number of entries, (sum w)^2 / sum w^2
+            entries_a = numpy.where(sum_a > 0, sum_a ** 2 / (a_errors ** 2).sum(axis=1), 0.)
+            entries_b = numpy.where(sum_b > 0, sum_b ** 2 / (b_errors ** 2).sum(axis=1), 0.)
+        entries_a = numpy.nan_to_num(entries_a)
+        entries_b = numpy.nan_to_num(entries_b)
+
+        if self.normalize:
+            # Pearson chi2 of two histograms with unknown normalisation (as TH1::Chi2Test), based on the effective
+            # number of entries in each bin, which avoids dividing by the tiny errors of sparsely filled bins
+            weight_a = numpy.where(sum_a != 0, entries_a / numpy.where(sum_a != 0, sum_a, 1.), 0.)[:, numpy.newaxis]
+            weight_b = numpy.where(sum_b != 0, entries_b / numpy.where(sum_b != 0, sum_b, 1.), 0.)[:, numpy.newaxis]
+            counts_a = a * weight_a
+            counts_b = b * weight_b
+            total_a = entries_a[:, numpy.newaxis]
+            total_b = entries_b[:, numpy.newaxis]
+            pooled = counts_a + counts_b
+            used = (pooled > 0) & (total_a > 0) & (total_b > 0)
+            chi2 = numpy.where(used, (total_b * counts_a - total_a * counts_b) ** 2 /
+                               numpy.where(used, total_a * total_b * pooled, 1.), 0.).sum(axis=1)
+            ndf = used.sum(axis=1) - 1
+
+            scale_a = numpy.where(sum_a != 0, 1. / numpy.where(sum_a != 0, sum_a, 1.), 0.)[:, numpy.newaxis]
+            scale_b = numpy.where(sum_b != 0, 1. / numpy.where(sum_b != 0, sum_b, 1.), 0.)[:, numpy.newaxis]
+            a, a_errors = a * scale_a, a_errors * scale_a
+            b, b_errors = b * scale_b, b_errors * scale_b
+        else:
+            variance = a_errors ** 2 + b_errors ** 2
+            used = variance > 0
+            chi2 = numpy.where(used, (a - b) ** 2 / numpy.where(used, variance, 1.), 0.).sum(axis=1)
+            ndf = used.sum(axis=1)
+        chi2_ndf = numpy.where(ndf > 0, chi2 / numpy.maximum(ndf, 1), 0.)
+
+        cumulative_a = numpy.cumsum(a, axis=1)
+        cumulative_b = numpy.cumsum(b, axis=1)
+        cumulative_a /= numpy.where(cumulative_a[:, -1] != 0, cumulative_a[:, -1], 1.)[:, numpy.newaxis]
+        cumulative_b /= numpy.where(cumulative_b[:, -1] != 0, cumulative_b[:, -1], 1.)[:, numpy.newaxis]
+        ks_distance = numpy.abs(cumulative_a - cumulative_b).max(axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            n_effective = numpy.where(entries_a + entries_b > 0, entries_a * entries_b / (entries_a + entries_b), 0.)
+        root_n = numpy.sqrt(n_effective)
+        ks_probability = kolmogorov_probability(
+            (root_n + 0.12 + 0.11 / numpy.where(root_n > 0, root_n, 1.)) * ks_distance)
+        # empty histograms can not be compared
+        ks_probability = numpy.where((sum_a > 0) & (sum_b > 0), ks_probability, 1.)
+
+        # ratios and their errors as computed by RatioEngine, bins with an empty denominator are skipped
+        non_zero = b != 0
+        safe_b = numpy.where(non_zero, b, 1.)
+        ratios = numpy.where(non_zero, a / safe_b, 1.)
+        ratio_errors = numpy.where(non_zero, numpy.sqrt(a_errors ** 2 * b ** 2 + b_errors ** 2 * a ** 2) / safe_b ** 2,
+                                   0.)
+        maximum_deviation = numpy.abs(ratios - 1.).max(axis=1)
+        n_outside_range = numpy.zeros(n_pairs, 'intp')
+        if self.ratio_minimum is not None and self.ratio_maximum is not None:
+            margin = self.ratio_n_sigma * ratio_errors if self.ratio_n_sigma else 0.
+            outside = (ratios + margin < self.ratio_minimum) | (ratios - margin > self.ratio_maximum)
+            # a bin which is empty in one histogram has no meaningful ratio error, such bins are left to chi2 and KS
+            n_outside_range = (non_zero & (a != 0) & outside).sum(axis=1)
+
+        results = []
+        for i, pair in enumerate(pairs):
+            failed_tests = []
+            if self.chi2_ndf_threshold is not None and chi2_ndf[i] > self.chi2_ndf_threshold:
+                failed_tests.append('chi2')
+            if self.ks_threshold is not None and ks_probability[i] < self.ks_threshold:
+                failed_tests.append('ks')
+            if n_outside_range[i] > 0:
+                failed_tests.append('ratio')
+
+            results.append(ComparisonResult(pair[0], pair[1], pair[2], pair[3], pair[4], float(chi2[i]), int(ndf[i]),
+                                            float(chi2_ndf[i]), float(ks_distance[i]), float(ks_probability[i]),
+                                            float(maximum_deviation[i]), int(n_outside_range[i]),
+                                            tuple(failed_tests), not failed_tests))
+
+        return results
@@ -0,0 +1,212 @@
+__author__ = 'Christopher Bock'
+
+import json
+import mmap
+import os
+import struct
+from collections import namedtuple, OrderedDict
+
+from ArrayHistogram import ArrayHistogram
+from LoggingClass import LoggingClass
+from RootEnvironment import get_root_environment
+
+
+# reference to a histogram inside a store, small enough to be sent to other processes instead of the histogram itself
+StoredHistogram = namedtuple('StoredHistogram', ['file_name', 'name'])
+
+_MAGIC = b'PYUCHS01'
+_HEADER = struct.Struct('<8sQQ')
+# the arrays of every histogram start at a multiple of this many bytes
+_ALIGNMENT = 64
+
+_open_stores = {}
+
+
+def _native(value):
+    # JSON returns unicode strings, which Python 2 versions of PyROOT do not accept as names
+    if isinstance(value, dict):
+        return dict([(_native(key), _native(item)) for key, item in value.items()])
+    if isinstance(value, list):
+        return [_native(item) for item in value]
+    if not isinstance(value, (str, bool, int, float, type(None))) and hasattr(value, 'encode'):
+        return value.encode('utf-8')
+    return value
+
+
+def _axis_attributes(attributes):
+    # ranges are stored as JSON lists
+    return dict([(_native(name), tuple(value) if isinstance(value, list) else value)
+                 for name, value in attributes.items()])
+
+
+def _aligned(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write_histogram_store(file_name, histograms):
+    """
+    Writes the given histograms into a histogram store file. histograms is a dictionary name -> histogram or a list of
+    (name, histogram) tuples or of histograms (which are then stored under their own name). ROOT histograms are converted
+    to ArrayHistograms first, titles, number of entries, style and axis attributes are stored along with the arrays.
+
+    The file consists of a fixed size header (magic, offset and size of the index), the bin edges, contents and errors
+    of all histograms as little endian doubles, each histogram starting at a 64 byte boundary, and a JSON index at the
+    end describing where each histogram is stored.
+    """
+    numpy = get_root_environment().import_module('numpy')
+
+    if isinstance(histograms, dict):
+        histograms = histograms.items()
+
+    entries = []
+    temporary_file_name = '%s.%i.tmp' % (file_name, os.getpid())
+    with open(temporary_file_name, 'wb') as store_file:
+        store_file.write(b'\0' * _aligned(_HEADER.size))
+        offset = _aligned(_HEADER.size)
+
+        for entry in histograms:
+            if isinstance(entry, tuple):
+                name, histogram = entry
+            else:
+                name, histogram = entry.GetName(), entry
+            if not isinstance(histogram, ArrayHistogram):
+                histogram = ArrayHistogram.from_root(histogram)
+
+            n_bins = histogram.GetNbinsX()
+            contents = numpy.asarray(histogram.contents, '<f8')
+            if histogram.errors is None:
+                errors = numpy.sqrt(numpy.abs(contents))
+            else:
+                errors = numpy.asarray(histogram.errors, '<f8')
+
+            for values in (numpy.asarray(histogram.edges, '<f8'), contents, errors):
+                store_file.write(numpy.ascontiguousarray(values, '<f8').tobytes())
+
+            entries.append({'name': name, 'offset': offset, 'n_bins': n_bins, 'title': histogram.title,
+                            'x_title': histogram.x_title, 'y_title': histogram.y_title,
+                            'entries': histogram.entries, 'maximum': histogram.maximum, 'minimum': histogram.minimum,
+                            'style': dict([(slot, getattr(histogram, slot)) for root_name, slot in
+                                           ArrayHistogram.style_attributes]),
+                            'x_axis': histogram.x_axis_attributes or {}, 'y_axis': histogram.y_axis_attributes or {}})
+
+            offset += 8 * (3 * n_bins + 5)
+            padding = _aligned(offset) - offset
+            store_file.write(b'\0' * padding)
+            offset += padding
+
+        index = json.dumps({'version': 1, 'histograms': entries}).encode('utf-8')
+        store_file.write(index)
+
+        store_file.seek(0)
+        store_file.write(_HEADER.pack(_MAGIC, offset, len(index)))
+
+    os.rename(temporary_file_name, file_name)
+
+
+def open_histogram_store(file_name):
+    """
+    Returns a HistogramStore for the file, shared by all callers within the process as long as the file is unchanged.
+    """
+    file_name = os.path.abspath(file_name)
+    status = os.stat(file_name)
+    key = (file_name, status.st_mtime, status.st_size)
+
+    store = _open_stores.get(file_name)
+    if store is None or store.key != key:
+        store = HistogramStore(file_name)
+        store.key = key
+        _open_stores[file_name] = store
+
+    return store
+
+
+class HistogramStore(LoggingClass):
+    """
+    Read-only access to a file written by write_histogram_store. The file is memory mapped and the arrays of the
+    histograms returned by get_histogram are views onto the mapping, hence nothing is copied or deserialised when a
+    histogram is loaded and all processes reading the same store share a single copy in the page cache. The views are
+    read-only; ArrayHistogram.Scale replaces the arrays instead of modifying them and therefore still works.
+
+        write_histogram_store('references.hist', {'data': data_histogram, 'mc': mc_histogram})
+        store = open_histogram_store('references.hist')
+        plotter.add_histogram(store.get_histogram('data'), 'Data')
+
+    Within ParallelPlotter, pass StoredHistogram(file_name, name) instead of a histogram. Only this reference is sent to
+    the workers, which open the store themselves.
+    """
+
+    def __init__(self, file_name, logger=None):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.file_name = file_name
+        self.key = None
+
+        with open(file_name, 'rb') as store_file:
+            self._buffer = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_offset, index_size = _HEADER.unpack(self._buffer[:_HEADER.size])
+        if magic != _MAGIC:
+            self._buffer.close()
+            raise ValueError('%s is not a histogram store!' % file_name)
+
+        index = json.loads(self._buffer[index_offset:index_offset + index_size].decode('utf-8'))
+        self.index = OrderedDict([(entry['name'], entry) for entry in index['histograms']])
+
+        self.print_log('Opened histogram store %s holding %i histograms.', 'DEBUG', args=(file_name, len(self.index)))
+
+        pass
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def names(self):
+        return list(self.index.keys())
+
+    def get_histogram(self, name):
+        """
+        Returns the histogram as ArrayHistogram whose arrays are views onto the store. Raises a KeyError if the store
+        does not contain the histogram.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        if self._buffer is None:
+            raise ValueError('Histogram store %s has been closed.' % self.file_name)
+
+        entry = self.index[name]
+        n_bins = entry['n_bins']
+        offset = entry['offset']
+
+        edges = numpy.frombuffer(self._buffer, '<f8', n_bins + 1, offset)
+        offset += 8 * (n_bins + 1)
+        contents = numpy.frombuffer(self._buffer, '<f8', n_bins + 2, offset)
+        offset += 8 * (n_bins + 2)
+        errors = numpy.frombuffer(self._buffer, '<f8', n_bins + 2, offset)
+
+        histogram = ArrayHistogram(_native(entry['name']), edges, contents, errors, _native(entry['title']),
+                                   entry['entries'])
+        histogram.x_title = _native(entry['x_title'])
+        histogram.y_title = _native(entry['y_title'])
+        histogram.maximum = entry['maximum']
+        histogram.minimum = entry['minimum']
+        for slot, value in entry['style'].items():
+            setattr(histogram, _native(slot), value)
+        histogram.x_axis_attributes = _axis_attributes(entry['x_axis']) or None
+        histogram.y_axis_attributes = _axis_attributes(entry['y_axis']) or None
+
+        return histogram
+
+    def close(self):
+        """
+        Removes the store from the stores shared by open_histogram_store and releases the mapping. Histograms obtained
+        before keep a reference to the mapping, the file is unmapped once the last of them is gone.
+        """
+        if _open_stores.get(self.file_name) is self:
+            del _open_stores[self.file_name]
+
+        # mmap.close() would unmap the file underneath the numpy views, which Python 2 does not prevent
+        self._buffer = None
+
+        pass
@@ -0,0 +1,219 @@
+__author__ = 'Christopher Bock'
+
+import functools
+from itertools import cycle
+
+from ArrayHistogram import ArrayHistogram
+
+
+# CO_VARARGS flag of code objects, set if the function accepts *args
+_CO_VARARGS = 0x04
+# lambdas created on the fly would otherwise let the cache grow without bounds
+_MAX_CACHED_STYLERS = 1024
+
+_takes_name_cache = {}
+
+
+def _positional_parameters(function):
+    """
+    Returns the names of the positional parameters of a Python function and whether it accepts *args, or None if the
+    function is not implemented in Python.
+    """
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return None
+    return list(code.co_varnames[:code.co_argcount]), bool(code.co_flags & _CO_VARARGS)
+
+
+def _inspect_styler(histogram_styler):
+    if isinstance(histogram_styler, functools.partial):
+        parameters = _inspect_styler(histogram_styler.func)
+        if parameters is None:
+            return None
+        names, var_args = parameters
+        names = [name for name in names[len(histogram_styler.args):]
+                 if name not in (histogram_styler.keywords or {})]
+        return names, var_args
+
+    if getattr(histogram_styler, '__func__', None) is not None:
+        parameters = _positional_parameters(histogram_styler.__func__)
+        if parameters is not None and getattr(histogram_styler, '__self__', None) is not None:
+            parameters = parameters[0][1:], parameters[1]
+        return parameters
+
+    parameters = _positional_parameters(histogram_styler)
+    if parameters is not None:
+        return parameters
+
+    # classes and objects implementing __call__, the first parameter being self
+    method = histogram_styler.__init__ if isinstance(histogram_styler, type) else type(histogram_styler).__call__
+    parameters = _positional_parameters(getattr(method, '__func__', method))
+    if parameters is not None:
+        return parameters[0][1:], parameters[1]
+
+    return None
+
+
+def _signature_takes_name(histogram_styler):
+    # builtins and extension types only offer a signature, if at all, starting with Python 3
+    try:
+        from inspect import signature, Parameter
+        parameters = signature(histogram_styler).parameters.values()
+    except (ImportError, TypeError, ValueError):
+        return False
+
+    positional = [parameter for parameter in parameters
+                  if parameter.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)]
+    var_args = [parameter for parameter in parameters if parameter.kind == Parameter.VAR_POSITIONAL]
+    return len(positional) >= 2 or len(var_args) > 0
+
+
+def _cache_key(histogram_styler):
+    # bound methods are created anew on every attribute access, their function is shared though
+    function = getattr(histogram_styler, '__func__', None)
+    if function is not None:
+        return function, getattr(histogram_styler, '__self__', None) is not None
+    if isinstance(histogram_styler, (functools.partial, type)) or hasattr(histogram_styler, '__code__'):
+        return histogram_styler
+    # instances of Python classes share the signature of __call__, builtins and PyROOT functions of one type do not
+    if hasattr(getattr(type(histogram_styler), '__call__', None), '__code__'):
+        return type(histogram_styler)
+    return histogram_styler
+
+
+def styler_takes_name(histogram_styler):
+    """
+    Returns whether the styling function accepts the name of the histogram in the legend as second parameter. The
+    result is cached per function (per class for instances of classes defining __call__), so the function is only
+    inspected on first use. Functions, bound methods, functools.partial objects, classes and callable objects are
+    supported, builtins are assumed to take only the histogram unless their signature says otherwise.
+    """
+    try:
+        key = _cache_key(histogram_styler)
+        return _takes_name_cache[key]
+    except KeyError:
+        pass
+    except TypeError:
+        # unhashable callable, not cached
+        key = None
+
+    parameters = _inspect_styler(histogram_styler)
+    if parameters is None:
+        takes_name = _signature_takes_name(histogram_styler)
+    else:
+        names, var_args = parameters
+        takes_name = len(names) >= 2 or var_args
+
+    if key is not None:
+        if len(_takes_name_cache) >= _MAX_CACHED_STYLERS:
+            _takes_name_cache.clear()
+        _takes_name_cache[key] = takes_name
+
+    return takes_name
+
+
+def get_styling_function(histogram_styler):
+    """
+    Returns a function taking the histogram and the name in the legend, which calls histogram_styler accordingly.
+    """
+    if styler_takes_name(histogram_styler):
+        return histogram_styler
+    return lambda histogram, name_in_legend: histogram_styler(histogram)
+
+
+def apply_histogram_styler(histogram_styler, histogram, name_in_legend):
+    """
+    Calls the styling function with the histogram and, if it accepts a second parameter, the name of the histogram in
+    the legend.
+    """
+    if styler_takes_name(histogram_styler):
+        histogram_styler(histogram, name_in_legend)
+    else:
+        histogram_styler(histogram)
+
+
+class HistogramStyle(object):
+    """
+    A declarative style, which can be used wherever a styling function is expected. The attributes are named like the
+    style attributes of ArrayHistogram, e.g.
+
+        HistogramStyle(line_color=2, marker_style=20, marker_color=2)
+
+    sets the line and marker color as well as the marker style of every histogram it is applied to.
+    """
+
+    _setters = dict([(slot, 'Set' + root_name) for root_name, slot in ArrayHistogram.style_attributes])
+
+    def __init__(self, **attributes):
+        unknown = sorted(set(attributes) - set(self._setters))
+        if unknown:
+            raise AttributeError('Unknown style attributes: %s' % ', '.join(unknown))
+
+        self.attributes = attributes
+        self._calls = [(self._setters[slot], value) for slot, value in sorted(attributes.items())]
+
+        pass
+
+    def __call__(self, histogram, name_in_legend=None):
+        self.apply(histogram)
+
+    def __repr__(self):
+        return 'HistogramStyle(%s)' % ', '.join(['%s=%r' % item for item in sorted(self.attributes.items())])
+
+    def apply(self, histogram):
+        for setter, value in self._calls:
+            getattr(histogram, setter)(value)
+
+        pass
+
+
+class StyleTable(object):
+    """
+    Assigns styles to many histograms at once. Histograms whose name in the legend is a key of styles get that style
+    (either a HistogramStyle or a dictionary of style attributes), all others get the next entry of every table in
+    turn, the tables being lists of values per style attribute which are cycled through:
+
+        table = StyleTable({'Data': HistogramStyle(marker_style=20)},
+                           line_color=[2, 4, 6, 8], line_style=[1, 2])
+        plotter.add_histograms(histograms, table)
+
+    The style chosen for a name is remembered, so a name always gets the same style. The table is a styling function
+    itself, apply applies it to a list of (histogram, name in legend) tuples.
+    """
+
+    def __init__(self, styles=None, default=None, **tables):
+        self.styles = {}
+        for name, style in (styles or {}).items():
+            self.styles[name] = style if isinstance(style, HistogramStyle) else HistogramStyle(**style)
+
+        if default is not None and not isinstance(default, HistogramStyle):
+            default = HistogramStyle(**default)
+        self.default = default
+
+        unknown = sorted(set(tables) - set(HistogramStyle._setters))
+        if unknown:
+            raise AttributeError('Unknown style attributes: %s' % ', '.join(unknown))
+        self.tables = tables
+        self._cycles = [(slot, cycle(values)) for slot, values in sorted(tables.items()) if values]
+
+        pass
+
+    def __call__(self, histogram, name_in_legend):
+        self.get_style(name_in_legend).apply(histogram)
+
+    def get_style(self, name_in_legend):
+        style = self.styles.get(name_in_legend)
+        if style is None:
+            attributes = dict(self.default.attributes) if self.default is not None else {}
+            for slot, values in self._cycles:
+                attributes[slot] = next(values)
+            style = HistogramStyle(**attributes)
+            self.styles[name_in_legend] = style
+
+        return style
+
+    def apply(self, histograms):
+        for histogram, name_in_legend in histograms:
+            self.get_style(name_in_legend).apply(histogram)
+
+        pass
@@ -1,5 +1,27 @@
 __author__ = 'Christopher Bock'
 
+import time
+
+
+# numeric severity of the message types, messages of unknown types are treated like INFO messages
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+_timestamp_cache = [None, '']
+
+
+def format_timestamp(seconds=None):
+    """
+    Returns the timestamp printed in front of log messages. As the timestamp only has a resolution of one second, the
+    formatted string is cached and time.strftime is only called once per second.
+    """
+    if seconds is None:
+        seconds = time.time()
+    second = int(seconds)
+    if second != _timestamp_cache[0]:
+        _timestamp_cache[1] = time.strftime("%y-%m-%d/%H:%M:%S", time.localtime(second))
+        _timestamp_cache[0] = second
+    return _timestamp_cache[1]
+
 
 class LoggingClass(object):
     """
@@ -9,23 +31,55 @@ class LoggingClass(object):
      message                being the message to be shown
      msg_type               the type of the message
      suppress_timestamp     whether or not timestamps should be shown alongside with the message
-    the parameters do not need to be named.
+    the parameters do not need to be named. If the logger also implements is_enabled(msg_type), messages it would drop
+    are not even formatted. Loggers writing structured records (see StructuredLogger) implement
+    log_record(message, msg_type, source, fields) instead, which is passed the name of the logging class and the
+    dictionary of additional values given as fields to print_log:
+        self.print_log('Created %s', args=(output_file_name,), fields={'duration': duration})
+
+    Messages with a type below log_level (one of the keys of LOG_LEVELS) are dropped. To avoid building messages which
+    are dropped anyway, print_log accepts a format string together with its arguments, or a callable returning the
+    message; both are only evaluated if the message passes the level check:
+        self.print_log('Option %s -> %s', 'DEBUG', args=(key, value))
+        self.print_log(lambda: expensive_summary(), 'DEBUG')
+    Whole blocks of logging can be skipped using is_enabled.
     """
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, log_level=None):
         self.logger = logger
+        self.log_level = LOG_LEVELS[log_level] if log_level else 0
+        return
+
+    def set_log_level(self, log_level):
+        self.log_level = LOG_LEVELS[log_level]
         return
 
+    def is_enabled(self, msg_type='INFO'):
+        if LOG_LEVELS.get(msg_type, 20) < self.log_level:
+            return False
+        if self.logger is not None and hasattr(self.logger, 'is_enabled'):
+            return self.logger.is_enabled(msg_type)
+        return True
+
     def print_line(self, msg_type='INFO', suppress_timestamp=False):
         self.print_log('-'*25, msg_type, suppress_timestamp)
 
-    def print_log(self, message, msg_type='INFO', suppress_timestamp=False):
+    def print_log(self, message, msg_type='INFO', suppress_timestamp=False, args=None, fields=None):
+        if not self.is_enabled(msg_type):
+            return
+
+        if args is not None:
+            message = message % args
+        elif callable(message):
+            message = message()
+
         if self.logger:
-            self.logger.print_log(message, msg_type, suppress_timestamp)
+            if hasattr(self.logger, 'log_record'):
+                self.logger.log_record(message, msg_type, self.__class__.__name__, fields)
+            else:
+                self.logger.print_log(message, msg_type, suppress_timestamp)
         else:
             if suppress_timestamp:
                 print("%s: %s" % (msg_type, message))
             else:
-                import time
-
-                print("%s-%s: %s" % (time.strftime("%y-%m-%d/%H:%M:%S"), msg_type, message))
+                print("%s-%s: %s" % (format_timestamp(), msg_type, message))
         return
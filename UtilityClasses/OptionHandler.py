@@ -1,6 +1,16 @@
 __author__ = 'Christopher Bock'
 
+import argparse
+import keyword
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from ConfigLoader import ConfigLoader
 from LoggingClass import LoggingClass
+from OptionValidators import ValidationPlan
 
 
 class OptionHandler(LoggingClass):
@@ -10,17 +20,29 @@ class OptionHandler(LoggingClass):
     a boolean and print the error messages also themselves.
     By default only one validator per option may be supplied and trying to override it will result in an error!
     You can change this behaviour by setting the option 'allowReplaceValidator' to True
+    Besides plain functions, the declarative rules in OptionValidators (TypeRule, RangeRule, EnumRule, RegexRule) can be
+    used as validators. If the option 'deferValidation' is True, set_option and load_defaults do not validate but only
+    remember the options set, which are then checked at once by validate_pending_options or validate_all_options.
+    To change a few options temporarily or for a single plot, use scope() instead of setting them, see OptionScope.
     """
 
-    def __init__(self, logger):
-        LoggingClass.__init__(self, logger)
+    def __init__(self, logger, log_level=None):
+        LoggingClass.__init__(self, logger, log_level)
         self.Options = {}
         self.validators = {}
+        self._frozen = None
+        # incremented whenever an option changes, OptionScope uses it to invalidate its caches
+        self._version = 0
+        # stacks of the scopes entered as context managers, one per thread, see OptionScope
+        self._scopes = threading.local()
+        self._validation_plan = None
+        self._pending_validation = set()
 
         self.DefaultOptions = {
             'suppressValidtorWarnings': True,
             'suppressOptionWarnings': True,
             'allowReplaceValidator': False,
+            'deferValidation': False,
         }
 
         for key, value in self.DefaultOptions.iteritems():
@@ -33,6 +55,8 @@ class OptionHandler(LoggingClass):
         self.mappings = {}
         self.help_texts = {}
         self.defaults = {}
+        # the argument parser is built on first use and rebuilt only after another terminal argument has been added
+        self._parser = None
 
         return
 
@@ -51,11 +75,11 @@ class OptionHandler(LoggingClass):
 
     def add_terminal_argument(self, shorthand, long_name, help_text, maps_to, default):
         if shorthand in self.shorthands:
-            self.print_log('Option %s is already being parsed!', 'ERROR')
+            self.print_log('Option %s is already being parsed!', 'ERROR', args=(shorthand,))
             return
 
-        if long_name in self.long_names.keys():
-            self.print_log('The long name of option %s, %s, is already used!', 'ERROR')
+        if long_name in self.long_names:
+            self.print_log('The long name of option %s, %s, is already used!', 'ERROR', args=(shorthand, long_name))
             return
 
         self.shorthands.append(shorthand)
@@ -63,27 +87,35 @@ class OptionHandler(LoggingClass):
         self.help_texts[shorthand] = help_text
         self.mappings[shorthand] = maps_to
         self.defaults[shorthand] = default
+        if self._parser is not None:
+            # extending the parser, building it anew would import modules, see RootEnvironment.preload
+            self._parser.add_argument(shorthand, long_name, help=help_text, default=default)
 
         return
 
-    def parse_arguments_terminal(self):
-        import argparse
+    def get_argument_parser(self):
+        if self._parser is None:
+            parser = argparse.ArgumentParser()
+            parser.add_argument('-c', '--config', help='Path to the config file to use.')
+            parser.add_argument('-d', '--debug', help='Enable debug mode!')
 
-        parser = argparse.ArgumentParser()
-        parser.add_argument('-c', '--config', help='Path to the config file to use.')
-        parser.add_argument('-d', '--debug', help='Enable debug mode!')
+            for shorthand in self.shorthands:
+                parser.add_argument(shorthand, self.long_names[shorthand], help=self.help_texts[shorthand],
+                                    default=self.defaults[shorthand])
+            self._parser = parser
 
-        for shorthand in self.shorthands:
-            parser.add_argument(shorthand, self.long_names[shorthand], help=self.help_texts[shorthand],
-                                default=self.defaults[shorthand])
+        return self._parser
 
-        args = parser.parse_args()
+    def parse_arguments_terminal(self):
+        args = self.get_argument_parser().parse_args()
         if args.debug:
             self.set_option('debug', True)
 
         for shorthand in self.shorthands:
-            self.print_log('Mapping: %s to %s' % (shorthand, self.long_names[shorthand].replace('--', '')))
+            self.print_log('Mapping: %s to %s', args=(shorthand, self.long_names[shorthand].replace('--', '')))
             self.Options[self.mappings[shorthand]] = eval('args.%s' % self.long_names[shorthand].replace('--', ''))
+        self._frozen = None
+        self._version += 1
 
         # this has to be the last config option to be checked!!
         if args.config:
@@ -92,8 +124,7 @@ class OptionHandler(LoggingClass):
         return True
 
     def parse_arguments_config_file(self, path_config_file='default.cfg'):
-        self.print_log('Parsing configuration file %s' % path_config_file, 'INFO')
-        import os
+        self.print_log('Parsing configuration file %s', 'INFO', args=(path_config_file,))
 
         if not os.path.exists(path_config_file):
             self.print_log('Config file does not exist! Aborting!', 'ERROR')
@@ -110,8 +141,8 @@ class OptionHandler(LoggingClass):
                 line = line.split(';')
                 if len(line) > 2:
                     if not self.parse_option_from_cfg_file(line):
-                        self.print_log('Unable to parse option %s from config file %s.' % (str(line), path_config_file),
-                                      'ERROR')
+                        self.print_log('Unable to parse option %s from config file %s.', 'ERROR',
+                                       args=(line, path_config_file))
                         self.print_log('Options have to be specified in the following manner: ', 'ERROR')
                         self.print_log('Name of the option;option value;option type', 'ERROR')
                         self.print_log(
@@ -128,6 +159,46 @@ class OptionHandler(LoggingClass):
                     self.set_option(line[0].strip(), True)
         return True
 
+    def load_config_file(self, path_config_file='default.cfg', use_cache=True, cache_directory=None):
+        """
+        Faster and safer alternative to parse_arguments_config_file reading the same format. Values are converted
+        using a fixed table of types instead of eval, 'include other.cfg' lines read further config files and the parsed
+        content is cached on disk as long as the files do not change. See ConfigLoader for details.
+        """
+        self.print_log('Loading configuration file %s', 'INFO', args=(path_config_file,))
+
+        start_time = time.time()
+        loader = ConfigLoader(self.logger, cache_directory, use_cache)
+        loader.log_level = self.log_level
+        try:
+            entries = loader.load(path_config_file)
+        except (IOError, OSError, ValueError) as exception:
+            self.print_log('Unable to load config file %s: %s', 'ERROR', args=(path_config_file, exception),
+                           fields={'config_file': path_config_file, 'error': str(exception)})
+            return False
+
+        success = True
+        for key, value in entries:
+            if not self.set_option(key, value):
+                success = False
+
+        duration = time.time() - start_time
+        self.print_log('Loaded %i options from %s in %.3f s.', 'DEBUG', args=(len(entries), path_config_file, duration),
+                       fields={'config_file': path_config_file, 'n_options': len(entries), 'success': success,
+                               'duration': duration})
+
+        return success
+
+    def watch_config(self, path_config_file, callback=None, use_inotify=True):
+        """
+        Loads the config file and returns a ConfigWatcher, whose poll() applies later changes of the file, setting only
+        the options which changed. callback is called with a dictionary option name -> (old value, new value) whenever
+        options have been changed.
+        """
+        from ConfigWatcher import ConfigWatcher
+
+        return ConfigWatcher(self, path_config_file, self.logger, [callback] if callback else None, use_inotify)
+
     def parse_option_from_cfg_file(self, option_array):
         if not option_array:
             self.print_log('Tried to parse an option from a config file without specifing an option array!', 'ERROR')
@@ -153,38 +224,42 @@ class OptionHandler(LoggingClass):
         """
         if validator:
             if not self.set_validator(key, validator):
-                self.print_log(
-                    'Could not set the option %s because the validator you supplied, %s, caused a problem!' % (
-                    str(key), str(validator)), 'ERROR')
+                self.print_log('Could not set the option %s because the validator you supplied, %s, caused a problem!',
+                               'ERROR', args=(key, validator))
                 return False
 
-        if key in self.validators.keys():
-            if not self.validators[key](value):
-                self.print_log('Could not verify option %s, with value %s against validator %s!' % (
-                               str(key), str(value), str(validator)), 'ERROR')
+        if key in self.validators:
+            if self.Options.get('deferValidation'):
+                self._pending_validation.add(key)
+            elif not self.validators[key](value):
+                self.print_log('Could not verify option %s, with value %s against validator %s!', 'ERROR',
+                               args=(key, value, self.validators[key]))
                 return False
 
         if not self.get_option('suppressOptionWarnings'):
-            if key in self.Options.keys():
-                self.print_log('You are overriding option %s. Replacing value %s by %s.' % (
-                               str(key), str(self.Options[key]), str(value)), 'WARNING')
+            if key in self.Options:
+                self.print_log('You are overriding option %s. Replacing value %s by %s.', 'WARNING',
+                               args=(key, self.Options[key], value))
 
         self.Options[key] = value
         setattr(self, key, value)
+        self._frozen = None
+        self._version += 1
 
         return True
 
     def set_validator(self, key, validator):
-        if key in self.validators.keys():
+        if key in self.validators:
             if not self.get_option('allowReplaceValidator'):
-                self.print_log('A validator for %s is already in place! You tried to override %s with %s.' % (
-                str(key), str(self.validators[key]), str(validator)), 'ERROR')
+                self.print_log('A validator for %s is already in place! You tried to override %s with %s.', 'ERROR',
+                               args=(key, self.validators[key], validator))
                 return False
             else:
-                self.print_log('You are overriding the validator for %s! Overreding %s with %s.' % (
-                str(key), str(self.validators[key]), str(validator)), 'WARNING')
+                self.print_log('You are overriding the validator for %s! Overreding %s with %s.', 'WARNING',
+                               args=(key, self.validators[key], validator))
 
         self.validators[key] = validator
+        self._validation_plan = None
         return True
 
     def load_defaults(self, defaultOptions, defaultValidators=None, overrideByDefaults=False):
@@ -206,74 +281,354 @@ class OptionHandler(LoggingClass):
         return
 
     def get_option(self, key):
-        if not key in self.Options.keys():
-            self.print_log('Tried to access an option (%s) which has not yet been specified!' % key, 'WARNING')
+        active_scope = self._get_active_scope()
+        if active_scope is not None:
+            return active_scope.get_option(key)
+
+        if key not in self.Options:
+            self.print_log('Tried to access an option (%s) which has not yet been specified!', 'WARNING', args=(key,))
             return None
         return self.Options[key]
 
+    def freeze(self):
+        """
+        Returns an immutable snapshot of the current options, see FrozenOptions. The snapshot is cached until the next
+        option is set, hence calling freeze() repeatedly is cheap. Within the with block of an OptionScope, the snapshot
+        of the scope is returned.
+        """
+        active_scope = self._get_active_scope()
+        if active_scope is not None:
+            return active_scope.freeze()
+        return self._snapshot()
+
+    def scope(self, overrides=None, **keyword_overrides):
+        """
+        Returns an OptionScope overriding the options given as dictionary and/or keyword arguments, e.g.
+        options.scope(ratio_maximum=3.0). Only the overridden options are validated, this handler is not changed.
+        """
+        return OptionScope(self, overrides, **keyword_overrides)
+
+    def get_version(self):
+        return self._version
+
+    def _get_scope_stack(self):
+        stack = getattr(self._scopes, 'stack', None)
+        if stack is None:
+            stack = self._scopes.stack = []
+        return stack
+
+    def _get_active_scope(self):
+        stack = getattr(self._scopes, 'stack', None)
+        if stack:
+            return stack[-1]
+        return None
+
+    def _resolve(self, key):
+        return self.Options[key]
+
+    def _snapshot(self):
+        if self._frozen is None:
+            self._frozen = FrozenOptions.create(self.Options)
+        return self._frozen
+
     def has_option(self, key):
-        return key in self.Options.keys()
+        return key in self.Options
 
     def has_validator(self, key):
-        return key in self.validators.keys()
+        return key in self.validators
 
-    def validate_all_options(self):
+    def get_validation_plan(self):
+        """
+        Returns all validators compiled into one ValidationPlan, which is rebuilt only if a validator changed.
+        """
+        if self._validation_plan is None:
+            self._validation_plan = ValidationPlan(self.validators)
+        return self._validation_plan
+
+    def validate_pending_options(self, profile=False):
+        """
+        Validates only the options which have been set while 'deferValidation' was True and returns a
+        ValidationReport, which evaluates to True if all of them are valid. Invalid options are reported as errors.
+        """
+        report = self.get_validation_plan().validate(self.Options, self._pending_validation, profile)
+        self._pending_validation = set()
+
+        self.print_validation_report(report, 'ERROR')
+
+        return report
+
+    def validate_all_options(self, profile=False):
         """
         this will validate all options, if the option 'suppressValidtorWarnings' is False (defaults to True),
         a list of all options without a validator will be printed
-        returns True if all options for which validators have been supplied are valid
+        returns a ValidationReport, which evaluates to True if all options for which validators have been supplied are
+        valid. If profile is True, the time spent on each validator is recorded in the report as well.
         """
-        optionsWithoutValidator = []
-        notValidOptions = []
-
-        for key in self.Options.keys():
-            if key in self.validators.keys():
-                if not self.validators[key](self.Options[key]):
-                    notValidOptions.append(key)
-            else:
-                optionsWithoutValidator.append(key)
+        report = self.get_validation_plan().validate(self.Options, profile=profile)
+        self._pending_validation = set()
 
-        if not self.get_option('suppressValidtorWarnings'):
+        if not self.get_option('suppressValidtorWarnings') and self.is_enabled('WARNING'):
             msg_type = 'WARNING'
             self.print_line(msg_type)
             self.print_log("  The following validators are missing:  ", msg_type)
 
-            for key in optionsWithoutValidator:
-                self.print_log('     %s' % str(key), msg_type)
+            for key in report.missing_validators:
+                self.print_log('     %s', msg_type, args=(key,))
 
             self.print_log("  End of missing validator list ", msg_type)
             self.print_line(msg_type)
 
-        msg_type = 'ERROR'
+        self.print_validation_report(report, 'ERROR')
+
+        return report
+
+    def print_validation_report(self, report, msg_type='ERROR'):
+        if not self.is_enabled(msg_type):
+            return
+
         self.print_line(msg_type)
         self.print_log("  The following options are invalid:  ", msg_type)
 
-        for key in notValidOptions:
-            self.print_log('     %s' % str(key), msg_type)
+        for key, value, message in report.errors:
+            self.print_log('     %s = %s: %s', msg_type, args=(key, value, message))
 
         self.print_log("  End of invalid option list ", msg_type)
         self.print_line(msg_type)
-
-        return len(notValidOptions) <= 0
+        return
 
     def print_options(self, msg_type='DEBUG'):
+        if not self.is_enabled(msg_type):
+            return
+
         self.print_line(msg_type)
         self.print_log("  The following options have been supplied  ", msg_type)
 
         for key, value in self.Options.iteritems():
-            self.print_log('    ' + str(key) + '  ->  ' + str(value), msg_type)
+            self.print_log('    %s  ->  %s', msg_type, args=(key, value))
 
-        self.print_log("  End of option listing  ")
+        self.print_log("  End of option listing  ", msg_type)
         self.print_line(msg_type)
         return
 
     def print_validators(self, msg_type='DEBUG'):
+        if not self.is_enabled(msg_type):
+            return
+
         self.print_line(msg_type)
         self.print_log("  The following validators have been supplied  ", msg_type)
 
         for key, validator in self.validators.iteritems():
-            self.print_log('    ' + str(key) + '  ->  ' + str(validator), msg_type)
+            self.print_log('    %s  ->  %s', msg_type, args=(key, validator))
 
-        self.print_log("  End of validator listing  ")
+        self.print_log("  End of validator listing  ", msg_type)
         self.print_line(msg_type)
         return
+
+
+class OptionScope(object):
+    """
+    Copy-on-write overlay of an OptionHandler, created by OptionHandler.scope (or OptionScope.scope for nested
+    overlays). A scope stores and validates only the options it overrides, all other options are read through from the
+    parent, which is never modified. Resolved options and the FrozenOptions snapshot returned by freeze() are cached
+    until an option of the scope or of one of its parents is set. A scope can be passed to RatioHistogram.plot or used
+    as context manager, in which case the handler itself resolves its options through the scope inside the block:
+
+        plotter.plot('zoomed', options=plotter.options.scope(ratio_maximum=3.0))
+
+        with plotter.options.scope(ratio_maximum=3.0, draw_legend=False):
+            plotter.plot('zoomed')
+
+    Options set on a scope do not end up in the handler, options set on the handler within the block do. Entering a
+    scope only affects the thread doing so, other threads using the same handler (e.g. the request handlers of
+    PlotServer) do not see it, and scopes entered within the block of another one take precedence until they are left.
+    """
+
+    def __init__(self, parent, overrides=None, **keyword_overrides):
+        self.parent = parent
+        self.handler = parent.handler if isinstance(parent, OptionScope) else parent
+        self.overrides = {}
+
+        self._version = 0
+        self._cache = {}
+        self._cache_version = None
+        self._frozen = None
+        self._frozen_version = None
+
+        if overrides:
+            keyword_overrides.update(overrides)
+        for key, value in keyword_overrides.items():
+            self.set_option(key, value)
+
+        pass
+
+    def __getitem__(self, key):
+        return self.get_option(key)
+
+    def __setitem__(self, key, value):
+        return self.set_option(key, value)
+
+    def __enter__(self):
+        self.handler._get_scope_stack().append(self)
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        stack = self.handler._get_scope_stack()
+        # the innermost entry, scopes left out of order by calling __exit__ directly keep the others intact
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index] is self:
+                del stack[index]
+                break
+        return False
+
+    def scope(self, overrides=None, **keyword_overrides):
+        return OptionScope(self, overrides, **keyword_overrides)
+
+    def set_option(self, key, value):
+        """
+        Overrides the option within this scope, after checking the value with the validator of the handler if there is
+        one. Returns False if the value is invalid, the option is not overridden in that case.
+        """
+        validator = self.handler.validators.get(key)
+        if validator is not None and not validator(value):
+            self.handler.print_log('Could not verify option %s, with value %s against validator %s!', 'ERROR',
+                                   args=(key, value, validator))
+            return False
+
+        self.overrides[key] = value
+        self._version += 1
+
+        return True
+
+    def get_option(self, key):
+        version = self.get_version()
+        if version != self._cache_version:
+            self._cache = {}
+            self._cache_version = version
+
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        try:
+            value = self._resolve(key)
+        except KeyError:
+            self.handler.print_log('Tried to access an option (%s) which has not yet been specified!', 'WARNING',
+                                   args=(key,))
+            return None
+
+        self._cache[key] = value
+        return value
+
+    def has_option(self, key):
+        return key in self.overrides or self.parent.has_option(key)
+
+    def freeze(self):
+        """
+        Returns the FrozenOptions snapshot of the parent with the overrides of this scope applied.
+        """
+        return self._snapshot()
+
+    def get_version(self):
+        return self.parent.get_version(), self._version
+
+    def _resolve(self, key):
+        if key in self.overrides:
+            return self.overrides[key]
+        return self.parent._resolve(key)
+
+    def _snapshot(self):
+        if not self.overrides:
+            return self.parent._snapshot()
+
+        version = self.get_version()
+        if self._frozen is None or self._frozen_version != version:
+            self._frozen = self.parent._snapshot().derive(self.overrides)
+            self._frozen_version = version
+
+        return self._frozen
+
+
+class FrozenOptions(object):
+    """
+    Read-only snapshot of the options of an OptionHandler, meant for hot code paths. Options can be read as attributes,
+    e.g. options.ratio_maximum, which are stored in slots, or via options['ratio_maximum'], which is a plain dictionary
+    lookup. Neither logs nor validates anything and missing options raise an AttributeError or KeyError respectively.
+    Options whose names are not valid identifiers or clash with a method name are only available via [].
+    Note that the values themselves are not copied, mutable values such as lists should not be modified.
+    """
+
+    __slots__ = ('_values',)
+
+    # one class per set of option names, so that every option name can be a slot. Only the classes of the max_classes
+    # most recently used sets of names are kept, as every new option name leads to a new set of names.
+    _classes = OrderedDict()
+    _classes_lock = threading.Lock()
+    max_classes = 32
+
+    @classmethod
+    def create(cls, options):
+        identifier = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+        names = tuple(sorted([str(key) for key in options if isinstance(key, str) and identifier.match(key) and
+                              not keyword.iskeyword(key) and not hasattr(FrozenOptions, key)]))
+
+        with cls._classes_lock:
+            frozen_class = cls._classes.pop(names, None)
+            if frozen_class is None:
+                frozen_class = type('FrozenOptions', (FrozenOptions,), {'__slots__': names})
+                while len(cls._classes) >= cls.max_classes:
+                    cls._classes.popitem(last=False)
+            # (re-)inserting the class marks it as the most recently used one
+            cls._classes[names] = frozen_class
+
+        snapshot = frozen_class.__new__(frozen_class)
+        object.__setattr__(snapshot, '_values', dict(options))
+        for name in names:
+            object.__setattr__(snapshot, name, options[name])
+
+        return snapshot
+
+    def derive(self, overrides):
+        """
+        Returns a new snapshot with the options in overrides replaced. Unless new options are added, the snapshot
+        shares the class of this one.
+        """
+        values = dict(self._values)
+        values.update(overrides)
+        if len(values) != len(self._values):
+            return FrozenOptions.create(values)
+
+        frozen_class = type(self)
+        snapshot = frozen_class.__new__(frozen_class)
+        object.__setattr__(snapshot, '_values', values)
+        for name in frozen_class.__slots__:
+            object.__setattr__(snapshot, name, values[name])
+
+        return snapshot
+
+    def __setattr__(self, key, value):
+        raise AttributeError('FrozenOptions are read-only, can not set %s' % key)
+
+    def __delattr__(self, key):
+        raise AttributeError('FrozenOptions are read-only, can not delete %s' % key)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __iter__(self):
+        return iter(self._values.values())
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def keys(self):
+        return list(self._values)
+
+    def iteritems(self):
+        return iter(self._values.items())
@@ -0,0 +1,231 @@
+__author__ = 'Christopher Bock'
+
+import re
+import time
+
+
+class OptionRule(object):
+    """
+    Base class of the declarative validators. Rules can be used wherever OptionHandler expects a validator, as calling
+    a rule with a value returns whether the value is valid. In addition, every rule can be compiled into a check
+    function returning None for valid values and an error message otherwise, which is what ValidationPlan uses.
+    """
+
+    _compiled_check = None
+
+    def __call__(self, value):
+        if self._compiled_check is None:
+            self._compiled_check = self.compile()
+        return self._compiled_check(value) is None
+
+    def compile(self):
+        raise NotImplementedError('%s does not implement compile()' % self.__class__.__name__)
+
+
+class TypeRule(OptionRule):
+    """
+    Accepts values which are instances of any of the given types.
+    """
+
+    def __init__(self, *types):
+        self.types = types
+
+    def __repr__(self):
+        return 'TypeRule(%s)' % ', '.join([option_type.__name__ for option_type in self.types])
+
+    def compile(self):
+        types = self.types
+        message = 'expected a value of type %s' % ' or '.join([option_type.__name__ for option_type in types])
+
+        def check(value):
+            if isinstance(value, types):
+                return None
+            return message
+        return check
+
+
+class RangeRule(OptionRule):
+    """
+    Accepts values with minimum <= value <= maximum, either limit can be None.
+    """
+
+    def __init__(self, minimum=None, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __repr__(self):
+        return 'RangeRule(%s, %s)' % (self.minimum, self.maximum)
+
+    def compile(self):
+        minimum = self.minimum
+        maximum = self.maximum
+        message = 'expected a value in [%s, %s]' % (minimum, maximum)
+
+        def check(value):
+            try:
+                if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                    return message
+            except TypeError:
+                return message
+            return None
+        return check
+
+
+class EnumRule(OptionRule):
+    """
+    Accepts only the given values.
+    """
+
+    def __init__(self, *values):
+        self.values = values
+
+    def __repr__(self):
+        return 'EnumRule(%s)' % ', '.join([repr(value) for value in self.values])
+
+    def compile(self):
+        try:
+            allowed = frozenset(self.values)
+        except TypeError:
+            allowed = list(self.values)
+        message = 'expected one of %s' % ', '.join([repr(value) for value in self.values])
+
+        def check(value):
+            try:
+                if value in allowed:
+                    return None
+            except TypeError:
+                pass
+            return message
+        return check
+
+
+class RegexRule(OptionRule):
+    """
+    Accepts strings matching the given regular expression (using re.match, i.e. anchored at the start).
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+    def __repr__(self):
+        return 'RegexRule(%r)' % self.pattern
+
+    def compile(self):
+        expression = re.compile(self.pattern)
+        message = 'expected a string matching %r' % self.pattern
+
+        def check(value):
+            try:
+                if expression.match(value):
+                    return None
+            except TypeError:
+                pass
+            return message
+        return check
+
+
+class AllOf(OptionRule):
+    """
+    Combines several rules, a value has to satisfy all of them. Checks stop at the first failing rule.
+    """
+
+    def __init__(self, *rules):
+        self.rules = rules
+
+    def __repr__(self):
+        return 'AllOf(%s)' % ', '.join([repr(rule) for rule in self.rules])
+
+    def compile(self):
+        checks = [rule.compile() for rule in self.rules]
+
+        def check(value):
+            for single_check in checks:
+                message = single_check(value)
+                if message is not None:
+                    return message
+            return None
+        return check
+
+
+def compile_validator(validator):
+    """
+    Turns a validator into a check function returning None or an error message. Plain functions returning a boolean
+    are wrapped, declarative rules are compiled.
+    """
+    if isinstance(validator, OptionRule):
+        return validator.compile()
+
+    message = 'rejected by validator %s' % str(validator)
+
+    def check(value):
+        if validator(value):
+            return None
+        return message
+    return check
+
+
+class ValidationReport(object):
+    """
+    Result of validating options. Evaluates to True if no option is invalid, hence it can be used like the boolean
+    returned by OptionHandler.validate_all_options before. errors is a list of (option name, value, message) tuples.
+    If the validation was profiled, timings maps each checked option to the time spent on its validator.
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.missing_validators = []
+        self.n_checked = 0
+        self.elapsed = 0.
+        self.timings = {}
+
+    def __bool__(self):
+        return not self.errors
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return 'ValidationReport(%i checked, %i invalid, %.6f s)' % (self.n_checked, len(self.errors), self.elapsed)
+
+    def invalid_options(self):
+        return [error[0] for error in self.errors]
+
+
+class ValidationPlan(object):
+    """
+    All validators of an OptionHandler compiled into check functions once, so that validating many options is a single
+    loop without any further dispatch.
+    """
+
+    def __init__(self, validators):
+        self.checks = dict([(key, compile_validator(validator)) for key, validator in validators.items()])
+
+    def validate(self, options, keys=None, profile=False):
+        """
+        Validates the given keys, or all options if keys is None, and returns a ValidationReport.
+        """
+        report = ValidationReport()
+        checks = self.checks
+        if keys is None:
+            keys = options.keys()
+
+        start_time = time.time()
+        for key in keys:
+            check = checks.get(key)
+            if check is None:
+                report.missing_validators.append(key)
+                continue
+
+            value = options[key]
+            if profile:
+                check_start_time = time.time()
+                message = check(value)
+                report.timings[key] = time.time() - check_start_time
+            else:
+                message = check(value)
+
+            report.n_checked += 1
+            if message is not None:
+                report.errors.append((key, value, message))
+        report.elapsed = time.time() - start_time
+
+        return report
@@ -0,0 +1,117 @@
+__author__ = 'Christopher Bock'
+
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from LoggingClass import LoggingClass
+
+
+class OutputWriter(LoggingClass):
+    """
+    Moves rendered files to their destination on a background thread. ROOT itself can not render on another thread, so
+    the canvas is still printed on the calling thread, but into a local temporary directory. Copying the result to the
+    actual output location, which is often a slow network or distributed file system, then overlaps with rendering the
+    next plot. Used by RatioHistogram if the option 'background_output' is True.
+
+        writer = OutputWriter()
+        temporary_file_name = writer.get_temporary_file_name('plots/ratio.pdf')
+        canvas.Print(temporary_file_name, 'pdf')
+        writer.submit(temporary_file_name, 'plots/ratio.pdf', 'plots/ratio')
+        failed = writer.wait()
+    """
+
+    # put on the queue by close to stop the worker thread
+    _stop = object()
+
+    def __init__(self, logger=None, temporary_directory=None):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.temporary_directory = tempfile.mkdtemp(prefix='pyUtilityClasses_output_', dir=temporary_directory)
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._failed = {}
+        self._n_files = 0
+        self._lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._move_files, name='OutputWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+        import atexit
+        atexit.register(self.close)
+
+        pass
+
+    def get_temporary_file_name(self, output_file_name):
+        """
+        Returns a unique file name inside the temporary directory, keeping the extension of output_file_name.
+        """
+        with self._lock:
+            self._n_files += 1
+            n_files = self._n_files
+        return os.path.join(self.temporary_directory, '%i_%s' % (n_files, os.path.basename(output_file_name)))
+
+    def submit(self, temporary_file_name, output_file_name, key=None):
+        """
+        Queues moving temporary_file_name to output_file_name. If the move fails, key (by default output_file_name) is
+        reported by wait.
+        """
+        self._queue.put((temporary_file_name, output_file_name, key or output_file_name))
+
+        pass
+
+    def wait(self):
+        """
+        Blocks until all queued files have been moved. Returns a dictionary key -> error message of the files which
+        could not be moved since the last call.
+        """
+        self._queue.join()
+
+        with self._lock:
+            failed = self._failed
+            self._failed = {}
+        return failed
+
+    def close(self):
+        """
+        Moves the remaining files, stops the background thread and removes the temporary directory.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        self._queue.put(self._stop)
+        self._thread.join()
+        shutil.rmtree(self.temporary_directory, ignore_errors=True)
+
+        pass
+
+    def _move_files(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is self._stop:
+                    return
+
+                temporary_file_name, output_file_name, key = task
+                try:
+                    directory = os.path.dirname(os.path.abspath(output_file_name))
+                    if not os.path.isdir(directory):
+                        os.makedirs(directory)
+                    shutil.move(temporary_file_name, output_file_name)
+                except (IOError, OSError) as exception:
+                    self.print_log('Could not write %s: %s', 'ERROR', args=(output_file_name, exception))
+                    with self._lock:
+                        self._failed[key] = str(exception)
+                    if os.path.exists(temporary_file_name):
+                        os.remove(temporary_file_name)
+            finally:
+                self._queue.task_done()
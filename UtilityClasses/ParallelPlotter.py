@@ -0,0 +1,248 @@
+__author__ = 'Christopher Bock'
+
+from ArrayHistogram import ArrayHistogram
+from HistogramStore import StoredHistogram, open_histogram_store
+from HistogramStyler import apply_histogram_styler
+from LoggingClass import LOG_LEVELS, LoggingClass
+from RatioHistogram import PlotResult
+from RootEnvironment import get_root_environment
+from RootFilePool import LazyHistogram, RootFileHistogram, get_default_file_pool
+
+
+# the RatioHistogram used by each worker process, created once by _initialize_worker
+_worker_plotter = None
+
+
+class _WorkerLogger(object):
+    """
+    Logger of the worker processes. The records are sent to the process which created the pool, which hands them to its
+    own logger one after another, instead of every worker printing to the console on its own.
+    """
+
+    def __init__(self, queue, log_level):
+        self.queue = queue
+        self.log_level = log_level
+
+        pass
+
+    def is_enabled(self, msg_type='INFO'):
+        return LOG_LEVELS.get(msg_type, 20) >= self.log_level
+
+    def log_record(self, message, msg_type, source, fields):
+        self.queue.put((message, msg_type, source, fields))
+
+        pass
+
+
+def _initialize_worker(option_values, log_queue=None, log_level=0):
+    global _worker_plotter
+    from RatioHistogram import RatioHistogram
+
+    logger = _WorkerLogger(log_queue, log_level) if log_queue is not None else None
+
+    environment = get_root_environment()
+    environment.logger = logger
+    ROOT = environment.get_root(True)
+    ROOT.TH1.AddDirectory(False)
+
+    _worker_plotter = RatioHistogram(logger=logger)
+    for key, value in option_values.items():
+        _worker_plotter.options[key] = value
+
+    return
+
+
+def _resolve_histogram(histogram):
+    if isinstance(histogram, StoredHistogram):
+        return open_histogram_store(histogram.file_name).get_histogram(histogram.name)
+    if isinstance(histogram, RootFileHistogram):
+        return LazyHistogram(get_default_file_pool(), histogram.file_name, histogram.histogram_name)
+    return histogram
+
+
+def _render_plots(plots):
+    jobs = []
+    for output_file_name, histograms, plot_arguments in plots:
+        job = dict(plot_arguments)
+        job['output_file_name'] = output_file_name
+        job['histograms'] = [(_resolve_histogram(histogram), name_in_legend) for histogram, name_in_legend in histograms]
+        jobs.append(job)
+
+    return _worker_plotter.plot_many(jobs)
+
+
+class ParallelPlotter(LoggingClass):
+    """
+    Renders many ratio plots using a pool of worker processes. ROOT relies on global state (gStyle, gROOT) and can not
+    be used from several threads at once, hence every worker is a separate process which sets up ROOT and one
+    RatioHistogram once and then draws its share of the plots via RatioHistogram.plot_many. The histograms are handed
+    to the workers as ArrayHistogram objects, i.e. plain bin arrays together with titles, style and the axis attributes
+    supported by ArrayAxis, instead of pickled ROOT objects. Anything else a styling function changes on a ROOT
+    histogram (e.g. bin labels or attached functions) does not reach the workers. Histograms
+    referenced as StoredHistogram(file_name, name) or RootFileHistogram(file_name, histogram_name) are not transferred
+    at all, every worker maps the HistogramStore or reads the ROOT file itself. The options supplied to the constructor
+    are set on the RatioHistogram of every worker. The workers log messages passing log_level through the logger of
+    the ParallelPlotter, so their output does not interleave. create_pool, render_async and close_pool give access to
+    the warm workers without going through run(), e.g. for PlotServer.
+    """
+
+    def __init__(self, logger=None, n_processes=None, options=None, chunk_size=None, log_level=None):
+        LoggingClass.__init__(self, logger=logger, log_level=log_level)
+
+        self.n_processes = n_processes
+        self.options = dict(options or {})
+        self.chunk_size = chunk_size
+
+        self.plots = []
+
+        # queue and thread forwarding the log records of the workers, per pool
+        self._log_forwarders = {}
+
+        pass
+
+    def add_plot(self, output_file_name, histograms, **plot_arguments):
+        """
+        histograms is either a list of (histogram, name_in_legend) or (histogram, name_in_legend, histogram_styler)
+        tuples or a dictionary name -> histogram. Styling functions are applied right away as they generally can not be
+        transferred to other processes. All other keyword arguments are passed on to RatioHistogram.plot.
+        Histograms can also be given as StoredHistogram or RootFileHistogram references. As long as no styling function
+        is supplied for them, only the reference is sent to the workers.
+        """
+        if isinstance(histograms, dict):
+            histograms = [(histogram, name) for name, histogram in histograms.items()]
+
+        array_histograms = []
+        for entry in histograms:
+            histogram = entry[0]
+            if isinstance(histogram, (StoredHistogram, RootFileHistogram)):
+                name_in_legend = entry[1] if len(entry) > 1 and entry[1] else histogram[1]
+                if not (len(entry) > 2 and entry[2]):
+                    array_histograms.append((histogram, name_in_legend))
+                    continue
+                histogram = _resolve_histogram(histogram)
+                if isinstance(histogram, LazyHistogram):
+                    histogram = histogram.load()
+
+            name_in_legend = entry[1] if len(entry) > 1 and entry[1] else histogram.GetName()
+            if len(entry) > 2 and entry[2]:
+                apply_histogram_styler(entry[2], histogram, name_in_legend)
+
+            if not isinstance(histogram, ArrayHistogram):
+                histogram = ArrayHistogram.from_root(histogram)
+            array_histograms.append((histogram, name_in_legend))
+
+        self.plots.append((output_file_name, array_histograms, plot_arguments))
+
+        pass
+
+    def create_pool(self, n_processes=None):
+        """
+        Returns a multiprocessing pool of n_processes (by default self.n_processes or the number of CPUs) workers, each
+        of which sets up ROOT and a RatioHistogram holding the options once when it is started. Close it using
+        close_pool.
+        """
+        import multiprocessing
+        import threading
+
+        # forking while ROOT is being imported on another thread would leave the workers with a half imported ROOT
+        get_root_environment().wait()
+
+        log_queue = multiprocessing.Queue()
+        forwarder = threading.Thread(target=self._forward_worker_logs, args=(log_queue,), name='ParallelPlotterLog')
+        forwarder.daemon = True
+        forwarder.start()
+
+        pool = multiprocessing.Pool(n_processes or self.n_processes or multiprocessing.cpu_count(), _initialize_worker,
+                                    (self.options, log_queue, self.log_level))
+        self._log_forwarders[id(pool)] = (log_queue, forwarder)
+
+        return pool
+
+    def close_pool(self, pool, wait=True):
+        """
+        Stops the workers of a pool created by create_pool, waiting for submitted plots to finish if wait is True and
+        terminating the workers otherwise.
+        """
+        if wait:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+        log_queue, forwarder = self._log_forwarders.pop(id(pool), (None, None))
+        if log_queue is not None:
+            log_queue.put(None)
+            forwarder.join()
+
+        pass
+
+    def _forward_worker_logs(self, log_queue):
+        while True:
+            record = log_queue.get()
+            if record is None:
+                return
+
+            message, msg_type, source, fields = record
+            if self.logger is not None and hasattr(self.logger, 'log_record'):
+                if self.is_enabled(msg_type):
+                    self.logger.log_record(message, msg_type, source, fields)
+            else:
+                self.print_log(message, msg_type, fields=fields)
+
+    @staticmethod
+    def render_async(pool, plots):
+        """
+        Renders a list of (output_file_name, histograms, plot_arguments) tuples, as created by add_plot, on one worker of
+        a pool created by create_pool. Returns the AsyncResult of the list of PlotResult tuples.
+        """
+        return pool.apply_async(_render_plots, (plots,))
+
+    def run(self):
+        """
+        Renders all plots added so far and returns a list of PlotResult tuples in the order the plots have been added.
+        """
+        import multiprocessing
+        import time
+
+        n_processes = self.n_processes or multiprocessing.cpu_count()
+        chunk_size = self.chunk_size
+        if not chunk_size:
+            # a few chunks per process keep the load balanced while amortising the transfer overhead
+            chunk_size = max(1, len(self.plots) // (4 * n_processes))
+
+        chunks = [self.plots[i:i + chunk_size] for i in range(0, len(self.plots), chunk_size)]
+
+        self.print_log('Rendering %i plots in %i chunks using %i processes.', args=(len(self.plots), len(chunks),
+                                                                                    n_processes))
+
+        start_time = time.time()
+        pool = self.create_pool(n_processes)
+        finished = False
+        try:
+            pending = [self.render_async(pool, chunk) for chunk in chunks]
+
+            results = []
+            for chunk, pending_chunk in zip(chunks, pending):
+                try:
+                    results.extend(pending_chunk.get())
+                except Exception as exception:
+                    self.print_log('A worker failed to render %i plots: %s', 'ERROR', args=(len(chunk), exception))
+                    results.extend([PlotResult(plot[0], False, 0., str(exception)) for plot in chunk])
+            finished = True
+        finally:
+            # letting the workers exit on their own makes sure their last log records arrive
+            self.close_pool(pool, wait=finished)
+
+        elapsed_time = time.time() - start_time
+        n_failed = len([result for result in results if not result.success])
+        self.print_log('Rendered %i plots in %.2f s (%.1f plots per second), %i failed.', args=(
+                       len(results), elapsed_time, len(results) / elapsed_time if elapsed_time else 0., n_failed))
+        for result in results:
+            if result.error:
+                self.print_log('Failed plot: %s (%s)', 'WARNING', args=(result.output_file_name, result.error))
+            elif not result.success:
+                self.print_log('Failed plot: %s', 'WARNING', args=(result.output_file_name,))
+
+        self.plots = []
+
+        return results
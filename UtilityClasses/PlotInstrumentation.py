@@ -0,0 +1,152 @@
+__author__ = 'Christopher Bock'
+
+from timeit import default_timer
+
+from LoggingClass import LoggingClass
+
+
+class PlotInstrumentation(object):
+    """
+    Hook interface used by RatioHistogram to report where the time of a plot is spent. Assign an instance to
+    RatioHistogram.instrumentation to enable it; if it is None (the default) no hook is called at all. All methods do
+    nothing, derive from this class and override the ones you are interested in.
+
+    For every plot, plot_started is called first. While the plot is rendered, enter_phase is called whenever the next
+    phase begins, the previous phase ends at that moment. The phases are
+     load       reading histograms from files
+     cache      checking whether the output is up to date (only with a render cache)
+     convert    converting ArrayHistograms into ROOT histograms
+     layout     creating or resetting canvas, pads and legend
+     legend     filling the legend
+     range      determining minimum and maximum of the histograms
+     ratios     computing and drawing the ratio histograms
+     draw       drawing the histograms and the legend
+     output     writing the output file
+    count is called to increment the counters 'histograms_loaded', 'objects_created' (ROOT objects created for the
+    plot), 'layouts_created' and 'bins_processed'. plot_finished ends the last phase. RatioHistogram.plot_many
+    additionally calls batch_started and batch_finished around all of its plots.
+    """
+
+    def batch_started(self):
+        pass
+
+    def plot_started(self, output_file_name):
+        pass
+
+    def enter_phase(self, phase):
+        pass
+
+    def count(self, counter, amount=1):
+        pass
+
+    def plot_finished(self, output_file_name, success):
+        pass
+
+    def batch_finished(self):
+        pass
+
+
+class PlotTimer(PlotInstrumentation, LoggingClass):
+    """
+    Default instrumentation: measures the time spent in each phase and accumulates the counters. A summary of every
+    plot is logged with msg_type plot_msg_type, a summary of all plots since the last batch summary is logged by
+    batch_finished (called by plot_many) or print_summary. Both are logged with the timings attached as fields, see
+    StructuredLogger.
+
+        timer = PlotTimer(logger)
+        plotter.instrumentation = timer
+        ...
+        timer.print_summary()
+    """
+
+    def __init__(self, logger=None, plot_msg_type='DEBUG', batch_msg_type='INFO'):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.plot_msg_type = plot_msg_type
+        self.batch_msg_type = batch_msg_type
+
+        self.phases = {}
+        self.counters = {}
+        self.n_plots = 0
+
+        self._plot_phases = {}
+        self._plot_counters = {}
+        self._plot_start_time = 0.
+        self._phase = None
+        self._phase_start_time = 0.
+
+        pass
+
+    def plot_started(self, output_file_name):
+        self._plot_phases = {}
+        self._plot_counters = {}
+        self._phase = None
+        self._plot_start_time = default_timer()
+
+        pass
+
+    def enter_phase(self, phase):
+        now = default_timer()
+        if self._phase is not None:
+            self._plot_phases[self._phase] = self._plot_phases.get(self._phase, 0.) + now - self._phase_start_time
+        self._phase = phase
+        self._phase_start_time = now
+
+        pass
+
+    def count(self, counter, amount=1):
+        self._plot_counters[counter] = self._plot_counters.get(counter, 0) + amount
+
+        pass
+
+    def plot_finished(self, output_file_name, success):
+        self.enter_phase(None)
+        total = default_timer() - self._plot_start_time
+
+        for phase, duration in self._plot_phases.items():
+            self.phases[phase] = self.phases.get(phase, 0.) + duration
+        for counter, amount in self._plot_counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+        self.phases['total'] = self.phases.get('total', 0.) + total
+        self.n_plots += 1
+
+        if self.is_enabled(self.plot_msg_type):
+            self.print_log('Timing of %s: %s', self.plot_msg_type,
+                           args=(output_file_name, self._format(self._plot_phases, self._plot_counters, total)),
+                           fields={'output_file_name': output_file_name, 'success': success, 'duration': total,
+                                   'phases': self._plot_phases, 'counters': self._plot_counters})
+
+        pass
+
+    def batch_finished(self):
+        self.print_summary()
+
+        pass
+
+    def print_summary(self):
+        """
+        Logs the accumulated timings and counters of all plots since the last summary and resets them.
+        """
+        if self.n_plots:
+            phases = dict(self.phases)
+            total = phases.pop('total', 0.)
+            self.print_log('Timing of %i plots: %s', self.batch_msg_type,
+                           args=(self.n_plots, self._format(phases, self.counters, total)),
+                           fields={'n_plots': self.n_plots, 'duration': total, 'phases': phases,
+                                   'counters': self.counters})
+
+        self.phases = {}
+        self.counters = {}
+        self.n_plots = 0
+
+        pass
+
+    @staticmethod
+    def _format(phases, counters, total):
+        ordered_phases = sorted(phases.items(), key=lambda item: -item[1])
+        text = ', '.join(['%s %.4f s (%.0f%%)' % (phase, duration, 100. * duration / total if total else 0.)
+                          for phase, duration in ordered_phases])
+        text += ', total %.4f s' % total
+        if counters:
+            text += '; ' + ', '.join(['%s %i' % (counter, amount) for counter, amount in sorted(counters.items())])
+        return text
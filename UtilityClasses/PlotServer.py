@@ -0,0 +1,444 @@
+__author__ = 'Christopher Bock'
+
+import errno
+import json
+import os
+import socket
+import stat
+import threading
+import time
+from collections import deque
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from ArrayHistogram import ArrayHistogram
+from ConfigLoader import ConfigLoader
+from HistogramStore import StoredHistogram, _native
+from HistogramStyler import HistogramStyle
+from LoggingClass import LoggingClass
+from ParallelPlotter import ParallelPlotter
+from RatioHistogram import PlotResult, RatioHistogram
+from RootFilePool import RootFileHistogram
+
+
+# keyword arguments of RatioHistogram.plot which can be sent to the server
+_PLOT_ARGUMENTS = ('name_of_canvas', 'log_scale', 'ratio_log_scale', 'ratio_map', 'plot_ratios', 'output_file_types',
+                   'options')
+
+
+def encode_histogram(histogram, name_in_legend=None):
+    """
+    Returns the JSON representation of a histogram as understood by PlotServer. histogram is an ArrayHistogram or a
+    ROOT histogram (sent as bin arrays), a StoredHistogram or a RootFileHistogram (sent as reference and read by the
+    server).
+    """
+    if isinstance(histogram, StoredHistogram):
+        return {'store': histogram.file_name, 'histogram': histogram.name, 'name': name_in_legend or histogram.name}
+    if isinstance(histogram, RootFileHistogram):
+        return {'file': histogram.file_name, 'histogram': histogram.histogram_name,
+                'name': name_in_legend or histogram.histogram_name}
+
+    if not isinstance(histogram, ArrayHistogram):
+        histogram = ArrayHistogram.from_root(histogram)
+
+    encoded = {'name': name_in_legend or histogram.name, 'edges': [float(edge) for edge in histogram.edges],
+               'contents': [float(content) for content in histogram.contents], 'title': histogram.title,
+               'x_title': histogram.x_title, 'y_title': histogram.y_title, 'entries': histogram.entries,
+               'style': dict([(slot, getattr(histogram, slot)) for root_name, slot in ArrayHistogram.style_attributes])}
+    if histogram.errors is not None:
+        encoded['errors'] = [float(error) for error in histogram.errors]
+
+    return encoded
+
+
+def decode_histogram(encoded):
+    """
+    Returns the (histogram, name in legend) tuple described by the output of encode_histogram.
+    """
+    if 'store' in encoded:
+        return StoredHistogram(encoded['store'], encoded['histogram']), encoded.get('name')
+    if 'file' in encoded:
+        return RootFileHistogram(encoded['file'], encoded['histogram']), encoded.get('name')
+
+    histogram = ArrayHistogram(encoded['name'], encoded['edges'], encoded['contents'], encoded.get('errors'),
+                               encoded.get('title', ''), encoded.get('entries', 0.))
+    histogram.x_title = encoded.get('x_title', '')
+    histogram.y_title = encoded.get('y_title', '')
+    if encoded.get('style'):
+        HistogramStyle(**encoded['style']).apply(histogram)
+
+    return histogram, encoded['name']
+
+
+class _UnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                continue
+
+            response = self.server.plot_server.handle_request(line)
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class PlotServer(LoggingClass):
+    """
+    Long-running local plotting daemon. Starting Python, importing ROOT and setting up RatioHistogram and its options
+    takes seconds, which dominates short plotting jobs. The server keeps a pool of ParallelPlotter workers, each with
+    ROOT imported and a RatioHistogram configured from the options and config files given to the constructor, and
+    accepts plot requests on a Unix domain socket (only accessible by the user running the server):
+
+        server = PlotServer('/tmp/plots.sock', n_processes=4, config_files=['plots.cfg'])
+        server.serve_forever()
+
+        client = PlotClient('/tmp/plots.sock')
+        result = client.plot('plots/ratio', [(reference, 'Reference'), (candidate, 'Candidate')], log_scale=True)
+
+    Requests and responses are single lines of JSON. A plot request holds 'output_file_name', 'histograms' (see
+    encode_histogram: bin arrays, HistogramStore or ROOT file references) and optionally the arguments of
+    RatioHistogram.plot listed in _PLOT_ARGUMENTS, 'options' being a dictionary of options overriding the configured
+    ones for this plot. A request {'plots': [...]} renders several plots. The response holds for every plot whether it
+    succeeded, the output files, the time spent rendering ('duration') and the time since it was received ('time'),
+    for several plots as list 'results'. {'command': 'ping' | 'status' | 'shutdown'} requests are answered directly.
+
+    At most max_pending plots (by default four per worker) are queued or rendered at once. Once the limit is reached,
+    requests are not read any further until plots finished, so clients wait instead of piling up work in the server.
+    ROOT files referenced by requests are kept open by the workers, replace them instead of modifying them in place.
+    A socket left behind at socket_path by a server which is no longer running is replaced, any other file is not.
+    """
+
+    def __init__(self, socket_path, logger=None, n_processes=None, options=None, config_files=None, max_pending=None):
+        import multiprocessing
+
+        LoggingClass.__init__(self, logger=logger)
+
+        self.socket_path = os.path.abspath(socket_path)
+        self.n_processes = n_processes or multiprocessing.cpu_count()
+        self.max_pending = max_pending or 4 * self.n_processes
+
+        option_values = {}
+        loader = ConfigLoader(logger)
+        for config_file in config_files or []:
+            option_values.update(dict(loader.load(config_file)))
+        option_values.update(options or {})
+        self.options = option_values
+
+        self.plotter = ParallelPlotter(logger, self.n_processes, option_values)
+
+        self.n_plots = 0
+        self.n_failed = 0
+        self._start_time = None
+        self._pool = None
+        self._server = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+        pass
+
+    def start(self):
+        """
+        Starts the workers, binds the socket and serves requests on a background thread. Returns the thread.
+        """
+        self._bind()
+        thread = threading.Thread(target=self._serve, name='PlotServer')
+        thread.daemon = True
+        thread.start()
+
+        return thread
+
+    def serve_forever(self):
+        """
+        Starts the workers and serves requests until a shutdown request is received or shutdown() is called.
+        """
+        self._bind()
+        self._serve()
+
+        pass
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+        pass
+
+    def handle_request(self, line):
+        """
+        Handles one line received from a client and returns the response as dictionary.
+        """
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            request = _native(json.loads(line))
+        except ValueError as exception:
+            return {'success': False, 'error': 'Invalid request: %s' % exception}
+        if not isinstance(request, dict):
+            return {'success': False, 'error': 'Invalid request: expected a JSON object'}
+
+        command = request.get('command')
+        if command:
+            return self._handle_command(command)
+
+        if 'plots' in request:
+            results = self.render(request['plots'])
+            return {'success': all([result['success'] for result in results]), 'results': results}
+
+        return self.render([request])[0]
+
+    def render(self, plots):
+        """
+        Renders the plot requests, sending them to the workers as long as less than max_pending plots are pending.
+        Returns one result dictionary per plot, in the same order.
+        """
+        results = [None] * len(plots)
+        pending = deque()
+        for index, request in enumerate(plots):
+            start_time = time.time()
+            try:
+                plot = self._decode_plot(request)
+            except (KeyError, ValueError, TypeError, AttributeError) as exception:
+                output_file_name = request.get('output_file_name') if isinstance(request, dict) else None
+                results[index] = self._result(output_file_name, [], PlotResult(
+                    output_file_name, False, 0., 'Invalid plot request: %s' % exception), start_time)
+                continue
+
+            # while all slots are taken, finish the own plots first, other connections may be holding the rest
+            while not self._slots.acquire(False):
+                if pending:
+                    self._collect(pending.popleft(), results)
+                else:
+                    self._slots.acquire()
+                    break
+
+            pending.append((index, plot, start_time, ParallelPlotter.render_async(self._pool, [plot])))
+
+        while pending:
+            self._collect(pending.popleft(), results)
+
+        return results
+
+    def _collect(self, pending_plot, results):
+        index, plot, start_time, async_result = pending_plot
+        try:
+            plot_result = async_result.get()[0]
+        except Exception as exception:
+            plot_result = PlotResult(plot[0], False, 0., str(exception))
+        finally:
+            self._slots.release()
+
+        results[index] = self._result(plot[0], self._get_output_files(plot), plot_result, start_time)
+
+        pass
+
+    def _result(self, output_file_name, output_files, plot_result, start_time):
+        elapsed_time = time.time() - start_time
+
+        with self._lock:
+            self.n_plots += 1
+            if not plot_result.success:
+                self.n_failed += 1
+
+        self.print_log('Rendered %s in %.3f s (%.3f s since it was received).', 'DEBUG',
+                       args=(output_file_name, plot_result.duration, elapsed_time),
+                       fields={'output_file_name': output_file_name, 'success': plot_result.success,
+                               'duration': plot_result.duration, 'time': elapsed_time, 'error': plot_result.error})
+
+        return {'output_file_name': output_file_name, 'success': bool(plot_result.success),
+                'output_files': output_files if plot_result.success else [], 'duration': plot_result.duration,
+                'time': elapsed_time, 'error': plot_result.error}
+
+    def _decode_plot(self, request):
+        output_file_name = request['output_file_name']
+        histograms = [decode_histogram(encoded) for encoded in request['histograms']]
+
+        plot_arguments = {}
+        for key, value in request.items():
+            if key in ('output_file_name', 'histograms'):
+                continue
+            if key not in _PLOT_ARGUMENTS:
+                raise ValueError('unknown argument %s' % key)
+            plot_arguments[key] = value
+
+        if plot_arguments.get('ratio_map'):
+            # JSON only has string keys
+            plot_arguments['ratio_map'] = dict([(int(numerator), int(denominator))
+                                                for numerator, denominator in plot_arguments['ratio_map'].items()])
+
+        return output_file_name, histograms, plot_arguments
+
+    def _get_output_files(self, plot):
+        output_file_name, histograms, plot_arguments = plot
+        output_file_types = plot_arguments.get('output_file_types') or \
+            (plot_arguments.get('options') or {}).get('output_file_type') or self.options.get('output_file_type', 'pdf')
+        return [output_file_name + '.' + output_file_type
+                for output_file_type in RatioHistogram.get_output_file_types(output_file_types)]
+
+    def _handle_command(self, command):
+        if command == 'ping':
+            return {'success': True, 'pid': os.getpid()}
+
+        if command == 'status':
+            with self._lock:
+                return {'success': True, 'n_plots': self.n_plots, 'n_failed': self.n_failed,
+                        'n_processes': self.n_processes, 'max_pending': self.max_pending,
+                        'uptime': time.time() - self._start_time}
+
+        if command == 'shutdown':
+            # shutdown() waits for the serving loop to finish, which must not happen on the thread handling a request
+            threading.Thread(target=self.shutdown).start()
+            return {'success': True}
+
+        return {'success': False, 'error': 'Unknown command %s' % command}
+
+    def _remove_stale_socket(self):
+        """
+        Removes a socket left behind by a server which is no longer running. Raises an IOError if socket_path is not a
+        socket or if a server still accepts connections on it.
+        """
+        try:
+            status = os.lstat(self.socket_path)
+        except OSError as exception:
+            if exception.errno == errno.ENOENT:
+                return
+            raise
+
+        if not stat.S_ISSOCK(status.st_mode):
+            raise IOError('Not serving plots on %s, the file exists and is not a socket.' % self.socket_path)
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except socket.error as exception:
+            if exception.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+                raise
+        else:
+            raise IOError('Not serving plots on %s, another server is running there.' % self.socket_path)
+        finally:
+            probe.close()
+
+        self.print_log('Removing stale socket %s.', 'DEBUG', args=(self.socket_path,))
+        os.remove(self.socket_path)
+
+        pass
+
+    def _bind(self):
+        self._remove_stale_socket()
+
+        self._start_time = time.time()
+        self._pool = self.plotter.create_pool()
+
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = _UnixStreamServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(previous_umask)
+        self._server.plot_server = self
+
+        self.print_log('Serving plots on %s using %i processes.', args=(self.socket_path, self.n_processes))
+
+        pass
+
+    def _serve(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.plotter.close_pool(self._pool, wait=False)
+            self.print_log('Stopped serving plots on %s after %i plots, %i failed.', args=(
+                           self.socket_path, self.n_plots, self.n_failed))
+
+        pass
+
+
+class PlotClient(object):
+    """
+    Sends plot requests to a PlotServer. The connection is opened on first use and kept open.
+    """
+
+    def __init__(self, socket_path, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+        self._socket = None
+        self._file = None
+
+        pass
+
+    def plot(self, output_file_name, histograms, **plot_arguments):
+        """
+        histograms is a list of (histogram, name_in_legend) tuples or a dictionary name -> histogram, all other
+        keyword arguments are the arguments of RatioHistogram.plot listed in _PLOT_ARGUMENTS. Returns the result
+        dictionary sent by the server.
+        """
+        return self.request(self.encode_plot(output_file_name, histograms, **plot_arguments))
+
+    def plot_many(self, plots):
+        """
+        plots is a list of dictionaries holding output_file_name, histograms and further arguments as for plot(). Returns
+        the list of result dictionaries.
+        """
+        encoded = [self.encode_plot(**plot) for plot in plots]
+        return self.request({'plots': encoded})['results']
+
+    def ping(self):
+        return self.request({'command': 'ping'})
+
+    def status(self):
+        return self.request({'command': 'status'})
+
+    def shutdown(self):
+        return self.request({'command': 'shutdown'})
+
+    @staticmethod
+    def encode_plot(output_file_name, histograms, **plot_arguments):
+        if isinstance(histograms, dict):
+            histograms = [(histogram, name) for name, histogram in histograms.items()]
+
+        request = dict(plot_arguments)
+        request['output_file_name'] = output_file_name
+        request['histograms'] = [encode_histogram(*entry) for entry in histograms]
+        if request.get('ratio_map'):
+            request['ratio_map'] = dict([(str(numerator), denominator)
+                                         for numerator, denominator in request['ratio_map'].items()])
+
+        return request
+
+    def request(self, message):
+        """
+        Sends one request and returns the decoded response.
+        """
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(self.timeout)
+            self._socket.connect(self.socket_path)
+            self._file = self._socket.makefile('rb')
+
+        self._socket.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        line = self._file.readline()
+        if not line:
+            self.close()
+            raise IOError('The plot server at %s closed the connection.' % self.socket_path)
+
+        return _native(json.loads(line.decode('utf-8')))
+
+    def close(self):
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = None
+            self._file = None
+
+        pass
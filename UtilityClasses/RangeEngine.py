@@ -0,0 +1,135 @@
+__author__ = 'Christopher Bock'
+
+from collections import namedtuple, OrderedDict
+
+from ArrayHistogram import ArrayHistogram
+from LoggingClass import LoggingClass
+from RatioEngine import get_bin_arrays
+
+
+HistogramRange = namedtuple('HistogramRange', ['minimum', 'maximum', 'minimum_positive', 'minimum_with_errors',
+                                               'maximum_with_errors'])
+
+
+class RangeEngine(LoggingClass):
+    """
+    Determines the range of values covered by a set of histograms, replacing the separate loops over GetMaximum and
+    GetMinimum. For each histogram the minimum, maximum, smallest positive value and the minimum and maximum including
+    the bin errors are computed in one pass over the bin contents and errors. As in TH1::GetMaximum only the bins shown
+    on the x axis are taken into account, i.e. the range set via SetRange / SetRangeUser (or the axis attributes Range
+    and RangeUser of an ArrayHistogram), under- and overflow are always ignored. Unlike GetMinimum and GetMaximum,
+    limits set via SetMinimum / SetMaximum are ignored, use the options override_minimum and override_maximum of
+    RatioHistogram instead. This way the limits RatioHistogram sets on the first histogram while drawing do not feed
+    back into the range of the next plot of the same histograms.
+    The values of ArrayHistograms are cached, keyed on the histogram, its content and error arrays, which its methods
+    replace instead of modifying them, and the bins shown, so drawing the same histograms again does not rescan them.
+    Arrays modified in place by other code are not noticed, call clear() in that case. At most cache_size histograms
+    are remembered.
+    ROOT histograms offer no cheap way to tell whether they changed and are scanned every time, reading their bins
+    directly from ROOT's buffers.
+    """
+
+    def __init__(self, logger=None, cache_size=256):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+        pass
+
+    def compute(self, histograms):
+        """
+        Returns a HistogramRange covering all given histograms. minimum_positive is None if no bin has a positive
+        content.
+        """
+        minimum = maximum = minimum_with_errors = maximum_with_errors = minimum_positive = None
+
+        for histogram in histograms:
+            histogram_range = self.get_range(histogram)
+
+            if minimum is None:
+                minimum, maximum = histogram_range.minimum, histogram_range.maximum
+                minimum_with_errors = histogram_range.minimum_with_errors
+                maximum_with_errors = histogram_range.maximum_with_errors
+            else:
+                minimum = min(minimum, histogram_range.minimum)
+                maximum = max(maximum, histogram_range.maximum)
+                minimum_with_errors = min(minimum_with_errors, histogram_range.minimum_with_errors)
+                maximum_with_errors = max(maximum_with_errors, histogram_range.maximum_with_errors)
+
+            if histogram_range.minimum_positive is not None:
+                if minimum_positive is None or histogram_range.minimum_positive < minimum_positive:
+                    minimum_positive = histogram_range.minimum_positive
+
+        return HistogramRange(minimum, maximum, minimum_positive, minimum_with_errors, maximum_with_errors)
+
+    def get_range(self, histogram):
+        """
+        Returns the HistogramRange of a single histogram.
+        """
+        bin_range = self._get_visible_bins(histogram)
+        if not isinstance(histogram, ArrayHistogram):
+            return self._scan(histogram, bin_range)
+
+        key = id(histogram)
+        cached = self._cache.get(key)
+        if cached is not None:
+            cached_histogram, contents, errors, cached_bin_range, histogram_range = cached
+            if cached_histogram is histogram and contents is histogram.contents and errors is histogram.errors and \
+                    cached_bin_range == bin_range:
+                return histogram_range
+
+        histogram_range = self._scan(histogram, bin_range)
+        self._cache[key] = (histogram, histogram.contents, histogram.errors, bin_range, histogram_range)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        return histogram_range
+
+    def clear(self):
+        self._cache.clear()
+
+        pass
+
+    @staticmethod
+    def _get_visible_bins(histogram):
+        """
+        Returns the first and last bin shown on the x axis, without under- and overflow. If the range does not contain
+        any other bin, all bins are used.
+        """
+        n_bins = histogram.GetNbinsX()
+        x_axis = histogram.GetXaxis()
+        first, last = max(x_axis.GetFirst(), 1), min(x_axis.GetLast(), n_bins)
+        if last < first:
+            return 1, n_bins
+        return first, last
+
+    @staticmethod
+    def _scan(histogram, bin_range):
+        try:
+            contents, errors = get_bin_arrays(histogram)
+        except ImportError:
+            return RangeEngine._scan_bins(histogram, bin_range)
+
+        first, last = bin_range
+        contents = contents[first:last + 1]
+        errors = errors[first:last + 1]
+
+        positive = contents[contents > 0]
+        return HistogramRange(float(contents.min()), float(contents.max()),
+                              float(positive.min()) if len(positive) else None,
+                              float((contents - errors).min()), float((contents + errors).max()))
+
+    @staticmethod
+    def _scan_bins(histogram, bin_range):
+        """
+        Fallback used if numpy is not available.
+        """
+        first, last = bin_range
+        contents = [histogram.GetBinContent(i) for i in range(first, last + 1)]
+        errors = [histogram.GetBinError(i) for i in range(first, last + 1)]
+
+        positive = [content for content in contents if content > 0]
+        return HistogramRange(min(contents), max(contents), min(positive) if positive else None,
+                              min([content - error for content, error in zip(contents, errors)]),
+                              max([content + error for content, error in zip(contents, errors)]))
@@ -0,0 +1,166 @@
+__author__ = 'Christopher Bock'
+
+from array import array
+
+from ArrayHistogram import ArrayHistogram
+from LoggingClass import LoggingClass
+from RootEnvironment import get_root_environment
+
+
+# numpy types corresponding to the bin content arrays of the different ROOT histogram classes
+_CONTENT_TYPES = {'TH1D': 'float64', 'TH1F': 'float32', 'TH1I': 'int32', 'TH1S': 'int16', 'TH1C': 'int8'}
+
+
+def _as_float64(numpy, values):
+    if isinstance(values, array) and values.typecode == 'd':
+        return numpy.frombuffer(values, 'float64')
+    return numpy.asarray(values, 'float64')
+
+
+def get_bin_arrays(histogram):
+    """
+    Returns the bin contents and bin errors of a one dimensional histogram, including under- and overflow, as numpy
+    arrays. The arrays of an ArrayHistogram are used without copying them where possible, for the standard ROOT
+    histogram classes the internal buffers are read directly, otherwise the values are retrieved bin by bin.
+    """
+    numpy = get_root_environment().import_module('numpy')
+
+    if isinstance(histogram, ArrayHistogram):
+        contents = _as_float64(numpy, histogram.contents)
+        if histogram.errors is None:
+            return contents, numpy.sqrt(numpy.abs(contents))
+        return contents, _as_float64(numpy, histogram.errors)
+
+    n_cells = histogram.GetNbinsX() + 2
+
+    content_type = _CONTENT_TYPES.get(histogram.ClassName())
+    if content_type:
+        contents = numpy.frombuffer(histogram.GetArray(), content_type, n_cells).astype('float64')
+        if histogram.GetSumw2N():
+            errors = numpy.sqrt(numpy.frombuffer(histogram.GetSumw2().GetArray(), 'float64', n_cells))
+        else:
+            errors = numpy.sqrt(numpy.abs(contents))
+    else:
+        contents = numpy.array([histogram.GetBinContent(i) for i in range(n_cells)], 'float64')
+        errors = numpy.array([histogram.GetBinError(i) for i in range(n_cells)], 'float64')
+
+    return contents, errors
+
+
+def set_bin_arrays(histogram, contents, errors):
+    """
+    Overwrites the bin contents and bin errors of a histogram, including under- and overflow, with the given arrays.
+    """
+    numpy = get_root_environment().import_module('numpy')
+
+    content_type = _CONTENT_TYPES.get(histogram.ClassName())
+    if content_type:
+        histogram.Set(len(contents), numpy.ascontiguousarray(contents, content_type))
+        histogram.SetError(numpy.ascontiguousarray(errors, 'float64'))
+    else:
+        for i in range(len(contents)):
+            histogram.SetBinContent(i, contents[i])
+            histogram.SetBinError(i, errors[i])
+
+    pass
+
+
+class RatioEngine(LoggingClass):
+    """
+    Computes ratios of histograms using numpy instead of cloning and dividing ROOT histograms one at a time. The bin
+    contents and errors of all histograms are loaded into two two-dimensional arrays (one row per histogram) and all
+    ratios of a ratio map are then calculated in one vectorised step. Errors are propagated assuming uncorrelated
+    histograms, bins with an empty denominator are set to zero, just like TH1::Divide does.
+    Neither loading nor computing requires ROOT, hence the engine can also be used in jobs which do not draw anything:
+
+        engine = RatioEngine()
+        engine.load([reference, candidate_1, candidate_2])
+        pairs, ratios, errors = engine.compute({1: 0, 2: 0})
+    """
+
+    def __init__(self, logger=None):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.contents = None
+        self.errors = None
+
+        pass
+
+    @staticmethod
+    def is_available():
+        try:
+            get_root_environment().import_module('numpy')
+        except ImportError:
+            return False
+        return True
+
+    def load(self, histograms):
+        """
+        Loads the bin contents and errors of the given list of histograms, which all need to have the same number of
+        bins. Raises a ValueError otherwise.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        n_histograms = len(histograms)
+        if n_histograms < 1:
+            raise ValueError('No histograms supplied to RatioEngine.load')
+
+        n_cells = histograms[0].GetNbinsX() + 2
+        self.contents = numpy.empty((n_histograms, n_cells), 'float64')
+        self.errors = numpy.empty((n_histograms, n_cells), 'float64')
+
+        for i, histogram in enumerate(histograms):
+            if histogram.GetNbinsX() + 2 != n_cells:
+                raise ValueError('Histogram %s has %i bins, expected %i.' % (histogram.GetName(),
+                                                                            histogram.GetNbinsX(), n_cells - 2))
+            self.contents[i], self.errors[i] = get_bin_arrays(histogram)
+
+        pass
+
+    def load_arrays(self, contents, errors):
+        """
+        Loads bin contents and errors given as two-dimensional arrays with one row per histogram.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        self.contents = numpy.asarray(contents, 'float64')
+        self.errors = numpy.asarray(errors, 'float64')
+
+        pass
+
+    def compute(self, ratio_map):
+        """
+        ratio_map is either a dictionary numerator index -> denominator index, as accepted by RatioHistogram.plot, or a
+        list of (numerator index, denominator index) pairs. Pairs referring to histograms which have not been loaded are
+        skipped. Returns the list of pairs which have been computed and two arrays holding one row of ratios and one row
+        of ratio errors for each of these pairs.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        if self.contents is None:
+            raise ValueError('RatioEngine.compute called before loading any histograms!')
+
+        if isinstance(ratio_map, dict):
+            ratio_map = ratio_map.items()
+
+        n_histograms = len(self.contents)
+        pairs = [(numerator, denominator) for numerator, denominator in ratio_map
+                 if numerator < n_histograms and denominator < n_histograms]
+
+        numerators = numpy.array([pair[0] for pair in pairs], 'intp')
+        denominators = numpy.array([pair[1] for pair in pairs], 'intp')
+
+        numerator_contents = self.contents[numerators]
+        denominator_contents = self.contents[denominators]
+        numerator_errors = self.errors[numerators]
+        denominator_errors = self.errors[denominators]
+
+        non_zero = denominator_contents != 0
+        safe_denominator = numpy.where(non_zero, denominator_contents, 1.)
+
+        ratios = numpy.where(non_zero, numerator_contents / safe_denominator, 0.)
+        errors = numpy.sqrt(numerator_errors ** 2 * denominator_contents ** 2 +
+                            denominator_errors ** 2 * numerator_contents ** 2) / safe_denominator ** 2
+        errors = numpy.where(non_zero, errors, 0.)
+
+        return pairs, ratios, errors
@@ -1,6 +1,29 @@
 __author__ = 'Christopher Bock'
 
+import os
+import time
+from array import array
+from collections import namedtuple
+
+from ArrayHistogram import ArrayHistogram
+from HistogramStore import open_histogram_store
+from HistogramStyler import apply_histogram_styler, get_styling_function
 from LoggingClass import LoggingClass
+from OptionHandler import OptionHandler
+from RangeEngine import RangeEngine
+from RatioEngine import RatioEngine, set_bin_arrays
+from RootEnvironment import get_root_environment
+from RootFilePool import LazyHistogram, get_default_file_pool
+from StreamFiller import StreamFiller
+
+
+try:
+    _string_types = basestring
+except NameError:
+    _string_types = str
+
+
+PlotResult = namedtuple('PlotResult', ['output_file_name', 'success', 'duration', 'error'])
 
 
 class RatioHistogram(LoggingClass):
@@ -10,20 +33,39 @@ class RatioHistogram(LoggingClass):
     function accepting one or two parameters being the histogram and optionally the name of the histogram in the legend.
 
     TODO:
-     - add function to load histograms also from files to make life even more easy
      - check styling options inside default_options for consistency
      - add documentation to all the possible options inside default_options
     """
 
-    def __init__(self, logger=None):
-        from OptionHandler import OptionHandler
-
-        LoggingClass.__init__(self, logger=logger)
+    def __init__(self, logger=None, log_level=None, preload_root=False):
+        LoggingClass.__init__(self, logger=logger, log_level=log_level)
 
-        self.options = OptionHandler(logger)
+        self.options = OptionHandler(logger, log_level)
         self.load_defaults()
 
         self.histograms = {}
+        self.file_pool = None
+        self.render_cache = None
+        self.instrumentation = None
+        self.output_writer = None
+        self.ratio_engine = RatioEngine(logger)
+        self.range_engine = RangeEngine(logger)
+        self._batch_layout = None
+
+        if preload_root:
+            # argparse imports modules when the parser is created, which would wait for the background import
+            self.options.get_argument_parser()
+            # ROOT is imported in the background while the options are loaded, _plot waits for it if necessary
+            get_root_environment().preload()
+        self._root_output_file = None
+        self._root_output_file_name = None
+
+        pass
+
+    def set_log_level(self, log_level):
+        LoggingClass.set_log_level(self, log_level)
+        self.options.set_log_level(log_level)
+        self.ratio_engine.set_log_level(log_level)
 
         pass
 
@@ -36,7 +78,9 @@ class RatioHistogram(LoggingClass):
                            'override_maximum': False, 'minimum_value': 1444444, 'maximum_value': -123123,
                            'do_atlas_label': False, 'atlas_label': 'Preliminary', 'ratio_y_label': 'Ratio',
                            'omit_title': False, 'legend_automatic_columns': True, 'legend_n_columns': -1,
-                           'overall_text_scale': 1.5}
+                           'overall_text_scale': 1.5, 'vectorized_ratios': True, 'range_include_errors': False,
+                           'root_output_file': 'plots.root', 'background_output': False, 'lod_rebinning': False,
+                           'lod_target_bins': 0}
 
         self.options.load_defaults(default_options)
 
@@ -51,78 +95,411 @@ class RatioHistogram(LoggingClass):
         pass
 
     def print_settings(self):
+        if not self.is_enabled('INFO'):
+            return
+
         self.print_line()
         self.options.print_options('INFO')
         self.print_line()
         pass
 
-    # the following convenience function still needs to be updated to work with the new code
-    # def AddHistogramFromFile(self, fileName, histogramName, nameInLegend=None, directoryName=None, lineColor=-1,
-    #                          markerStyle=-1, dashed=False, histogramScale=1, closeFileAfterwards=True,
-    #                          closeIfOpen=True, lineStyle=None, markerSize=None, draw_option=None):
-    #     '''
-    #     In case no directory name has been specified, this function assumes that
-    #     the complete path to the histogram is specified as histogramName
-    #     Supply -1 as histogramScale to normalize histograms
-    #     '''
-    #     if self.batchMode:
-    #         gROOT.SetBatch(True)
-    #
-    #     rootFile = gROOT.FindObject(fileName)
-    #     if rootFile and closeIfOpen:
-    #         rootFile.Close()
-    #
-    #     rootFile = TFile(fileName, 'READ')
-    #     if not rootFile:
-    #         raise NameError('Could not load root file: ' + fileName)
-    #
-    #     workingDirectory = rootFile
-    #     if directoryName:
-    #         workingDirectory = rootFile.Get(directoryName)
-    #     if not workingDirectory:
-    #         rootFile.Close()
-    #         raise NameError('Could not open working directory: ' + directoryName)
-    #
-    #     temporaryHistogram = workingDirectory.Get(histogramName)
-    #     if not temporaryHistogram:
-    #         rootFile.Close()
-    #         raise NameError('Could not load histogram: ' + histogramName)
-    #     else:
-    #         gROOT.cd() # needed before cloning to avoid the histogram being cleaned once we exit this function
-    #         self.AddHistogram(temporaryHistogram, nameInLegend, lineColor, markerStyle, dashed, histogramScale,
-    #                           lineStyle, markerSize, draw_option)
-    #
-    #     if closeFileAfterwards:
-    #         rootFile.Close()
-    #
-    #     pass
+    def add_histogram_from_file(self, file_name, histogram_name, name_in_legend=None, directory_name=None,
+                                histogram_styler=None, histogram_scale=1):
+        """
+        In case no directory name has been specified, this function assumes that the complete path to the histogram is
+        specified as histogram_name. Supply -1 as histogram_scale to normalize histograms.
+        The histogram is not read right away, only once it is needed by plot(). Files are kept open in a RootFilePool,
+        so that reading many histograms from the same files opens each of them only once. Unless a pool has been
+        assigned to file_pool, the pool shared by all RatioHistogram objects is used.
+        """
+        file_pool = self.file_pool or get_default_file_pool()
+        histogram = LazyHistogram(file_pool, file_name, histogram_name, directory_name, histogram_scale)
+
+        self.add_histogram(histogram, name_in_legend, histogram_styler)
+
+        pass
+
+    def add_histogram_from_store(self, file_name, histogram_name, name_in_legend=None, histogram_styler=None):
+        """
+        Adds a histogram from a histogram store (see HistogramStore). The store is memory mapped and opened only once per
+        process, the bin arrays of the histogram are not copied.
+        """
+        self.add_histogram(open_histogram_store(file_name).get_histogram(histogram_name), name_in_legend,
+                           histogram_styler)
+
+        pass
 
     def add_histogram(self, histogram, name_in_legend=None, histogram_styler=None):
+        self._add_histogram(histogram, name_in_legend,
+                            get_styling_function(histogram_styler) if histogram_styler else None)
+
+        pass
+
+    def add_histograms(self, histograms, histogram_styler=None):
+        """
+        Adds many histograms at once, given as a dictionary name in legend -> histogram or as a list of histograms or
+        of (histogram, name in legend) tuples. The styling function, which may also be a HistogramStyle or StyleTable,
+        is inspected only once for all of them.
+        """
+        styling_function = get_styling_function(histogram_styler) if histogram_styler else None
+
+        if isinstance(histograms, dict):
+            histograms = [(histogram, name_in_legend) for name_in_legend, histogram in histograms.items()]
+
+        for entry in histograms:
+            if isinstance(entry, tuple):
+                self._add_histogram(entry[0], entry[1], styling_function)
+            else:
+                self._add_histogram(entry, None, styling_function)
+
+        pass
+
+    def _add_histogram(self, histogram, name_in_legend, styling_function):
         if not histogram:
             raise AttributeError('No histogram supplied to RatioHistogram.add_histogram')
 
         if not name_in_legend:
             name_in_legend = histogram.GetName()
 
-        if histogram_styler:
-            import inspect
-            argspec = inspect.getargspec(histogram_styler)
-            if len(argspec[0]) >= 2:
-                histogram_styler(histogram, name_in_legend)
+        if styling_function:
+            if isinstance(histogram, LazyHistogram):
+                histogram.defer(lambda loaded_histogram: styling_function(loaded_histogram, name_in_legend))
             else:
-                histogram_styler(histogram)
+                styling_function(histogram, name_in_legend)
 
         self.histograms[name_in_legend] = histogram
 
         pass
 
+    def fill_streams(self, streams, edges, histogram_styler=None, chunk_size=65536, chunked=False):
+        """
+        Creates one histogram per stream by binning the values of the streams in chunks (see StreamFiller), instead of
+        requiring a filled ROOT histogram per sample. streams is a dictionary name in legend -> stream of values or a
+        list of (name in legend, stream) or (name in legend, stream, weights) tuples, all histograms use the bin edges
+        edges. Returns the StreamFiller, which can be used to keep filling the histograms.
+        """
+        filler = StreamFiller(edges, self.logger, chunk_size)
+        filler.log_level = self.log_level
+        filler.consume_streams(streams, chunked)
+
+        self.add_histograms([(histogram, name) for name, histogram in filler.get_histograms()], histogram_styler)
+
+        return filler
+
     def plot(self, output_file_name, name_of_canvas='canvas', log_scale=False, ratio_log_scale=False,
-             ratio_map=None, plot_ratios=True, sort_function=None):
-        import ROOT
+             ratio_map=None, plot_ratios=True, sort_function=None, output_file_types=None, options=None):
+        """
+        Draws all histograms added so far into output_file_name, the extension is appended according to the file types.
+        output_file_types (or, if not given, the option 'output_file_type') is either a single type like 'pdf', a comma
+        separated list like 'pdf,png' or a list of types; the plot is rendered once and then written in all formats.
+        If the option 'safe_to_root_file' is True, canvas and ratio histograms are also written into a directory named
+        after the plot inside the ROOT file given by the option 'root_output_file', which is shared by all plots.
+        With the option 'background_output', files are printed to a local temporary directory and moved to their
+        destination on a background thread while the next plot is rendered.
+        Neither the background writes nor the ROOT output file are finished when plot() returns, so that they carry over
+        to the next plot; call flush() or close() once all plots have been drawn. Files which could not be moved to
+        their destination are only reported by flush().
+        options overrides the options for this plot only, either as an OptionScope (see OptionHandler.scope) or as a
+        dictionary of option values.
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.plot_started(output_file_name)
+
+        start_time = time.time()
+        result = False
+        try:
+            result = self._plot(output_file_name, name_of_canvas, log_scale, ratio_log_scale, ratio_map, plot_ratios,
+                                sort_function, output_file_types=output_file_types, options=options)
+        finally:
+            # also if _plot raised, every plot_started has to be matched by plot_finished
+            if instrumentation is not None:
+                instrumentation.plot_finished(output_file_name, result)
+        duration = time.time() - start_time
+
+        self.print_log('Plotting %s took %.3f s.', 'DEBUG', args=(output_file_name, duration), fields={
+                       'output_file_name': output_file_name, 'success': result, 'duration': duration,
+                       'n_histograms': len(self.histograms)})
+
+        if self.render_cache is not None:
+            self.render_cache.save()
+            self.render_cache.print_summary('DEBUG')
+
+        return result
+
+    def plot_many(self, jobs):
+        """
+        Renders several ratio plots in one go. Instead of creating a new canvas, new pads and a new legend for every
+        plot, one layout is created and only reset between the plots, which saves most of the setup time when drawing
+        large numbers of plots. Each job is a dictionary with the keys:
+         output_file_name       name of the output file, as for plot()
+         histograms             either a list of (histogram, name_in_legend) or
+                                (histogram, name_in_legend, histogram_styler) tuples or a dictionary name -> histogram
+        all other keys are passed on to plot() as keyword arguments. The histograms which have been added to this object
+        beforehand are restored once all jobs have been processed. The output of all plots is finished by calling
+        flush() at the end, plots whose files could not be written are reported as failed.
+        Returns a list of PlotResult tuples, one for each job.
+        """
+        registered_histograms = self.histograms
+        results = []
+
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.batch_started()
+
+        start_time = time.time()
+        try:
+            for job in jobs:
+                job = dict(job)
+                output_file_name = job.pop('output_file_name')
+                histograms = job.pop('histograms', [])
+
+                job_start_time = time.time()
+                try:
+                    self.histograms = {}
+                    if isinstance(histograms, dict):
+                        histograms = [(histogram, name) for name, histogram in histograms.items()]
+                    for entry in histograms:
+                        self.add_histogram(*entry)
+
+                    if instrumentation is not None:
+                        instrumentation.plot_started(output_file_name)
+                    success = self._plot(output_file_name, reuse_layout=True, **job)
+                    error = None
+                except Exception as exception:
+                    self.print_log('Plotting %s failed: %s', 'ERROR', args=(output_file_name, exception))
+                    self._batch_layout = None
+                    success = False
+                    error = str(exception)
+
+                if instrumentation is not None:
+                    instrumentation.plot_finished(output_file_name, success)
+
+                duration = time.time() - job_start_time
+                self.print_log('Plotting %s took %.3f s.', 'DEBUG', args=(output_file_name, duration), fields={
+                               'output_file_name': output_file_name, 'success': success, 'duration': duration,
+                               'n_histograms': len(self.histograms), 'error': error})
+                results.append(PlotResult(output_file_name, success, duration, error))
+        finally:
+            self.histograms = registered_histograms
+            self._batch_layout = None
+
+            failed_outputs = self.flush()
+            if failed_outputs:
+                results = [result._replace(success=False, error=failed_outputs[result.output_file_name])
+                           if result.output_file_name in failed_outputs else result for result in results]
+
+            if self.render_cache is not None:
+                self.render_cache.save()
+
+        elapsed_time = time.time() - start_time
+        n_successful = len([result for result in results if result.success])
+        self.print_log('Rendered %i of %i plots in %.2f s (%.1f plots per second).', args=(
+                       n_successful, len(results), elapsed_time, len(results) / elapsed_time if elapsed_time else 0.),
+                       fields={'n_plots': len(results), 'n_successful': n_successful, 'duration': elapsed_time})
+        if self.render_cache is not None:
+            self.render_cache.print_summary()
+        if instrumentation is not None:
+            instrumentation.batch_finished()
+
+        return results
+
+    @staticmethod
+    def get_output_file_types(output_file_types):
+        """
+        Turns 'pdf', 'pdf,png' or ['pdf', 'png'] into a list of file types.
+        """
+        if isinstance(output_file_types, _string_types):
+            output_file_types = output_file_types.split(',')
+        return [output_file_type.strip() for output_file_type in output_file_types if output_file_type.strip()]
+
+    def _write_output(self, canvas, output_file_name, output_file_names, output_file_types, background):
+        if not background:
+            for file_name, output_file_type in zip(output_file_names, output_file_types):
+                canvas.Print(file_name, output_file_type)
+            return
+
+        if self.output_writer is None:
+            from OutputWriter import OutputWriter
+            self.output_writer = OutputWriter(self.logger)
+
+        for file_name, output_file_type in zip(output_file_names, output_file_types):
+            temporary_file_name = self.output_writer.get_temporary_file_name(file_name)
+            canvas.Print(temporary_file_name, output_file_type)
+            self.output_writer.submit(temporary_file_name, file_name, output_file_name)
+
+        pass
+
+    def _write_to_root_file(self, ROOT, options, output_file_name, canvas, ratio_histograms):
+        """
+        Writes canvas and ratio histograms into a directory named after the plot inside the shared ROOT output file,
+        which stays open until flush() is called or the option 'root_output_file' changes.
+        """
+        if self._root_output_file is not None and self._root_output_file_name != options.root_output_file:
+            self._close_root_output_file()
+
+        if self._root_output_file is None:
+            root_file = ROOT.TFile.Open(options.root_output_file, 'UPDATE')
+            if not root_file or root_file.IsZombie():
+                raise NameError('Could not open root file: ' + options.root_output_file)
+            self._root_output_file = root_file
+            self._root_output_file_name = options.root_output_file
+
+        directory_name = os.path.basename(output_file_name)
+        directory = self._root_output_file.GetDirectory(directory_name)
+        if not directory:
+            directory = self._root_output_file.mkdir(directory_name)
+
+        directory.WriteTObject(canvas, canvas.GetName(), 'Overwrite')
+        for ratio_histogram in ratio_histograms:
+            directory.WriteTObject(ratio_histogram, ratio_histogram.GetName(), 'Overwrite')
+
+        pass
+
+    def _close_root_output_file(self):
+        if self._root_output_file is not None:
+            self._root_output_file.Close()
+            self._root_output_file = None
+            self._root_output_file_name = None
+
+        pass
+
+    def flush(self):
+        """
+        Waits for pending background writes and closes the shared ROOT output file, which plot() leaves open for the
+        next plot. Returns a dictionary output file name -> error message of the plots whose files could not be written
+        since the last call.
+        """
+        failed_outputs = {}
+        if self.output_writer is not None:
+            failed_outputs = self.output_writer.wait()
+
+        self._close_root_output_file()
+
+        return failed_outputs
+
+    def close(self):
+        """
+        Like flush(), but also stops the background thread moving the output files. Plotting afterwards starts a new one.
+        """
+        failed_outputs = self.flush()
+        if self.output_writer is not None:
+            self.output_writer.close()
+            self.output_writer = None
+
+        return failed_outputs
+
+    def _get_batch_layout(self, ROOT, name_of_canvas, plot_ratios):
+        if self._batch_layout is None or self._batch_layout.plot_ratios != plot_ratios:
+            self._batch_layout = RatioPlotLayout(ROOT, name_of_canvas, plot_ratios)
+        else:
+            self._batch_layout.reset(name_of_canvas)
+
+        return self._batch_layout
+
+    def _get_draw_histograms(self, options, plot_ratios):
+        """
+        Returns the histograms to draw. If the option 'lod_rebinning' is True and the histograms have more bins than
+        'lod_target_bins' (by default the width in pixels of the pads, see RatioPlotLayout.get_frame_width), rebinned
+        copies are returned: every group of neighbouring bins is merged into one, adding contents and adding errors in
+        quadrature, until the number of bins is below the target. All histograms are merged in the same way, hence the
+        ratios are computed from the merged bins. The histograms that have been added are never modified.
+        """
+        if not options.lod_rebinning or not self.histograms:
+            return self.histograms
+
+        target_bins = options.lod_target_bins or RatioPlotLayout.get_frame_width(plot_ratios)
+        n_bins = max([histogram.GetNbinsX() for histogram in self.histograms.values()])
+        if n_bins <= target_bins:
+            return self.histograms
+
+        try:
+            get_root_environment().import_module('numpy')
+        except ImportError:
+            self.print_log('Not rebinning the histograms, numpy is not available.', 'DEBUG')
+            return self.histograms
+
+        n_group = -(-n_bins // target_bins)
+        draw_histograms = {}
+        for name, histogram in self.histograms.items():
+            if isinstance(histogram, ArrayHistogram):
+                draw_histograms[name] = histogram.rebinned(n_group)
+            else:
+                draw_histograms[name] = self._rebin_root_histogram(histogram, n_group)
+
+        self.print_log('Merging every %i bins, drawing %i instead of %i bins.', 'DEBUG',
+                       args=(n_group, -(-n_bins // n_group), n_bins))
+
+        return draw_histograms
+
+    @staticmethod
+    def _rebin_root_histogram(histogram, n_group):
+        """
+        Returns a rebinned clone of the ROOT histogram, merging bins in the same way as ArrayHistogram.rebinned. Using
+        TH1::Rebin on the clone keeps the class of the histogram as well as all its attributes, the range shown on the x
+        axis is set again in user coordinates as the bin numbers change.
+        """
+        x_axis = histogram.GetXaxis()
+        n_bins = histogram.GetNbinsX()
+        edges = array('d', [x_axis.GetBinLowEdge(first_bin) for first_bin in range(1, n_bins + 1, n_group)])
+        edges.append(x_axis.GetBinUpEdge(n_bins))
+
+        first, last = x_axis.GetFirst(), x_axis.GetLast()
+        x_range = None
+        if first > 1 or last < n_bins:
+            x_range = x_axis.GetBinLowEdge(first), x_axis.GetBinUpEdge(last)
+
+        draw_histogram = histogram.Clone('%s_lod' % histogram.GetName())
+        draw_histogram.SetDirectory(0)
+        draw_histogram.Rebin(len(edges) - 1, '', edges)
+        if x_range is not None:
+            draw_histogram.GetXaxis().SetRangeUser(*x_range)
+
+        return draw_histogram
+
+    def _compute_ratios(self, options, histograms, histogram_keys, ratio_pairs):
+        """
+        Computes all ratios in one go using the RatioEngine. Returns None if the ratios have to be computed using
+        TH1::Divide instead, i.e. if disabled via the option 'vectorized_ratios', if numpy is not available or if the
+        histograms do not share the same binning.
+        """
+        if not ratio_pairs or not options.vectorized_ratios or not self.ratio_engine.is_available():
+            return None
+
+        try:
+            self.ratio_engine.load([histograms[key] for key in histogram_keys])
+        except ValueError as exception:
+            self.print_log('Falling back to TH1::Divide: %s', 'DEBUG', args=(exception,))
+            return None
+
+        return self.ratio_engine.compute(ratio_pairs)
+
+    def _plot(self, output_file_name, name_of_canvas='canvas', log_scale=False, ratio_log_scale=False,
+              ratio_map=None, plot_ratios=True, sort_function=None, reuse_layout=False, output_file_types=None,
+              options=None):
+        if options is None:
+            options = self.options
+        elif isinstance(options, dict):
+            options = self.options.scope(options)
+        options = options.freeze()
+        ROOT = get_root_environment().get_root(options.batch_mode)
+
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.enter_phase('load')
+
+        # histograms stored in the same file are read one after the other to make the best use of the file pool
+        lazy_histograms = [(histogram.file_name, name) for name, histogram in self.histograms.items()
+                           if isinstance(histogram, LazyHistogram)]
+        for file_name, name in sorted(lazy_histograms):
+            self.histograms[name] = self.histograms[name].load()
+        if instrumentation is not None and lazy_histograms:
+            instrumentation.count('histograms_loaded', len(lazy_histograms))
 
         num_histograms = len(self.histograms)
 
-        self.print_log('Output file is named: %s and superimposes %i histograms.' % (output_file_name, num_histograms))
+        self.print_log('Output file is named: %s and superimposes %i histograms.', args=(output_file_name,
+                                                                                          num_histograms))
 
         if (num_histograms < 2) and plot_ratios:
             self.print_log('Need at least two histograms to create a ratio plot!', 'WARNING')
@@ -133,88 +510,96 @@ class RatioHistogram(LoggingClass):
         else:
             histogram_keys = self.histograms.keys()
 
-        ROOT.gStyle.SetOptStat(self.options['opt_stat'])
+        output_file_types = self.get_output_file_types(output_file_types or options.output_file_type)
+        output_file_names = [output_file_name + '.' + output_file_type for output_file_type in output_file_types]
+
+        if self.render_cache is not None:
+            if instrumentation is not None:
+                instrumentation.enter_phase('cache')
+            render_key = self.render_cache.compute_key(histogram_keys, self.histograms, options, {
+                'name_of_canvas': name_of_canvas, 'log_scale': log_scale, 'ratio_log_scale': ratio_log_scale,
+                'ratio_map': sorted(ratio_map.items()) if ratio_map else None, 'plot_ratios': plot_ratios,
+                'output_file_types': output_file_types})
+            # the ROOT output file is not tracked by the cache, skipping the plot would leave it out of the file
+            if not options.safe_to_root_file and self.render_cache.is_up_to_date(render_key, output_file_names):
+                self.print_log('Skipping %s, it is up to date.', args=(output_file_name,))
+                return True
+
+        if instrumentation is not None:
+            instrumentation.enter_phase('convert')
+
+        draw_histograms = self._get_draw_histograms(options, plot_ratios)
+
+        # array based histograms are only converted to ROOT objects now that they are about to be drawn
+        histograms = {}
+        for name, histogram in draw_histograms.items():
+            if isinstance(histogram, ArrayHistogram):
+                histogram = histogram.to_root(ROOT)
+                if instrumentation is not None:
+                    instrumentation.count('objects_created')
+            histograms[name] = histogram
+
+        if instrumentation is not None:
+            instrumentation.enter_phase('layout')
+            previous_layout = self._batch_layout
 
-        if self.options['draw_legend']:
-            legend_x_values = self.options['legend_x_values']
-            legend_y_values = self.options['legend_y_values']
+        ### Creating the canvas and the pads to draw the histograms and the ratio plots on ###
+        if reuse_layout:
+            layout = self._get_batch_layout(ROOT, name_of_canvas, plot_ratios)
+        else:
+            layout = RatioPlotLayout(ROOT, name_of_canvas, plot_ratios)
 
-            legend = ROOT.TLegend(legend_x_values[0], legend_y_values[0], legend_x_values[1], legend_y_values[1])
-            legend.SetBorderSize(0)
-            legend.SetFillColor(0)
-            legend.SetFillStyle(4050)
-            legend.SetTextFont(42)
-            legend.SetTextSize(legend.GetTextSize()*2)
+        layout.apply_options(ROOT, options, log_scale, ratio_log_scale)
 
+        if instrumentation is not None and (not reuse_layout or layout is not previous_layout):
+            instrumentation.count('layouts_created')
+
+        canv = layout.canvas
+        pad_histo = layout.pad_histo
+        pad_ratio = layout.pad_ratio
+        y_pad_histo = layout.y_pad_histo
+
+        if instrumentation is not None:
+            instrumentation.enter_phase('legend')
+
+        legend = layout.legend
+        if options.draw_legend:
             legend_entry_option = 'l'
             if plot_ratios:
                 legend_entry_option = 'lp'
 
             for name in histogram_keys:
-                legend.AddEntry(self.histograms[name], name, legend_entry_option)
-
-        maximum_value = self.options['maximum_value']
-        minimum_value = self.options['minimum_value']
-        if not self.options['override_maximum']:
-            maximum_value = -131238.
-            for name, histogram in self.histograms.iteritems():
-                if histogram.GetMaximum() > maximum_value:
-                    maximum_value = histogram.GetMaximum()
-
-        if not self.options['override_minimum']:
-            minimum_value = 87238477.
-            for name, histogram in self.histograms.iteritems():
-                if histogram.GetMinimum() < minimum_value:
-                        minimum_value = histogram.GetMinimum()
+                legend.AddEntry(histograms[name], name, legend_entry_option)
 
-        ### Creating the canvas and the pads to draw the histograms and the ratio plots on ###
-        canv = ROOT.TCanvas(name_of_canvas, '', 0, 0, 800, 600)
-        canv.SetTicks(1, 1)
+        if instrumentation is not None:
+            instrumentation.enter_phase('range')
 
-        if plot_ratios:
-            y_pad_histo = 0.2
-            bottom_margin_pad_histo = 0.035
-            #lef_margin_pad_histo = 0.13 + self.left_margin_shift
-            lef_margin_pad_histo = 0.13
-        else:
-            y_pad_histo = 0.0
-            bottom_margin_pad_histo = 0.125
-            #lef_margin_pad_histo = 0.1 + self.left_margin_shift
-            lef_margin_pad_histo = 0.1
-
-        pad_histo = ROOT.TPad('name_pad_histo', 'name_pad_histo', 0, y_pad_histo, 1., 1.)
-        pad_histo.SetTicks(1, 1)
-        pad_histo.SetLeftMargin(lef_margin_pad_histo)
-        pad_histo.SetRightMargin(0.05)
-        pad_histo.SetBottomMargin(bottom_margin_pad_histo)
-        if self.options['draw_grid']:
-            pad_histo.SetGrid()
-        if log_scale:
-            pad_histo.SetLogy(1)
-
-        if not self.options['omit_title']:
-            pad_histo.SetTopMargin(0.1)
-            ROOT.gStyle.SetOptTitle(1)
-        else:
-            ROOT.gStyle.SetOptTitle(0)
-            pad_histo.SetTopMargin(0.05)
+        maximum_value = options.maximum_value
+        minimum_value = options.minimum_value
+        minimum_positive_value = None
+        if not options.override_maximum or not options.override_minimum:
+            plot_range = self.range_engine.compute([draw_histograms[key] for key in histogram_keys])
+            minimum_positive_value = plot_range.minimum_positive
 
-        if plot_ratios:
-            pad_ratio = ROOT.TPad('name_pad_ratio', 'name_pad_ratio', 0, 0, 1, 0.2)
-            pad_ratio.SetTopMargin(0.07)
-            pad_ratio.SetLeftMargin(lef_margin_pad_histo)
-            pad_ratio.SetRightMargin(0.05)
-            pad_ratio.SetBottomMargin(0.45)
-            if self.options['draw_grid']:
-                pad_ratio.SetGrid()
-            if ratio_log_scale:
-                pad_ratio.SetLogy(1)
-
-            pad_ratio.Draw()  # otherwise ROOT crashes...
-        pad_histo.Draw()
+            if not options.override_maximum:
+                if options.range_include_errors:
+                    maximum_value = plot_range.maximum_with_errors
+                else:
+                    maximum_value = plot_range.maximum
+
+            if not options.override_minimum:
+                if options.range_include_errors:
+                    minimum_value = plot_range.minimum_with_errors
+                else:
+                    minimum_value = plot_range.minimum
+
+        ratio_histograms = []  # we need this workaround to prevent the GC from deleting the histograms too early
 
         ### Create the ratio histograms and draw them ###
         if plot_ratios:
+            if instrumentation is not None:
+                instrumentation.enter_phase('ratios')
+
             pad_ratio.cd()
 
             if not ratio_map:
@@ -222,108 +607,237 @@ class RatioHistogram(LoggingClass):
                 for i in range(1, num_histograms):
                     ratio_map[i] = 0
 
+            ratio_pairs = [(numeratorHistogram, denumeratorHistogram)
+                           for numeratorHistogram, denumeratorHistogram in ratio_map.iteritems()
+                           if numeratorHistogram < num_histograms and denumeratorHistogram < num_histograms]
+            ratio_values = self._compute_ratios(options, draw_histograms, histogram_keys, ratio_pairs)
+
             i = 0
-            ratio_histograms = []  # we need this workaround to prevent the GC from deleting the histograms too early
-            for numeratorHistogram, denumeratorHistogram in ratio_map.iteritems():
-                if denumeratorHistogram >= num_histograms:
-                    continue
-                if numeratorHistogram >= num_histograms:
-                    continue
-
-                ratio_histograms.append(self.histograms[histogram_keys[numeratorHistogram]].Clone(self.histograms[histogram_keys[numeratorHistogram]].GetName() + str(i) + 'clone'))
+            for numeratorHistogram, denumeratorHistogram in ratio_pairs:
+                ratio_histograms.append(histograms[histogram_keys[numeratorHistogram]].Clone(histograms[histogram_keys[numeratorHistogram]].GetName() + str(i) + 'clone'))
                 hratio = ratio_histograms[i]
-                hratio.Divide(self.histograms[histogram_keys[denumeratorHistogram]])
+                if instrumentation is not None:
+                    instrumentation.count('objects_created')
+                    instrumentation.count('bins_processed', hratio.GetNbinsX() + 2)
+                if ratio_values:
+                    set_bin_arrays(hratio, ratio_values[1][i], ratio_values[2][i])
+                else:
+                    hratio.Divide(histograms[histogram_keys[denumeratorHistogram]])
 
                 hratio.SetTitle('')
 
                 hratio.SetStats(0)
-                hratio.SetLineColor(self.histograms[histogram_keys[numeratorHistogram]].GetLineColor())
-                hratio.SetMarkerColor(self.histograms[histogram_keys[numeratorHistogram]].GetLineColor())
-                hratio.SetMarkerStyle(self.histograms[histogram_keys[numeratorHistogram]].GetMarkerStyle())
+                hratio.SetLineColor(histograms[histogram_keys[numeratorHistogram]].GetLineColor())
+                hratio.SetMarkerColor(histograms[histogram_keys[numeratorHistogram]].GetLineColor())
+                hratio.SetMarkerStyle(histograms[histogram_keys[numeratorHistogram]].GetMarkerStyle())
 
                 if not ratio_log_scale:
-                    hratio.SetMinimum(self.options['ratio_minimum'])
-                    hratio.SetMaximum(self.options['ratio_maximum'])
+                    hratio.SetMinimum(options.ratio_minimum)
+                    hratio.SetMaximum(options.ratio_maximum)
                 else:
-                    if self.options['ratio_minimum'] > 0:
-                        hratio.SetMinimum(self.options['ratio_minimum'])
+                    if options.ratio_minimum > 0:
+                        hratio.SetMinimum(options.ratio_minimum)
                     else:
                         hratio.SetMinimum(0.1)
 
-                scalefactor = self.options['overall_text_scale'] * (1.0 - y_pad_histo) / y_pad_histo
+                scalefactor = options.overall_text_scale * (1.0 - y_pad_histo) / y_pad_histo
                 hratio.GetXaxis().SetLabelSize(hratio.GetXaxis().GetLabelSize() * scalefactor)
                 hratio.GetYaxis().SetLabelSize(hratio.GetYaxis().GetLabelSize() * scalefactor)
                 hratio.GetXaxis().SetTitleSize(hratio.GetXaxis().GetTitleSize() * scalefactor)
                 hratio.GetYaxis().SetTitleSize(hratio.GetYaxis().GetTitleSize() * scalefactor)
                 hratio.GetXaxis().SetTitleOffset(0.9)
-                hratio.GetYaxis().SetTitleOffset(self.options['overall_text_scale']*0.9 / scalefactor)
+                hratio.GetYaxis().SetTitleOffset(options.overall_text_scale*0.9 / scalefactor)
 
-                hratio.GetXaxis().SetNdivisions(self.options['ratio_xaxis_ndivisions'])
-                hratio.GetYaxis().SetNdivisions(self.options['ratio_yaxis_ndivisions'])
+                hratio.GetXaxis().SetNdivisions(options.ratio_xaxis_ndivisions)
+                hratio.GetYaxis().SetNdivisions(options.ratio_yaxis_ndivisions)
 
-                hratio.SetLineWidth(int(hratio.GetLineWidth() * self.options['line_width_scale']))
+                hratio.SetLineWidth(int(hratio.GetLineWidth() * options.line_width_scale))
 
                 #hratio.SetMarkerSize(hratio.GetMarkerSize()*scalefactor*0.9)
 
                 if i > 0:
                     hratio.Draw('SAME P')
                 else:
-                    hratio.GetYaxis().SetTitle(self.options['ratio_y_label'])
+                    hratio.GetYaxis().SetTitle(options.ratio_y_label)
                     hratio.Draw('P')
-                    if not self.options['draw_grid']:
+                    if not options.draw_grid:
                         l = ROOT.TLine(hratio.GetXaxis().GetXmin(), 1, hratio.GetXaxis().GetXmax(), 1)
                         l.SetLineStyle(4)
                         l.SetLineColor(17)
                         l.Draw()
+                        if instrumentation is not None:
+                            instrumentation.count('objects_created')
                 i += 1
 
+        if instrumentation is not None:
+            instrumentation.enter_phase('draw')
+
         ### Now draw the distributions on the main pad ##
         pad_histo.cd()
 
         first_key = histogram_keys[0]
-        if log_scale and self.options['do_atlas_label']:
-            self.histograms[first_key].SetMaximum(maximum_value * 5)
+        if log_scale and options.do_atlas_label:
+            histograms[first_key].SetMaximum(maximum_value * 5)
         else:
-            self.histograms[first_key].SetMaximum(maximum_value * 1.15)
+            histograms[first_key].SetMaximum(maximum_value * 1.15)
 
         if not log_scale:
-            self.histograms[first_key].SetMinimum(minimum_value)
+            histograms[first_key].SetMinimum(minimum_value)
+        elif options.override_minimum:
+            if minimum_value > 0:
+                histograms[first_key].SetMinimum(minimum_value)
+        elif minimum_positive_value is not None:
+            # leave some room below the smallest positive bin, which would otherwise sit on the axis
+            histograms[first_key].SetMinimum(minimum_positive_value * 0.5)
 
         if plot_ratios:
             x_axis_scale = 0.0
         else:
-            x_axis_scale = self.options['overall_text_scale']
+            x_axis_scale = options.overall_text_scale
 
-        self.histograms[first_key].GetXaxis().SetLabelSize(self.histograms[first_key].GetXaxis().GetLabelSize() * x_axis_scale)
-        self.histograms[first_key].GetYaxis().SetLabelSize(self.histograms[first_key].GetYaxis().GetLabelSize() * self.options['overall_text_scale'])
-        self.histograms[first_key].GetXaxis().SetTitleSize(self.histograms[first_key].GetXaxis().GetTitleSize() * x_axis_scale)
-        self.histograms[first_key].GetYaxis().SetTitleSize(self.histograms[first_key].GetYaxis().GetTitleSize() * self.options['overall_text_scale'])
+        histograms[first_key].GetXaxis().SetLabelSize(histograms[first_key].GetXaxis().GetLabelSize() * x_axis_scale)
+        histograms[first_key].GetYaxis().SetLabelSize(histograms[first_key].GetYaxis().GetLabelSize() * options.overall_text_scale)
+        histograms[first_key].GetXaxis().SetTitleSize(histograms[first_key].GetXaxis().GetTitleSize() * x_axis_scale)
+        histograms[first_key].GetYaxis().SetTitleSize(histograms[first_key].GetYaxis().GetTitleSize() * options.overall_text_scale)
 
-        self.histograms[first_key].GetYaxis().SetTitleOffset(0.95)
+        histograms[first_key].GetYaxis().SetTitleOffset(0.95)
 
-        self.histograms[first_key].SetLineWidth(int(self.histograms[first_key].GetLineWidth() * self.options['line_width_scale']))
+        histograms[first_key].SetLineWidth(int(histograms[first_key].GetLineWidth() * options.line_width_scale))
 
-        if not self.histograms[first_key].GetYaxis().GetTitle():
-            self.histograms[first_key].GetYaxis().SetTitle('Untitled')
+        if not histograms[first_key].GetYaxis().GetTitle():
+            histograms[first_key].GetYaxis().SetTitle('Untitled')
 
-        self.histograms[first_key].Draw('HIST')
+        histograms[first_key].Draw('HIST')
         for i in range(1, num_histograms):
-            self.histograms[histogram_keys[i]].SetLineWidth(self.histograms[first_key].GetLineWidth())
-            self.histograms[histogram_keys[i]].Draw('same HIST')
+            histograms[histogram_keys[i]].SetLineWidth(histograms[first_key].GetLineWidth())
+            histograms[histogram_keys[i]].Draw('same HIST')
 
         ### Last: draw the legend ##
-        legend.SetTextSize(self.options['legend_text_size'])
-        if self.options['legend_automatic_columns']:
-            import math
-            n_columns = int(math.ceil(legend.GetNRows()/6))
-            legend.SetNColumns(n_columns)
-        elif self.options['legend_n_columns'] > 0:
-            legend.SetNColumns(self.options['legend_n_columns'])
-        legend.Draw()
-
-        if self.options['do_atlas_label']:
+        if options.draw_legend:
+            legend.SetTextSize(options.legend_text_size)
+            if options.legend_automatic_columns:
+                import math
+                n_columns = int(math.ceil(legend.GetNRows()/6))
+                legend.SetNColumns(n_columns)
+            elif options.legend_n_columns > 0:
+                legend.SetNColumns(options.legend_n_columns)
+            legend.Draw()
+
+        if options.do_atlas_label:
             raise Exception('do_atlas_label not yet implemented!')
 
-        canv.Print(output_file_name + '.' + self.options['output_file_type'], self.options['output_file_type'])
+        if instrumentation is not None:
+            instrumentation.enter_phase('output')
+
+        self._write_output(canv, output_file_name, output_file_names, output_file_types, options.background_output)
+
+        if options.safe_to_root_file:
+            self._write_to_root_file(ROOT, options, output_file_name, canv, ratio_histograms)
+
+        if self.render_cache is not None:
+            self.render_cache.record(render_key, output_file_names)
 
         return True
+
+
+class RatioPlotLayout(object):
+    """
+    The canvas, the two pads and the legend used by RatioHistogram to draw a ratio plot. Creating these objects is
+    comparatively expensive in ROOT, hence RatioHistogram.plot_many keeps one layout alive and only clears it between
+    two plots via reset(). Everything depending on the options or on the arguments of plot() is (re-)applied in
+    apply_options().
+    """
+
+    canvas_width = 800
+    canvas_height = 600
+    right_margin = 0.05
+
+    def __init__(self, ROOT, name_of_canvas, plot_ratios):
+        self.plot_ratios = plot_ratios
+
+        self.canvas = ROOT.TCanvas(name_of_canvas, '', 0, 0, self.canvas_width, self.canvas_height)
+        self.canvas.SetTicks(1, 1)
+
+        lef_margin_pad_histo = self.get_left_margin(plot_ratios)
+        if plot_ratios:
+            self.y_pad_histo = 0.2
+            bottom_margin_pad_histo = 0.035
+        else:
+            self.y_pad_histo = 0.0
+            bottom_margin_pad_histo = 0.125
+
+        self.pad_histo = ROOT.TPad('name_pad_histo', 'name_pad_histo', 0, self.y_pad_histo, 1., 1.)
+        self.pad_histo.SetTicks(1, 1)
+        self.pad_histo.SetLeftMargin(lef_margin_pad_histo)
+        self.pad_histo.SetRightMargin(self.right_margin)
+        self.pad_histo.SetBottomMargin(bottom_margin_pad_histo)
+
+        self.pad_ratio = None
+        if plot_ratios:
+            self.pad_ratio = ROOT.TPad('name_pad_ratio', 'name_pad_ratio', 0, 0, 1, 0.2)
+            self.pad_ratio.SetTopMargin(0.07)
+            self.pad_ratio.SetLeftMargin(lef_margin_pad_histo)
+            self.pad_ratio.SetRightMargin(self.right_margin)
+            self.pad_ratio.SetBottomMargin(0.45)
+
+            self.pad_ratio.Draw()  # otherwise ROOT crashes...
+        self.pad_histo.Draw()
+
+        self.legend = ROOT.TLegend(0., 0., 1., 1.)
+        self.legend.SetBorderSize(0)
+        self.legend.SetFillColor(0)
+        self.legend.SetFillStyle(4050)
+        self.legend.SetTextFont(42)
+        self.legend.SetTextSize(self.legend.GetTextSize()*2)
+
+        pass
+
+    @staticmethod
+    def get_left_margin(plot_ratios):
+        if plot_ratios:
+            return 0.13
+        return 0.1
+
+    @classmethod
+    def get_frame_width(cls, plot_ratios):
+        """
+        Returns the width in pixels of the area the histograms are drawn into, which is the same for both pads.
+        """
+        return int(cls.canvas_width * (1. - cls.get_left_margin(plot_ratios) - cls.right_margin))
+
+    def reset(self, name_of_canvas):
+        # the canvas is reused for the next plot, which may use a different name, e.g. inside the ROOT output file
+        self.canvas.SetName(name_of_canvas)
+        self.pad_histo.Clear()
+        if self.pad_ratio:
+            self.pad_ratio.Clear()
+        self.legend.Clear()
+        self.legend.SetNColumns(1)
+
+        pass
+
+    def apply_options(self, ROOT, options, log_scale, ratio_log_scale):
+        # global style settings are only touched if they changed since the last plot drawn in this process
+        get_root_environment().apply_style(OptStat=options.opt_stat, OptTitle=0 if options.omit_title else 1)
+
+        legend_x_values = options.legend_x_values
+        legend_y_values = options.legend_y_values
+        self.legend.SetX1NDC(legend_x_values[0])
+        self.legend.SetY1NDC(legend_y_values[0])
+        self.legend.SetX2NDC(legend_x_values[1])
+        self.legend.SetY2NDC(legend_y_values[1])
+
+        draw_grid = int(bool(options.draw_grid))
+        self.pad_histo.SetGrid(draw_grid, draw_grid)
+        self.pad_histo.SetLogy(int(bool(log_scale)))
+
+        if not options.omit_title:
+            self.pad_histo.SetTopMargin(0.1)
+        else:
+            self.pad_histo.SetTopMargin(0.05)
+
+        if self.pad_ratio:
+            self.pad_ratio.SetGrid(draw_grid, draw_grid)
+            self.pad_ratio.SetLogy(int(bool(ratio_log_scale)))
+
+        pass
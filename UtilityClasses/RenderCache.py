@@ -0,0 +1,146 @@
+__author__ = 'Christopher Bock'
+
+import hashlib
+import json
+import os
+
+from ArrayHistogram import ArrayHistogram, _get_axis_attributes
+from LoggingClass import LoggingClass
+from RatioEngine import get_bin_arrays
+
+
+class RenderCache(LoggingClass):
+    """
+    Content addressed cache for rendered plots. For every plot a hash is built from the bin contents, errors, binning,
+    style, axis titles and attributes and the minimum and maximum set on all histograms, the values of all options and
+    the arguments of plot(). The hashes of all files written are stored in a manifest (a JSON file). If a plot is
+    requested again, its hash matches the one in the manifest and the output file still exists, rendering it can be
+    skipped. Plots which are also written into a ROOT file (option 'safe_to_root_file') are always rendered, as the
+    contents of the ROOT file are not tracked.
+    Assign the cache to RatioHistogram.render_cache to use it. The manifest is written by save(), which
+    RatioHistogram.plot and RatioHistogram.plot_many call automatically.
+    hits and misses count the plots skipped and rendered since the cache was created. print_summary reports them,
+    RatioHistogram.plot_many does so after every batch and RatioHistogram.plot after every plot with level DEBUG.
+    """
+
+    # change this whenever the rendering changes in a way which is not reflected by the hashed inputs
+    cache_version = '1'
+
+    style_getters = ('GetLineColor', 'GetLineStyle', 'GetLineWidth', 'GetMarkerColor', 'GetMarkerStyle',
+                     'GetMarkerSize', 'GetFillColor', 'GetFillStyle')
+
+    def __init__(self, manifest_file_name, logger=None):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.manifest_file_name = manifest_file_name
+        self.manifest = {}
+        self.hits = 0
+        self.misses = 0
+
+        self._modified = False
+
+        if os.path.exists(manifest_file_name):
+            try:
+                with open(manifest_file_name) as manifest_file:
+                    self.manifest = json.load(manifest_file)
+            except ValueError:
+                self.print_log('Could not read the render cache manifest %s, starting from scratch.', 'WARNING',
+                               args=(manifest_file_name,))
+
+        pass
+
+    def compute_key(self, histogram_keys, histograms, options, plot_arguments):
+        """
+        histogram_keys are the names of the histograms in the order they are drawn, histograms maps these names to the
+        histograms, options is the OptionHandler used and plot_arguments a dictionary of the remaining arguments of plot.
+        """
+        key = hashlib.sha1(self.cache_version.encode('utf-8'))
+
+        for name in histogram_keys:
+            histogram = histograms[name]
+            key.update(repr((name, histogram.GetName(), histogram.GetTitle(), histogram.GetNbinsX())).encode('utf-8'))
+            key.update(repr(tuple([getattr(histogram, getter)() for getter in self.style_getters])).encode('utf-8'))
+            key.update(repr(self._get_axis_state(histogram)).encode('utf-8'))
+            self._update_with_bins(key, histogram)
+
+        key.update(repr(sorted([(str(option), repr(value)) for option, value in options.iteritems()])).encode('utf-8'))
+        key.update(repr(sorted([(str(argument), repr(value)) for argument, value in plot_arguments.items()])).encode(
+                   'utf-8'))
+
+        return key.hexdigest()
+
+    @staticmethod
+    def _get_axis_state(histogram):
+        if isinstance(histogram, ArrayHistogram):
+            return (histogram.x_title, histogram.y_title, sorted((histogram.x_axis_attributes or {}).items()),
+                    sorted((histogram.y_axis_attributes or {}).items()), histogram.maximum, histogram.minimum)
+
+        x_axis = histogram.GetXaxis()
+        y_axis = histogram.GetYaxis()
+        return (x_axis.GetTitle(), y_axis.GetTitle(),
+                sorted(_get_axis_attributes(x_axis, histogram.GetNbinsX()).items()),
+                sorted(_get_axis_attributes(y_axis).items()), histogram.GetMaximumStored(), histogram.GetMinimumStored())
+
+    @staticmethod
+    def _update_with_bins(key, histogram):
+        try:
+            contents, errors = get_bin_arrays(histogram)
+            key.update(contents.tobytes())
+            key.update(errors.tobytes())
+        except ImportError:
+            n_cells = histogram.GetNbinsX() + 2
+            key.update(repr([histogram.GetBinContent(i) for i in range(n_cells)]).encode('utf-8'))
+            key.update(repr([histogram.GetBinError(i) for i in range(n_cells)]).encode('utf-8'))
+
+        if hasattr(histogram, 'edges'):
+            key.update(repr(list(histogram.edges)).encode('utf-8'))
+        else:
+            x_axis = histogram.GetXaxis()
+            key.update(repr([x_axis.GetBinLowEdge(i) for i in range(1, histogram.GetNbinsX() + 2)]).encode('utf-8'))
+
+        pass
+
+    def is_up_to_date(self, key, output_file_names):
+        """
+        Returns True, and counts a hit, if all output files exist and have been rendered from inputs with the given key.
+        """
+        for output_file_name in output_file_names:
+            output_file_name = os.path.abspath(output_file_name)
+            if self.manifest.get(output_file_name) != key or not os.path.exists(output_file_name):
+                self.misses += 1
+                return False
+
+        self.hits += 1
+        return True
+
+    def record(self, key, output_file_names):
+        for output_file_name in output_file_names:
+            self.manifest[os.path.abspath(output_file_name)] = key
+        self._modified = True
+
+        pass
+
+    def save(self):
+        if not self._modified:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.manifest_file_name))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # write to a temporary file first, so that an interrupted job never leaves a truncated manifest behind
+        temporary_file_name = '%s.%i.tmp' % (self.manifest_file_name, os.getpid())
+        with open(temporary_file_name, 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=0, sort_keys=True)
+        os.rename(temporary_file_name, self.manifest_file_name)
+
+        self._modified = False
+
+        pass
+
+    def print_summary(self, msg_type='INFO'):
+        total = self.hits + self.misses
+        self.print_log('Render cache: %i hits, %i misses (%.1f%% hit rate).', msg_type, args=(
+                       self.hits, self.misses, 100. * self.hits / total if total else 0.))
+
+        pass
@@ -0,0 +1,199 @@
+__author__ = 'Christopher Bock'
+
+import codecs
+import sys
+import threading
+from collections import OrderedDict
+from timeit import default_timer
+
+from LoggingClass import LoggingClass
+
+
+_default_environment = None
+
+# modules used while plots are set up which are otherwise only imported on first use (locale by argparse through
+# gettext), preload() imports them before it starts importing ROOT
+_EARLY_IMPORTS = ('numpy', 'locale')
+# numpy imports a helper module the first time each of these ndarray methods is called
+_NUMPY_WARM_UP = ('all', 'any', 'min', 'max', 'sum', 'prod', 'mean')
+
+
+def get_root_environment():
+    """
+    Returns the RootEnvironment shared by everything running in this process.
+    """
+    global _default_environment
+    if _default_environment is None:
+        _default_environment = RootEnvironment()
+    return _default_environment
+
+
+class RootEnvironment(LoggingClass):
+    """
+    Takes care of importing and setting up ROOT once per process. Importing ROOT takes seconds, preload() therefore
+    starts the import on a background thread so that it overlaps with parsing arguments and reading config files:
+
+        get_root_environment().preload()
+        plotter = RatioHistogram()
+        plotter.load_options('plots.cfg')
+        ...
+        plotter.plot('ratio')      # waits for the import only if it is still running
+
+    get_root waits for a running background import (or imports ROOT itself) and applies the batch mode, only calling
+    into ROOT if it actually changes. Likewise apply_style only touches the global gStyle settings which changed since
+    they were last applied in this process. The time spent importing each module through import_module is recorded in
+    import_timings, print_import_timings lists them.
+    Note that Python 2 holds a global import lock while a module is imported, hence any import statement executed on
+    another thread waits for the background import to finish. The classes used to set up plots therefore import
+    everything they need when they are imported themselves, and preload() imports the modules otherwise loaded on first
+    use (see _EARLY_IMPORTS) as well as the UTF-8 codec before it starts, and calls the numpy reductions which import a
+    module on first use once. Python 2 takes the lock even for modules which
+    have already been imported, hence library functions importing something when called wait as well, e.g. creating an
+    argparse.ArgumentParser (RatioHistogram(preload_root=True) creates the parser of its OptionHandler beforehand).
+    Import and set up what else you need before calling preload(), modules which are imported on demand can be retrieved
+    via import_module without waiting once they have been imported.
+    """
+
+    def __init__(self, logger=None):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.import_timings = OrderedDict()
+
+        self._root = None
+        self._import_error = None
+        self._batch_mode = None
+        self._style = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+        pass
+
+    def import_module(self, module_name):
+        """
+        Imports the module and records how long the import took, unless it had already been imported before.
+        """
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+
+        import importlib
+
+        start_time = default_timer()
+        module = importlib.import_module(module_name)
+        self.import_timings[module_name] = default_timer() - start_time
+        self.print_log('Imported %s in %.3f s.', 'DEBUG', args=(module_name, self.import_timings[module_name]),
+                       fields={'module': module_name, 'duration': self.import_timings[module_name]})
+
+        return module
+
+    def preload(self):
+        """
+        Starts importing ROOT on a background thread, unless ROOT has already been imported or the import is running.
+        """
+        with self._lock:
+            if self._root is not None or self._thread is not None:
+                return
+
+            for module_name in _EARLY_IMPORTS:
+                try:
+                    self.import_module(module_name)
+                except ImportError:
+                    pass
+            self._warm_up_numpy()
+            codecs.lookup('utf-8')
+
+            self._thread = threading.Thread(target=self._import_root, name='RootEnvironment')
+            self._thread.daemon = True
+            self._thread.start()
+
+        pass
+
+    @staticmethod
+    def _warm_up_numpy():
+        numpy = sys.modules.get('numpy')
+        if numpy is None:
+            return
+
+        values = numpy.ones(2)
+        for method_name in _NUMPY_WARM_UP:
+            getattr(values, method_name)()
+        numpy.logical_and.reduce(values > 0)
+
+        pass
+
+    def wait(self):
+        """
+        Waits for a background import started by preload to finish. Call this before forking worker processes.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+        pass
+
+    def is_loaded(self):
+        return self._root is not None
+
+    def get_root(self, batch_mode=None):
+        """
+        Returns the ROOT module. If batch_mode is not None, ROOT is switched to (or out of) batch mode accordingly.
+        Raises the ImportError of a failed background import.
+        """
+        if self._root is None:
+            self.wait()
+            with self._lock:
+                if self._import_error is not None:
+                    import_error = self._import_error
+                    self._import_error = None
+                    self._thread = None
+                    raise import_error
+                if self._root is None:
+                    self._root = self.import_module('ROOT')
+
+        if batch_mode is not None and batch_mode != self._batch_mode:
+            self._root.gROOT.SetBatch(batch_mode)
+            self._batch_mode = batch_mode
+
+        return self._root
+
+    def apply_style(self, **settings):
+        """
+        Applies global style settings, e.g. apply_style(OptStat=0, OptTitle=1) calls gStyle.SetOptStat(0) and
+        gStyle.SetOptTitle(1). Settings whose value has already been applied through apply_style are skipped, changes
+        made to gStyle directly are not noticed.
+        """
+        changed = [(name, value) for name, value in sorted(settings.items()) if self._style.get(name, self) != value]
+        if not changed:
+            return
+
+        style = self.get_root().gStyle
+        for name, value in changed:
+            getattr(style, 'Set' + name)(value)
+            self._style[name] = value
+
+        pass
+
+    def print_import_timings(self, msg_type='INFO'):
+        if not self.is_enabled(msg_type):
+            return
+
+        self.print_line(msg_type)
+        self.print_log('  Import timings  ', msg_type)
+        for module_name, duration in self.import_timings.items():
+            self.print_log('    %s  ->  %.3f s', msg_type, args=(module_name, duration))
+        self.print_line(msg_type)
+
+        pass
+
+    def _import_root(self):
+        try:
+            root = self.import_module('ROOT')
+        except Exception as exception:
+            self._import_error = exception
+            self.print_log('Could not import ROOT in the background: %s', 'DEBUG', args=(exception,))
+            return
+
+        with self._lock:
+            self._root = root
+
+        pass
@@ -0,0 +1,173 @@
+__author__ = 'Christopher Bock'
+
+from collections import OrderedDict, namedtuple
+
+from LoggingClass import LoggingClass
+from RootEnvironment import get_root_environment
+
+
+_default_file_pool = None
+
+# reference to a histogram inside a ROOT file, which can be sent to other processes instead of the histogram itself
+RootFileHistogram = namedtuple('RootFileHistogram', ['file_name', 'histogram_name'])
+
+
+def get_default_file_pool():
+    """
+    Returns the file pool shared by all RatioHistogram objects which have not been given a pool of their own.
+    """
+    global _default_file_pool
+    if _default_file_pool is None:
+        _default_file_pool = RootFilePool()
+    return _default_file_pool
+
+
+class RootFilePool(LoggingClass):
+    """
+    Keeps up to max_open_files ROOT files open for reading, closing the least recently used one once the limit is
+    reached. Opening a file (and reading its key index) as well as looking up directories inside a file thus happens
+    only once per file, no matter how many histograms are read from it.
+    """
+
+    def __init__(self, logger=None, max_open_files=16):
+        LoggingClass.__init__(self, logger=logger)
+
+        self.max_open_files = max_open_files
+
+        self._files = OrderedDict()
+        self._directories = {}
+
+        pass
+
+    def get_file(self, file_name):
+        root_file = self._files.pop(file_name, None)
+        if root_file is None:
+            ROOT = get_root_environment().get_root()
+
+            while len(self._files) >= self.max_open_files:
+                self.close(next(iter(self._files)))
+
+            self.print_log('Opening %s', 'DEBUG', args=(file_name,))
+            root_file = ROOT.TFile.Open(file_name, 'READ')
+            if not root_file or root_file.IsZombie():
+                raise NameError('Could not load root file: ' + file_name)
+
+        # (re-)inserting the file marks it as the most recently used one
+        self._files[file_name] = root_file
+
+        return root_file
+
+    def get_directory(self, file_name, directory_name=None):
+        """
+        In case no directory name has been specified, the file itself is returned.
+        """
+        root_file = self.get_file(file_name)
+        if not directory_name:
+            return root_file
+
+        directory = self._directories.get((file_name, directory_name))
+        if directory is None:
+            directory = root_file.Get(directory_name)
+            if not directory:
+                raise NameError('Could not open working directory: ' + directory_name)
+            self._directories[(file_name, directory_name)] = directory
+
+        return directory
+
+    def get_histogram(self, file_name, histogram_name, directory_name=None):
+        """
+        Reads a histogram and detaches it from the file, so that it stays valid once the file is closed. In case no
+        directory name has been specified, histogram_name is expected to contain the complete path to the histogram.
+        """
+        ROOT = get_root_environment().get_root()
+
+        histogram = self.get_directory(file_name, directory_name).Get(histogram_name)
+        if not histogram:
+            raise NameError('Could not load histogram: ' + histogram_name)
+
+        histogram.SetDirectory(0)
+        ROOT.SetOwnership(histogram, True)
+
+        return histogram
+
+    def close(self, file_name):
+        root_file = self._files.pop(file_name, None)
+        if root_file is None:
+            return
+
+        for key in [key for key in self._directories if key[0] == file_name]:
+            del self._directories[key]
+
+        self.print_log('Closing %s', 'DEBUG', args=(file_name,))
+        root_file.Close()
+
+        pass
+
+    def close_all(self):
+        for file_name in list(self._files):
+            self.close(file_name)
+
+        pass
+
+
+class LazyHistogram(object):
+    """
+    Placeholder for a histogram stored in a ROOT file, which is read from the file pool the first time it is needed.
+    Functions registered via defer, e.g. histogram stylers, are applied to the histogram right after it has been read.
+    All other attribute accesses are forwarded to the loaded histogram.
+    Supply -1 as histogram_scale to normalize the histogram.
+    """
+
+    def __init__(self, file_pool, file_name, histogram_name, directory_name=None, histogram_scale=1):
+        self.file_pool = file_pool
+        self.file_name = file_name
+        self.histogram_name = histogram_name
+        self.directory_name = directory_name
+        self.histogram_scale = histogram_scale
+
+        self._histogram = None
+        self._deferred = []
+
+        pass
+
+    def GetName(self):
+        if self._histogram is not None:
+            return self._histogram.GetName()
+        return self.histogram_name.rsplit('/', 1)[-1]
+
+    def is_loaded(self):
+        return self._histogram is not None
+
+    def defer(self, function):
+        """
+        function will be called with the loaded histogram as its only argument.
+        """
+        if self._histogram is not None:
+            function(self._histogram)
+        else:
+            self._deferred.append(function)
+
+        pass
+
+    def load(self):
+        if self._histogram is None:
+            histogram = self.file_pool.get_histogram(self.file_name, self.histogram_name, self.directory_name)
+
+            if self.histogram_scale == -1:
+                if histogram.Integral():
+                    histogram.Scale(1. / histogram.Integral())
+            elif self.histogram_scale != 1:
+                histogram.Scale(self.histogram_scale)
+
+            for function in self._deferred:
+                function(histogram)
+            self._deferred = []
+
+            self._histogram = histogram
+
+        return self._histogram
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
@@ -0,0 +1,183 @@
+__author__ = 'Christopher Bock'
+
+from collections import OrderedDict
+from itertools import islice
+
+try:
+    from itertools import izip
+except ImportError:
+    izip = zip
+
+from ArrayHistogram import ArrayHistogram
+from LoggingClass import LoggingClass
+from RootEnvironment import get_root_environment
+
+
+class StreamFiller(LoggingClass):
+    """
+    Fills histograms sharing one binning directly from streams of values, without creating ROOT histograms. Values are
+    read in chunks of chunk_size and binned using numpy, so memory usage only depends on the chunk size and the number
+    of bins, no matter how long the streams are. Bin contents and the sum of squared weights are accumulated including
+    under- and overflow, values are assigned to bins like TH1::Fill does.
+
+    A stream can be any iterable of numbers (e.g. a generator reading an ntuple), optionally accompanied by an iterable of
+    weights of the same length. Streams which already deliver numpy arrays chunk by chunk are consumed with
+    chunked=True. To feed several plots in a single pass over the data, call fill with each chunk on several fillers:
+
+        pt_filler = StreamFiller(pt_edges)
+        eta_filler = StreamFiller(eta_edges)
+        for chunk in reader:
+            pt_filler.fill('data', chunk['pt'], chunk['weight'])
+            eta_filler.fill('data', chunk['eta'], chunk['weight'])
+
+    The results are returned as ArrayHistograms, which can be passed to RatioHistogram.add_histogram.
+    """
+
+    def __init__(self, edges, logger=None, chunk_size=65536):
+        numpy = get_root_environment().import_module('numpy')
+
+        LoggingClass.__init__(self, logger=logger)
+
+        self.edges = numpy.array(edges, 'float64')
+        if len(self.edges) < 2 or not (numpy.diff(self.edges) > 0).all():
+            raise ValueError('StreamFiller needs at least two strictly increasing bin edges!')
+
+        self.chunk_size = chunk_size
+
+        self.n_bins = len(self.edges) - 1
+        widths = numpy.diff(self.edges)
+        self._uniform = numpy.allclose(widths, widths[0], rtol=1e-9, atol=0.)
+
+        self._contents = OrderedDict()
+        self._sumw2 = {}
+        self._entries = {}
+
+        pass
+
+    def bin_indices(self, values):
+        """
+        Returns the bin (0 being the underflow and n_bins + 1 the overflow bin) of each of the values.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        if not self._uniform:
+            return numpy.searchsorted(self.edges, values, side='right')
+
+        # same arithmetic as TAxis::FindFixBin for equidistant bins
+        x_minimum = self.edges[0]
+        x_maximum = self.edges[-1]
+        with numpy.errstate(invalid='ignore'):
+            indices = numpy.floor(self.n_bins * (values - x_minimum) / (x_maximum - x_minimum)) + 1
+            indices = numpy.where(values < x_minimum, 0, numpy.where(values >= x_maximum, self.n_bins + 1, indices))
+            indices = numpy.where(numpy.isnan(values), self.n_bins + 1, indices)
+        return numpy.clip(indices, 0, self.n_bins + 1).astype('intp')
+
+    def fill(self, name, values, weights=None):
+        """
+        Adds one chunk of values, and optionally their weights, to the histogram name. The histogram is created on
+        first use.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        values = numpy.asarray(values, 'float64').ravel()
+        n_cells = self.n_bins + 2
+
+        if name not in self._contents:
+            self._contents[name] = numpy.zeros(n_cells, 'float64')
+            self._sumw2[name] = numpy.zeros(n_cells, 'float64')
+            self._entries[name] = 0
+
+        if len(values) == 0:
+            return
+
+        indices = self.bin_indices(values)
+        if weights is None:
+            counts = numpy.bincount(indices, minlength=n_cells)
+            self._contents[name] += counts
+            self._sumw2[name] += counts
+        else:
+            weights = numpy.asarray(weights, 'float64').ravel()
+            if len(weights) != len(values):
+                raise ValueError('Got %i weights for %i values when filling %s.' % (len(weights), len(values), name))
+            self._contents[name] += numpy.bincount(indices, weights, n_cells)
+            self._sumw2[name] += numpy.bincount(indices, weights * weights, n_cells)
+
+        self._entries[name] += len(values)
+
+        pass
+
+    def consume(self, name, stream, weights=None, chunked=False):
+        """
+        Fills the histogram name with all values of stream, weighted by the elements of weights if given. If chunked is
+        True, stream (and weights) yield arrays of values which are filled one after the other. Returns the number of
+        values read.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        n_values = self._entries.get(name, 0)
+
+        if chunked:
+            if weights is None:
+                for chunk in stream:
+                    self.fill(name, chunk)
+            else:
+                # izip, zip would read both streams completely on Python 2
+                for chunk, weight_chunk in izip(stream, weights):
+                    self.fill(name, chunk, weight_chunk)
+        elif isinstance(stream, numpy.ndarray):
+            if weights is not None:
+                weights = numpy.asarray(weights, 'float64')
+            for start in range(0, len(stream), self.chunk_size):
+                self.fill(name, stream[start:start + self.chunk_size],
+                          None if weights is None else weights[start:start + self.chunk_size])
+        else:
+            values = iter(stream)
+            weights = None if weights is None else iter(weights)
+            while True:
+                chunk = numpy.fromiter(islice(values, self.chunk_size), 'float64')
+                weight_chunk = None
+                if weights is not None:
+                    weight_chunk = numpy.fromiter(islice(weights, len(chunk)), 'float64')
+                self.fill(name, chunk, weight_chunk)
+                if len(chunk) < self.chunk_size:
+                    break
+
+        n_values = self._entries.get(name, 0) - n_values
+        self.print_log('Filled %i values into %s.', 'DEBUG', args=(n_values, name))
+
+        return n_values
+
+    def consume_streams(self, streams, chunked=False):
+        """
+        Consumes several streams, given either as a dictionary name -> stream or as a list of (name, stream) or
+        (name, stream, weights) tuples.
+        """
+        if isinstance(streams, dict):
+            streams = streams.items()
+
+        for entry in streams:
+            self.consume(*entry, chunked=chunked)
+
+        pass
+
+    def get_histogram(self, name):
+        """
+        Returns the histogram name as ArrayHistogram. The arrays are copies, filling can continue afterwards.
+        """
+        numpy = get_root_environment().import_module('numpy')
+
+        return ArrayHistogram(name, self.edges.copy(), self._contents[name].copy(), numpy.sqrt(self._sumw2[name]),
+                              name, float(self._entries[name]))
+
+    def get_histograms(self):
+        """
+        Returns a list of (name, ArrayHistogram) of all histograms in the order they have been created.
+        """
+        return [(name, self.get_histogram(name)) for name in self._contents]
+
+    def reset(self):
+        self._contents = OrderedDict()
+        self._sumw2 = {}
+        self._entries = {}
+
+        pass
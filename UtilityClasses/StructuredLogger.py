@@ -0,0 +1,133 @@
+__author__ = 'Christopher Bock'
+
+import json
+import os
+import sys
+import threading
+import time
+
+from LoggingClass import LOG_LEVELS
+
+
+class StructuredLogger(object):
+    """
+    Logger writing one JSON object per line instead of free-form text, so that the logs of many jobs can be aggregated
+    without parsing the text output. Every record has the keys
+     ts         time of the message in seconds since the epoch
+     level      the message type (DEBUG, INFO, WARNING, ERROR, ...)
+     source     name of the class which logged the message, None if unknown
+     message    the message itself
+     fields     dictionary of additional values, e.g. the duration of a plot, only present if supplied
+    Passed to a LoggingClass as logger, the class uses log_record instead of print_log, which adds the name of the
+    class as source and the fields passed to LoggingClass.print_log.
+
+    The records are written to one of
+     file_name      a file which is rotated once it exceeds max_bytes (if max_bytes > 0): file_name is renamed to
+                    file_name.1, file_name.1 to file_name.2 and so on, keeping backup_count old files
+     socket_path    a local (unix) stream socket, records are newline separated. If the connection fails the records
+                    are dropped and the connection is retried with the next record.
+     stream         any object with write and flush, defaults to sys.stdout
+    """
+
+    def __init__(self, file_name=None, socket_path=None, stream=None, level='DEBUG', max_bytes=0, backup_count=5):
+        self.file_name = file_name
+        self.socket_path = socket_path
+        self.stream = stream
+        self.level = LOG_LEVELS[level]
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._socket = None
+        self._lock = threading.Lock()
+
+        if file_name:
+            self.stream = open(file_name, 'a')
+        elif not socket_path and stream is None:
+            self.stream = sys.stdout
+
+        pass
+
+    def set_level(self, level):
+        self.level = LOG_LEVELS[level]
+
+        pass
+
+    def is_enabled(self, msg_type):
+        return LOG_LEVELS.get(msg_type, 20) >= self.level
+
+    def print_log(self, message, msg_type='INFO', suppress_timestamp=False):
+        """
+        Implements the plain logger interface of LoggingClass. suppress_timestamp is ignored, records always have a
+        timestamp.
+        """
+        self.log_record(message, msg_type)
+
+        pass
+
+    def log_record(self, message, msg_type='INFO', source=None, fields=None):
+        if not self.is_enabled(msg_type):
+            return
+
+        record = {'ts': time.time(), 'level': msg_type, 'source': source, 'message': message}
+        if fields:
+            record['fields'] = fields
+
+        self.write_line(json.dumps(record, default=str, sort_keys=True) + '\n')
+
+        pass
+
+    def write_line(self, line):
+        with self._lock:
+            if self.socket_path:
+                self._send(line)
+                return
+
+            if self.file_name and self.max_bytes > 0 and self.stream.tell() + len(line) > self.max_bytes:
+                self._rotate()
+
+            self.stream.write(line)
+            self.stream.flush()
+
+        pass
+
+    def _rotate(self):
+        self.stream.close()
+
+        for index in range(self.backup_count - 1, 0, -1):
+            source = '%s.%i' % (self.file_name, index)
+            if os.path.exists(source):
+                os.rename(source, '%s.%i' % (self.file_name, index + 1))
+        if self.backup_count > 0:
+            os.rename(self.file_name, self.file_name + '.1')
+        else:
+            os.remove(self.file_name)
+
+        self.stream = open(self.file_name, 'a')
+
+        pass
+
+    def _send(self, line):
+        import socket
+
+        try:
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.connect(self.socket_path)
+            self._socket.sendall(line.encode('utf-8'))
+        except (IOError, OSError, socket.error):
+            # the receiving end is gone, drop the record and reconnect with the next one
+            if self._socket is not None:
+                self._socket.close()
+            self._socket = None
+
+        pass
+
+    def close(self):
+        with self._lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+            if self.file_name and not self.stream.closed:
+                self.stream.close()
+
+        pass
@@ -0,0 +1,575 @@
+"""
+Minimal pure Python stand-in for PyROOT, providing just the parts of the ROOT interface used by UtilityClasses. It
+allows running the benchmarks on machines without ROOT. Histograms store their contents in array.array buffers like
+ROOT does, canvases write a small placeholder file instead of a real plot. Timings obtained with it are only meaningful
+relative to other runs using the stand-in.
+"""
+__author__ = 'Christopher Bock'
+
+import array
+import copy
+import math
+
+
+class TObject(object):
+    def __init__(self, name='', title=''):
+        self._name = name
+        self._title = title
+
+    def GetName(self):
+        return self._name
+
+    def SetName(self, name):
+        self._name = name
+
+    def GetTitle(self):
+        return self._title
+
+    def SetTitle(self, title):
+        self._title = title
+
+    def ClassName(self):
+        return self.__class__.__name__
+
+    def InheritsFrom(self, name):
+        return any(c.__name__ == name for c in self.__class__.__mro__)
+
+    def Draw(self, option=''):
+        if _pad[0] is not None:
+            _pad[0].primitives.append((self, option))
+
+    def Write(self, name=None):
+        _current_dir[0].objects[name or self._name] = self
+
+
+class TAxis(object):
+    _defaults = {'TitleSize': 0.035, 'TitleOffset': 1., 'TitleColor': 1, 'TitleFont': 42, 'LabelSize': 0.035,
+                 'LabelOffset': 0.005, 'LabelColor': 1, 'LabelFont': 42, 'TickLength': 0.03, 'Ndivisions': 510,
+                 'MoreLogLabels': False, 'NoExponent': False}
+
+    def __init__(self, edges):
+        self.edges = edges
+        self._title = ''
+        self.attributes = dict(self._defaults)
+        self.center_title = False
+        self.first = 0
+        self.last = 0
+
+    def GetXmin(self):
+        return self.edges[0]
+
+    def GetXmax(self):
+        return self.edges[-1]
+
+    def GetNbins(self):
+        return len(self.edges) - 1
+
+    def GetBinLowEdge(self, i):
+        return self.edges[i - 1] if i >= 1 else self.edges[0] - 1
+
+    def GetBinUpEdge(self, i):
+        return self.edges[i]
+
+    def FindBin(self, x):
+        if x < self.edges[0]:
+            return 0
+        if x >= self.edges[-1]:
+            return len(self.edges)
+        import bisect
+        return bisect.bisect_right(self.edges, x)
+
+    def GetXbins(self):
+        return array.array('d', self.edges)
+
+    def GetTitle(self):
+        return self._title
+
+    def SetTitle(self, t):
+        self._title = t
+
+    def CenterTitle(self, center=True):
+        self.center_title = center
+
+    def GetCenterTitle(self):
+        return self.center_title
+
+    def SetRange(self, first=0, last=0):
+        self.first, self.last = first, last
+
+    def SetRangeUser(self, xmin, xmax):
+        self.first, self.last = self.FindBin(xmin), self.FindBin(xmax - 1e-9 * (xmax - xmin))
+
+    def GetFirst(self):
+        return self.first if self.first > 0 else 1
+
+    def GetLast(self):
+        return self.last if self.last > 0 else self.GetNbins()
+
+    def __getattr__(self, name):
+        if name[3:] in self._defaults:
+            if name.startswith('Set'):
+                return lambda v: self.attributes.__setitem__(name[3:], v)
+            if name.startswith('Get'):
+                return lambda: self.attributes[name[3:]]
+        raise AttributeError(name)
+
+    def __copy__(self):
+        c = TAxis(self.edges)
+        c.__dict__.update(self.__dict__)
+        c.attributes = dict(self.attributes)
+        return c
+
+
+class TH1(TObject):
+    _typecode = 'd'
+    _add_directory = [True]
+
+    def __init__(self, name='', title='', nbins=1, xlow=0., xup=1.):
+        TObject.__init__(self, name, title)
+        if isinstance(xlow, (array.array, list, tuple)) or hasattr(xlow, '__len__'):
+            edges = [float(e) for e in xlow]
+        else:
+            edges = [xlow + (xup - xlow) * i / float(nbins) for i in range(nbins + 1)]
+        self._xaxis = TAxis(edges)
+        self._yaxis = TAxis([0., 1.])
+        self._array = array.array(self._typecode, [0] * (nbins + 2))
+        self._sumw2 = TArrayD(0)
+        self.line_color = 1
+        self.line_style = 1
+        self.line_width = 1
+        self.marker_style = 1
+        self.marker_color = 1
+        self.marker_size = 1.
+        self.fill_color = 0
+        self.fill_style = 1001
+        self.maximum = -1111.
+        self.minimum = -1111.
+        self.entries = 0.
+        self.directory = _current_dir[0]
+
+    def GetNbinsX(self):
+        return len(self._array) - 2
+
+    def GetXaxis(self):
+        return self._xaxis
+
+    def GetYaxis(self):
+        return self._yaxis
+
+    def GetArray(self):
+        return self._array
+
+    def GetSumw2(self):
+        return self._sumw2
+
+    def GetSumw2N(self):
+        return self._sumw2.GetSize()
+
+    def Sumw2(self, flag=True):
+        if flag and not self._sumw2.GetSize():
+            self._sumw2 = TArrayD(len(self._array))
+            for i, v in enumerate(self._array):
+                self._sumw2.arr[i] = abs(v)
+
+    def GetBinContent(self, i):
+        return self._array[i]
+
+    def SetBinContent(self, i, v):
+        self._array[i] = v
+        self.entries += 1
+
+    def GetBinError(self, i):
+        if self._sumw2.GetSize():
+            return math.sqrt(self._sumw2.arr[i])
+        return math.sqrt(abs(self._array[i]))
+
+    def SetBinError(self, i, e):
+        self.Sumw2()
+        self._sumw2.arr[i] = e * e
+
+    def Set(self, n, values):
+        self._array = array.array(self._typecode, [float(v) for v in list(values)[:n]])
+
+    def SetError(self, errors):
+        self._sumw2 = TArrayD(len(self._array))
+        for i in range(len(self._array)):
+            self._sumw2.arr[i] = float(errors[i]) ** 2
+
+    def SetEntries(self, n):
+        self.entries = n
+
+    def GetEntries(self):
+        return self.entries
+
+    def GetSumOfWeights(self):
+        return sum(self._array[1:-1])
+
+    def Integral(self):
+        return self.GetSumOfWeights()
+
+    def Fill(self, x, w=1.):
+        i = self._xaxis.FindBin(x)
+        self._array[i] += w
+        if self._sumw2.GetSize():
+            self._sumw2.arr[i] += w * w
+        self.entries += 1
+
+    def Scale(self, s):
+        self.Sumw2()
+        for i in range(len(self._array)):
+            self._array[i] *= s
+            self._sumw2.arr[i] *= s * s
+
+    def GetMaximum(self):
+        if self.maximum != -1111.:
+            return self.maximum
+        return max(self._array[1:-1])
+
+    def GetMinimum(self):
+        if self.minimum != -1111.:
+            return self.minimum
+        return min(self._array[1:-1])
+
+    def SetMaximum(self, v=-1111.):
+        self.maximum = v
+
+    def GetMaximumStored(self):
+        return self.maximum
+
+    def GetMinimumStored(self):
+        return self.minimum
+
+    def SetMinimum(self, v=-1111.):
+        self.minimum = v
+
+    def SetDirectory(self, d):
+        self.directory = d
+
+    def SetStats(self, s):
+        pass
+
+    def Clone(self, name=None):
+        import copy
+        c = copy.copy(self)
+        c._array = array.array(self._typecode, self._array)
+        c._sumw2 = TArrayD(0)
+        c._sumw2.arr = array.array('d', self._sumw2.arr)
+        c._xaxis = copy.copy(self._xaxis)
+        c._yaxis = copy.copy(self._yaxis)
+        c._name = name or self._name
+        return c
+
+    def Divide(self, other):
+        if other.GetNbinsX() != self.GetNbinsX():
+            raise ValueError('different binning')
+        self.Sumw2()
+        for i in range(len(self._array)):
+            c1, c2 = self._array[i], other._array[i]
+            e1, e2 = self.GetBinError(i), other.GetBinError(i)
+            if c2 == 0:
+                self._array[i] = 0
+                self._sumw2.arr[i] = 0
+                continue
+            self._array[i] = c1 / c2
+            self._sumw2.arr[i] = (e1 * e1 * c2 * c2 + e2 * e2 * c1 * c1) / (c2 ** 4)
+
+    def Rebin(self, ngroup=2, newname='', xbins=None):
+        # as TH1::Rebin: modifies the histogram itself unless newname is given, xbins defines ngroup variable bins
+        if xbins is not None:
+            edges = [float(e) for e in list(xbins)[:ngroup + 1]]
+        else:
+            nb = self.GetNbinsX() // ngroup
+            edges = [self._xaxis.edges[i * ngroup] for i in range(nb + 1)]
+        h = self.Clone(newname) if newname else self
+        contents = array.array(self._typecode, [0] * (len(edges) + 1))
+        sumw2 = array.array('d', [0.] * (len(edges) + 1))
+        for i in range(len(self._array)):
+            if i == 0:
+                j = 0
+            elif i == len(self._array) - 1:
+                j = len(edges)
+            else:
+                import bisect
+                j = min(bisect.bisect_right(edges, self._xaxis.edges[i - 1]), len(edges))
+            contents[j] += self._array[i]
+            sumw2[j] += self.GetBinError(i) ** 2
+        xaxis = copy.copy(self._xaxis)
+        xaxis.edges = edges
+        xaxis.first = xaxis.last = 0
+        h._xaxis = xaxis
+        h._array = contents
+        h._sumw2 = TArrayD(0)
+        h._sumw2.arr = sumw2
+        return h
+
+    def __getattr__(self, name):
+        for prefix, attr in (('SetLine', 'line_'), ('GetLine', 'line_'), ('SetMarker', 'marker_'),
+                             ('GetMarker', 'marker_'), ('SetFill', 'fill_'), ('GetFill', 'fill_')):
+            if name.startswith(prefix):
+                field = attr + name[len(prefix):].lower()
+                if name.startswith('Set'):
+                    return lambda v: setattr(self, field, v)
+                return lambda: getattr(self, field)
+        raise AttributeError(name)
+
+    @classmethod
+    def AddDirectory(cls, flag):
+        cls._add_directory[0] = flag
+
+    @classmethod
+    def AddDirectoryStatus(cls):
+        return cls._add_directory[0]
+
+
+class TH1D(TH1):
+    _typecode = 'd'
+
+
+class TH1F(TH1):
+    _typecode = 'f'
+
+
+class TArrayD(object):
+    def __init__(self, n):
+        self.arr = array.array('d', [0.] * n)
+
+    def GetSize(self):
+        return len(self.arr)
+
+    def GetArray(self):
+        return self.arr
+
+
+class TPad(TObject):
+    def __init__(self, name='', title='', x1=0, y1=0, x2=1, y2=1):
+        TObject.__init__(self, name, title)
+        self.primitives = []
+        self.logy = 0
+        self.margins = {}
+        self.parent = _pad[0]
+
+    def cd(self, i=0):
+        _pad[0] = self
+        return self
+
+    def Clear(self, option=''):
+        self.primitives = []
+
+    def SetLogy(self, v=1):
+        self.logy = v
+
+    def SetGrid(self, x=1, y=1):
+        self.grid = (x, y)
+
+    def SetTicks(self, x, y):
+        pass
+
+    def GetWw(self):
+        return 800
+
+    def GetWh(self):
+        return 600
+
+    def __getattr__(self, name):
+        if name.startswith('Set') and name.endswith('Margin'):
+            return lambda v: self.margins.__setitem__(name[3:], v)
+        if name.startswith('Get') and name.endswith('Margin'):
+            return lambda: self.margins.get(name[3:], 0.1)
+        raise AttributeError(name)
+
+    def Update(self):
+        pass
+
+    def Modified(self):
+        pass
+
+    def Close(self):
+        pass
+
+
+class TCanvas(TPad):
+    def __init__(self, name='', title='', x=0, y=0, w=800, h=600):
+        TPad.__init__(self, name, title)
+        _pad[0] = self
+        self.w = w
+
+    def Print(self, file_name, file_type=''):
+        with open(file_name, 'w') as f:
+            f.write('fake %s\n' % file_type)
+
+    def SaveAs(self, file_name):
+        self.Print(file_name)
+
+
+class TLegend(TObject):
+    def __init__(self, x1=0, y1=0, x2=1, y2=1):
+        TObject.__init__(self, 'legend')
+        self.entries = []
+        self.coords = [x1, y1, x2, y2]
+        self.ncolumns = 1
+        self.text_size = 0.02
+
+    def AddEntry(self, obj, label, option=''):
+        if not isinstance(obj, TObject):
+            raise TypeError('not a TObject')
+        self.entries.append((obj, label, option))
+
+    def GetNRows(self):
+        return len(self.entries)
+
+    def Clear(self):
+        self.entries = []
+
+    def SetNColumns(self, n):
+        self.ncolumns = n
+
+    def GetTextSize(self):
+        return self.text_size
+
+    def SetTextSize(self, s):
+        self.text_size = s
+
+    def SetX1NDC(self, v):
+        self.coords[0] = v
+
+    def SetY1NDC(self, v):
+        self.coords[1] = v
+
+    def SetX2NDC(self, v):
+        self.coords[2] = v
+
+    def SetY2NDC(self, v):
+        self.coords[3] = v
+
+    def __getattr__(self, name):
+        if name.startswith('Set'):
+            return lambda *a: None
+        raise AttributeError(name)
+
+
+class TLine(TObject):
+    def __init__(self, *args):
+        TObject.__init__(self, 'line')
+
+    def __getattr__(self, name):
+        if name.startswith('Set'):
+            return lambda *a: None
+        raise AttributeError(name)
+
+
+class TStyle(object):
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('Set'):
+            return lambda *a: self.calls.append((name, a))
+        raise AttributeError(name)
+
+
+gStyle = TStyle()
+
+
+class TDirectory(TObject):
+    def __init__(self, name='', title=''):
+        TObject.__init__(self, name, title)
+        self.objects = {}
+
+    def Get(self, name):
+        obj = self
+        for part in name.split('/'):
+            if not part:
+                continue
+            obj = obj.objects.get(part) if isinstance(obj, TDirectory) else None
+            if obj is None:
+                return None
+        return obj
+
+    def GetDirectory(self, name):
+        directory = self.Get(name)
+        return directory if isinstance(directory, TDirectory) else None
+
+    def mkdir(self, name):
+        d = TDirectory(name)
+        self.objects[name] = d
+        return d
+
+    def cd(self, path=''):
+        _current_dir[0] = self.Get(path) if path else self
+        return True
+
+    def WriteTObject(self, obj, name=None, option=''):
+        self.objects[name or obj.GetName()] = obj
+        return 1
+
+    def GetListOfKeys(self):
+        return list(self.objects.keys())
+
+
+_files = {}
+open_count = [0]
+
+
+class TFile(TDirectory):
+    def __init__(self, name='', mode='READ'):
+        TDirectory.__init__(self, name)
+        open_count[0] += 1
+        self.mode = mode.upper()
+        self.open = True
+        if self.mode in ('READ', 'UPDATE') and name in _files:
+            self.objects = _files[name].objects
+        _files[name] = self
+        if mode.upper() != 'READ':
+            _current_dir[0] = self
+
+    @staticmethod
+    def Open(name, mode='READ'):
+        if mode.upper() == 'READ' and name not in _files:
+            return None
+        return TFile(name, mode)
+
+    def IsOpen(self):
+        return self.open
+
+    def IsZombie(self):
+        return False
+
+    def Close(self):
+        self.open = False
+        _current_dir[0] = gROOT
+
+    def Write(self, *args):
+        pass
+
+
+class TROOT(TDirectory):
+    def __init__(self):
+        TDirectory.__init__(self, 'ROOT')
+        self.batch = False
+
+    def SetBatch(self, flag=True):
+        self.batch = flag
+
+    def IsBatch(self):
+        return self.batch
+
+    def FindObject(self, name):
+        return None
+
+    def GetListOfCanvases(self):
+        return []
+
+
+gROOT = TROOT()
+_current_dir = [gROOT]
+_pad = [None]
+kTRUE = True
+kFALSE = False
+
+
+def EnableThreadSafety():
+    pass
+
+
+def SetOwnership(obj, flag):
+    pass
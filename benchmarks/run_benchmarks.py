@@ -0,0 +1,376 @@
+"""
+Benchmarks for RatioHistogram, OptionHandler and LoggingClass.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+
+If ROOT can not be imported (or --fake-root is given) the stand-in in benchmarks/fake_root is used instead. Each
+benchmark is repeated several times and the fastest repetition is reported, setup work (creating histograms, writing
+config files) is not timed. Results are written as JSON, --compare prints the change relative to a previous run.
+"""
+__author__ = 'Christopher Bock'
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from timeit import default_timer
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIRECTORY), 'UtilityClasses'))
+
+
+def setup_root(use_fake_root):
+    if not use_fake_root:
+        try:
+            import ROOT
+            ROOT.gROOT.SetBatch(True)
+            return 'ROOT %s' % ROOT.gROOT.GetVersion()
+        except ImportError:
+            pass
+
+    sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, 'fake_root'))
+    sys.modules.pop('ROOT', None)
+    import ROOT
+    return 'fake ROOT stand-in'
+
+
+class NullStream(object):
+    """
+    Swallows everything written to it, used to measure logging without the cost of the terminal.
+    """
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+class Benchmark(object):
+    """
+    A single benchmark case. setup is called before every repetition and not timed, its return value is passed to run,
+    whose execution time is measured. n_operations is the number of operations performed by one call of run.
+    """
+
+    def __init__(self, name, n_operations, run, setup=None):
+        self.name = name
+        self.n_operations = n_operations
+        self.run = run
+        self.setup = setup
+
+    def measure(self, repeat):
+        timings = []
+        for _ in range(repeat):
+            state = self.setup() if self.setup else None
+            start_time = default_timer()
+            self.run(state)
+            timings.append(default_timer() - start_time)
+
+        best = min(timings)
+        return {'seconds': best, 'mean_seconds': sum(timings) / len(timings), 'repeat': repeat,
+                'operations': self.n_operations, 'per_second': self.n_operations / best if best > 0 else None}
+
+
+def make_histogram(ROOT, name, n_bins, seed):
+    generator = random.Random(seed)
+    histogram = ROOT.TH1D(name, name, n_bins, 0., 10.)
+    histogram.Sumw2()
+    for i in range(1, n_bins + 1):
+        content = max(0., 100. + generator.gauss(0., 10.))
+        histogram.SetBinContent(i, content)
+        histogram.SetBinError(i, content ** 0.5)
+    return histogram
+
+
+def style_one_argument(histogram):
+    histogram.SetLineColor(2)
+    histogram.SetMarkerStyle(20)
+
+
+def style_two_arguments(histogram, name_in_legend):
+    histogram.SetLineColor(len(name_in_legend) % 9 + 1)
+    histogram.SetMarkerStyle(20)
+
+
+def add_histogram_benchmarks(settings):
+    import ROOT
+    from HistogramStyler import StyleTable
+    from RatioHistogram import RatioHistogram
+
+    n_histograms = settings['n_added_histograms']
+    histograms = [make_histogram(ROOT, 'added_%i' % i, 20, i) for i in range(n_histograms)]
+
+    for styler_name, styler in (('no_styler', None), ('styler_1_argument', style_one_argument),
+                                ('styler_2_arguments', style_two_arguments)):
+        def run(plotter, styler=styler):
+            for i, histogram in enumerate(histograms):
+                plotter.add_histogram(histogram, 'histogram %i' % i, styler)
+
+        yield Benchmark('add_histogram/%s' % styler_name, n_histograms, run,
+                        lambda: RatioHistogram(log_level='ERROR'))
+
+    def run_add_histograms(plotter):
+        plotter.add_histograms([(histogram, 'histogram %i' % i) for i, histogram in enumerate(histograms)],
+                               StyleTable(line_color=range(1, 10), marker_style=[20]))
+
+    yield Benchmark('add_histograms/style_table', n_histograms, run_add_histograms,
+                    lambda: RatioHistogram(log_level='ERROR'))
+
+
+def plot_benchmarks(settings):
+    import ROOT
+    from RatioHistogram import RatioHistogram
+
+    output_directory = settings['output_directory']
+    n_plots = settings['n_plots']
+
+    for n_histograms in settings['plot_histogram_counts']:
+        for n_bins in settings['plot_bin_counts']:
+            histograms = [make_histogram(ROOT, 'plot_%i_%i_%i' % (n_histograms, n_bins, i), n_bins, i)
+                          for i in range(n_histograms)]
+
+            def setup(histograms=histograms):
+                plotter = RatioHistogram(log_level='ERROR')
+                for i, histogram in enumerate(histograms):
+                    plotter.add_histogram(histogram, 'histogram %i' % i)
+                return plotter
+
+            def run_plot(plotter, n_histograms=n_histograms, n_bins=n_bins):
+                for i in range(n_plots):
+                    plotter.plot(os.path.join(output_directory, 'plot_%i_%i_%i' % (n_histograms, n_bins, i)))
+                plotter.flush()
+
+            yield Benchmark('plot/%i_histograms/%i_bins' % (n_histograms, n_bins), n_plots, run_plot, setup)
+
+            def run_plot_many(plotter, histograms=histograms, n_histograms=n_histograms, n_bins=n_bins):
+                jobs = [{'output_file_name': os.path.join(output_directory, 'many_%i_%i_%i' % (n_histograms, n_bins,
+                                                                                               i)),
+                         'histograms': [(histogram, 'histogram %i' % j) for j, histogram in enumerate(histograms)]}
+                        for i in range(n_plots)]
+                plotter.plot_many(jobs)
+
+            yield Benchmark('plot_many/%i_histograms/%i_bins' % (n_histograms, n_bins), n_plots, run_plot_many,
+                            lambda: RatioHistogram(log_level='ERROR'))
+
+
+def write_config_file(file_name, n_lines):
+    with open(file_name, 'w') as config_file:
+        config_file.write('# generated for the benchmarks\n')
+        for i in range(n_lines):
+            kind = i % 4
+            if kind == 0:
+                config_file.write('int_option_%i;%i;int\n' % (i, i))
+            elif kind == 1:
+                config_file.write('float_option_%i;%f;float\n' % (i, i * 0.5))
+            elif kind == 2:
+                config_file.write('string_option_%i;value %i\n' % (i, i))
+            else:
+                config_file.write('flag_option_%i\n' % i)
+
+
+def config_benchmarks(settings):
+    from OptionHandler import OptionHandler
+
+    for n_lines in settings['config_line_counts']:
+        file_name = os.path.join(settings['output_directory'], 'config_%i.cfg' % n_lines)
+        write_config_file(file_name, n_lines)
+        cache_directory = os.path.join(settings['output_directory'], 'config_cache_%i' % n_lines)
+
+        def new_handler():
+            return OptionHandler(None, 'ERROR')
+
+        yield Benchmark('config/parse_arguments_config_file/%i_lines' % n_lines, n_lines,
+                        lambda handler, file_name=file_name: handler.parse_arguments_config_file(file_name),
+                        new_handler)
+        yield Benchmark('config/load_config_file_uncached/%i_lines' % n_lines, n_lines,
+                        lambda handler, file_name=file_name: handler.load_config_file(file_name, use_cache=False),
+                        new_handler)
+
+        # fill the cache once, all timed runs then read from it
+        new_handler().load_config_file(file_name, cache_directory=cache_directory)
+        yield Benchmark('config/load_config_file_cached/%i_lines' % n_lines, n_lines,
+                        lambda handler, file_name=file_name, cache_directory=cache_directory:
+                        handler.load_config_file(file_name, cache_directory=cache_directory),
+                        new_handler)
+
+
+def option_benchmarks(settings):
+    from OptionHandler import OptionHandler
+    from OptionValidators import RangeRule
+
+    n_options = settings['n_options']
+
+    def is_positive(value):
+        return value >= 0
+
+    def setup_validated(validator):
+        handler = OptionHandler(None, 'ERROR')
+        for i in range(n_options):
+            handler.set_validator('option_%i' % i, validator)
+        return handler
+
+    def run_set_option(handler):
+        for i in range(n_options):
+            handler.set_option('option_%i' % i, i)
+
+    yield Benchmark('options/set_option/no_validator', n_options, run_set_option,
+                    lambda: OptionHandler(None, 'ERROR'))
+    yield Benchmark('options/set_option/function_validator', n_options, run_set_option,
+                    lambda: setup_validated(is_positive))
+    yield Benchmark('options/set_option/declarative_validator', n_options, run_set_option,
+                    lambda: setup_validated(RangeRule(0, None)))
+
+    def setup_filled(validator):
+        handler = setup_validated(validator)
+        run_set_option(handler)
+        return handler
+
+    def run_validate(handler):
+        # validate_all_options always prints the (empty) list of invalid options
+        stdout = sys.stdout
+        sys.stdout = NullStream()
+        try:
+            handler.validate_all_options()
+        finally:
+            sys.stdout = stdout
+
+    yield Benchmark('options/validate_all_options/function_validator', n_options, run_validate,
+                    lambda: setup_filled(is_positive))
+    yield Benchmark('options/validate_all_options/declarative_validator', n_options, run_validate,
+                    lambda: setup_filled(RangeRule(0, None)))
+
+
+def logging_benchmarks(settings):
+    from BufferedLogger import BufferedLogger
+    from LoggingClass import LoggingClass
+    from StructuredLogger import StructuredLogger
+
+    n_messages = settings['n_messages']
+
+    def run_print_log(logging_object):
+        for i in range(n_messages):
+            logging_object.print_log('Message number %i', 'INFO', args=(i,))
+
+    def run_print_log_console(logging_object):
+        # the default output goes through print, which is redirected for the duration of the benchmark
+        stdout = sys.stdout
+        sys.stdout = NullStream()
+        try:
+            run_print_log(logging_object)
+        finally:
+            sys.stdout = stdout
+
+    def run_buffered(logging_object):
+        run_print_log(logging_object)
+        logging_object.logger.flush()
+
+    yield Benchmark('logging/print_log/console', n_messages, run_print_log_console, lambda: LoggingClass())
+    yield Benchmark('logging/print_log/suppressed_by_level', n_messages, run_print_log,
+                    lambda: LoggingClass(log_level='ERROR'))
+    yield Benchmark('logging/print_log/buffered_logger', n_messages, run_buffered,
+                    lambda: LoggingClass(BufferedLogger(stream=NullStream())))
+    yield Benchmark('logging/print_log/structured_logger', n_messages, run_print_log,
+                    lambda: LoggingClass(StructuredLogger(stream=NullStream())))
+
+
+BENCHMARK_GROUPS = [add_histogram_benchmarks, plot_benchmarks, config_benchmarks, option_benchmarks,
+                    logging_benchmarks]
+
+
+def get_settings(quick, output_directory):
+    if quick:
+        return {'output_directory': output_directory, 'n_added_histograms': 200, 'n_plots': 5,
+                'plot_histogram_counts': [2, 5], 'plot_bin_counts': [50, 1000], 'config_line_counts': [10, 1000],
+                'n_options': 1000, 'n_messages': 10000}
+    return {'output_directory': output_directory, 'n_added_histograms': 2000, 'n_plots': 20,
+            'plot_histogram_counts': [2, 5, 20], 'plot_bin_counts': [50, 1000, 10000],
+            'config_line_counts': [10, 1000, 100000], 'n_options': 10000, 'n_messages': 100000}
+
+
+def run_benchmarks(settings, repeat, name_filter=None):
+    results = {}
+    for group in BENCHMARK_GROUPS:
+        for benchmark in group(settings):
+            if name_filter and name_filter not in benchmark.name:
+                continue
+            result = benchmark.measure(repeat)
+            results[benchmark.name] = result
+            print('%-60s %12.6f s %14.1f ops/s' % (benchmark.name, result['seconds'], result['per_second'] or 0.))
+            sys.stdout.flush()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of every benchmark relative to the baseline and returns the names of benchmarks which became
+    slower by more than threshold (a fraction).
+    """
+    regressions = []
+    print('')
+    print('%-60s %12s %12s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name in sorted(results):
+        if name not in baseline:
+            print('%-60s %12s %12.6f %8s' % (name, '-', results[name]['seconds'], 'new'))
+            continue
+        old = baseline[name]['seconds']
+        new = results[name]['seconds']
+        change = (new - old) / old if old > 0 else 0.
+        marker = ''
+        if change > threshold:
+            marker = '  slower'
+            regressions.append(name)
+        elif change < -threshold:
+            marker = '  faster'
+        print('%-60s %12.6f %12.6f %+7.1f%%%s' % (name, old, new, 100. * change, marker))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for pyUtilityClasses.')
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+    parser.add_argument('-c', '--compare', help='Compare the results to those stored in this JSON file.')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                        help='Relative slowdown reported as regression when comparing (default 0.1).')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions of each benchmark (default 3).')
+    parser.add_argument('-k', '--filter', help='Only run benchmarks whose name contains this string.')
+    parser.add_argument('--quick', action='store_true', help='Use smaller inputs.')
+    parser.add_argument('--fake-root', action='store_true', help='Use the ROOT stand-in even if ROOT is available.')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit with status 1 if a benchmark is slower than the baseline.')
+    args = parser.parse_args()
+
+    root_version = setup_root(args.fake_root)
+
+    output_directory = tempfile.mkdtemp(prefix='pyUtilityClasses_benchmarks_')
+    try:
+        results = run_benchmarks(get_settings(args.quick, output_directory), args.repeat, args.filter)
+    finally:
+        shutil.rmtree(output_directory, ignore_errors=True)
+
+    report = {'meta': {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                       'platform': platform.platform(), 'root': root_version, 'quick': args.quick,
+                       'repeat': args.repeat},
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
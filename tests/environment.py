@@ -0,0 +1,61 @@
+"""
+Makes UtilityClasses importable and replaces ROOT by the stand-in in benchmarks/fake_root, hence the tests run on
+machines without ROOT. Import it in every test module before anything from UtilityClasses.
+"""
+__author__ = 'Christopher Bock'
+
+import os
+import sys
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIRECTORY = os.path.dirname(TEST_DIRECTORY)
+
+for directory in (os.path.join(PACKAGE_DIRECTORY, 'UtilityClasses'),
+                  os.path.join(PACKAGE_DIRECTORY, 'benchmarks', 'fake_root')):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+sys.modules.pop('ROOT', None)
+
+
+class NullLogger(object):
+    """
+    Drops all messages, keeps the output of the tests readable.
+    """
+
+    def is_enabled(self, msg_type):
+        return False
+
+    def print_log(self, message, msg_type='INFO', suppress_timestamp=False):
+        pass
+
+
+NULL_LOGGER = NullLogger()
+
+
+class RecordingLogger(object):
+    """
+    Keeps all messages as (msg_type, message) tuples.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def print_log(self, message, msg_type='INFO', suppress_timestamp=False):
+        self.messages.append((msg_type, message))
+
+
+def make_histogram(ROOT, name, edges, values, weights=None):
+    """
+    Returns a TH1D with the given bin edges filled with values (and weights).
+    """
+    from array import array
+
+    histogram = ROOT.TH1D(name, name, len(edges) - 1, array('d', edges))
+    histogram.Sumw2()
+    if weights is None:
+        weights = [1.] * len(values)
+    for value, weight in zip(values, weights):
+        histogram.Fill(value, weight)
+
+    return histogram
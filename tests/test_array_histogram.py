@@ -0,0 +1,58 @@
+__author__ = 'Christopher Bock'
+
+import pickle
+import unittest
+
+from environment import make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+
+
+class ArrayHistogramTest(unittest.TestCase):
+    """
+    Conversion from and to ROOT histograms, rebinning and pickling.
+    """
+
+    def setUp(self):
+        self.histogram = make_histogram(ROOT, 'source', [0., 1., 2., 3., 4., 5.], [-1., 0.5, 1.5, 1.5, 2.5, 4.5, 9.],
+                                        [1., 1., 2., 1., 3., 1., 1.])
+        self.histogram.SetLineColor(3)
+        self.histogram.GetXaxis().SetTitle('x')
+        self.histogram.GetXaxis().SetRange(2, 4)
+
+    def test_round_trip(self):
+        array_histogram = ArrayHistogram.from_root(self.histogram)
+        self.assertEqual(array_histogram.GetNbinsX(), 5)
+        self.assertEqual(list(array_histogram.contents), [1., 1., 3., 3., 0., 1., 1.])
+        self.assertEqual(array_histogram.x_axis_attributes['Range'], (2, 4))
+
+        histogram = array_histogram.to_root()
+        self.assertEqual([histogram.GetBinContent(i) for i in range(7)], [1., 1., 3., 3., 0., 1., 1.])
+        self.assertAlmostEqual(histogram.GetBinError(2), 5. ** 0.5)
+        self.assertEqual(histogram.GetLineColor(), 3)
+        self.assertEqual(histogram.GetXaxis().GetTitle(), 'x')
+        self.assertEqual((histogram.GetXaxis().GetFirst(), histogram.GetXaxis().GetLast()), (2, 4))
+
+    def test_rebinned(self):
+        rebinned = ArrayHistogram.from_root(self.histogram).rebinned(2)
+        self.assertEqual(list(rebinned.edges), [0., 2., 4., 5.])
+        self.assertEqual(list(rebinned.contents), [1., 4., 3., 1., 1.])
+        self.assertAlmostEqual(rebinned.GetBinError(1), 6. ** 0.5)
+        # the bin range is converted into the range in x it covered
+        self.assertEqual(rebinned.x_axis_attributes['RangeUser'], (1., 4.))
+
+    def test_pickle(self):
+        array_histogram = ArrayHistogram.from_root(self.histogram)
+        copy = pickle.loads(pickle.dumps(array_histogram, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(list(copy.contents), list(array_histogram.contents))
+        self.assertEqual(copy.GetLineColor(), 3)
+        self.assertEqual(copy.x_title, 'x')
+
+    def test_invalid_arrays(self):
+        self.assertRaises(ValueError, ArrayHistogram, 'broken', [0.])
+        self.assertRaises(ValueError, ArrayHistogram, 'broken', [0., 1.], [1., 2.])
+
+
+if __name__ == '__main__':
+    unittest.main()
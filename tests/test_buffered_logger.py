@@ -0,0 +1,69 @@
+__author__ = 'Christopher Bock'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import environment
+
+from BufferedLogger import BufferedLogger
+from LoggingClass import LoggingClass
+
+
+class BufferedLoggerTest(unittest.TestCase):
+    """
+    Messages written in batches by the background thread, formatted like LoggingClass does.
+    """
+
+    def test_stream(self):
+        stream = StringIO()
+        logger = BufferedLogger(stream, level='INFO')
+        logging_class = LoggingClass(logger)
+
+        logging_class.print_log('Plotted %s', args=('ratio',))
+        logging_class.print_log('Dropped', 'DEBUG')
+        logging_class.print_log('Without timestamp', 'WARNING', True)
+        logger.flush()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith('-INFO: Plotted ratio'))
+        self.assertEqual(lines[1], 'WARNING: Without timestamp')
+
+        logger.close()
+        logging_class.print_log('After closing')
+        logger.flush()
+        self.assertEqual(len(stream.getvalue().splitlines()), 2)
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory, 'plots.log')
+            for message in ('first', 'second'):
+                logger = BufferedLogger(file_name=file_name)
+                logger.print_log(message, 'ERROR', True)
+                logger.close()
+
+            with open(file_name) as log_file:
+                self.assertEqual(log_file.read(), 'ERROR: first\nERROR: second\n')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_batches(self):
+        stream = StringIO()
+        logger = BufferedLogger(stream, max_batch_size=3)
+        for i in range(10):
+            logger.print_log('message %i' % i, suppress_timestamp=True)
+        logger.close()
+
+        self.assertEqual(stream.getvalue().splitlines(), ['INFO: message %i' % i for i in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
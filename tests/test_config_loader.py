@@ -0,0 +1,99 @@
+__author__ = 'Christopher Bock'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER
+
+from ConfigLoader import ConfigLoader
+
+
+class ConfigLoaderTest(unittest.TestCase):
+    """
+    Parsing of config files and the marshal cache of parsed files.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.directory, 'cache')
+        self.config_file = self.write('main.cfg', '# comment\n\n'
+                                                  'batch_mode\n'
+                                                  'output_file_type;png\n'
+                                                  'legend_n_columns; 2 ;int\n'
+                                                  'ratio_maximum;1.5;float\n'
+                                                  'draw_grid;off;bool\n'
+                                                  'legend_x_values;[0.6, 0.9];list\n'
+                                                  'colors;{"data": 1};dict\n'
+                                                  'include sub/included.cfg\n'
+                                                  'overall_text_scale;2.;float\n')
+        self.included_file = self.write(os.path.join('sub', 'included.cfg'), 'opt_stat;1;int\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        file_name = os.path.join(self.directory, name)
+        if not os.path.isdir(os.path.dirname(file_name)):
+            os.makedirs(os.path.dirname(file_name))
+        with open(file_name, 'w') as config_file:
+            config_file.write(text)
+        return file_name
+
+    def test_parse(self):
+        entries, dependencies = ConfigLoader(NULL_LOGGER, use_cache=False).parse(self.config_file)
+
+        self.assertEqual(entries, [('batch_mode', True), ('output_file_type', 'png'), ('legend_n_columns', 2),
+                                   ('ratio_maximum', 1.5), ('draw_grid', False), ('legend_x_values', [0.6, 0.9]),
+                                   ('colors', {'data': 1}), ('opt_stat', 1), ('overall_text_scale', 2.)])
+        self.assertEqual([dependency[0] for dependency in dependencies], [self.config_file, self.included_file])
+
+    def test_invalid_lines(self):
+        loader = ConfigLoader(NULL_LOGGER, use_cache=False)
+        for line in ('value;1.5;int', 'value;1;complex', 'value;maybe;bool', 'value;(1, 2);list',
+                     'value;__import__("os").getcwd();list'):
+            self.write('invalid.cfg', 'batch_mode\n' + line + '\n')
+            try:
+                loader.load(os.path.join(self.directory, 'invalid.cfg'))
+            except ValueError as exception:
+                self.assertTrue('invalid.cfg:2:' in str(exception), str(exception))
+            else:
+                self.fail('%s has been accepted' % line)
+
+    def test_recursive_include(self):
+        self.write('first.cfg', 'include second.cfg\n')
+        self.write('second.cfg', 'include first.cfg\n')
+        loader = ConfigLoader(NULL_LOGGER, use_cache=False)
+        self.assertRaises(ValueError, loader.load, os.path.join(self.directory, 'first.cfg'))
+
+    def test_cache(self):
+        entries = ConfigLoader(NULL_LOGGER, self.cache_directory).load(self.config_file)
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+
+        def parse(path_config_file):
+            self.fail('%s has been parsed again' % path_config_file)
+
+        cached_loader = ConfigLoader(NULL_LOGGER, self.cache_directory)
+        cached_loader.parse = parse
+        self.assertEqual(cached_loader.load(self.config_file), entries)
+
+    def test_cache_invalidated_by_include(self):
+        loader = ConfigLoader(NULL_LOGGER, self.cache_directory)
+        loader.load(self.config_file)
+
+        self.write(os.path.join('sub', 'included.cfg'), 'opt_stat;10;int\n')
+        self.assertEqual(loader.load(self.config_file)[-2], ('opt_stat', 10))
+
+    def test_corrupt_cache(self):
+        loader = ConfigLoader(NULL_LOGGER, self.cache_directory)
+        entries = loader.load(self.config_file)
+
+        for cache_file_name in os.listdir(self.cache_directory):
+            with open(os.path.join(self.cache_directory, cache_file_name), 'wb') as cache_file:
+                cache_file.write(b'\x00garbage')
+        self.assertEqual(loader.load(self.config_file), entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+__author__ = 'Christopher Bock'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER
+
+from OptionHandler import OptionHandler
+from OptionValidators import RangeRule
+
+
+class ConfigWatcherTest(unittest.TestCase):
+    """
+    Applying the options of a config file which changes while the options are in use.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, 'plots.cfg')
+        self.n_writes = 0
+        self.write('ratio_maximum;1.5;float\ndraw_legend;on;bool\n')
+
+        self.options = OptionHandler(NULL_LOGGER)
+        self.options.load_defaults({'ratio_maximum': 2., 'draw_legend': False, 'draw_grid': True})
+        self.options.set_validator('ratio_maximum', RangeRule(0., 10.))
+
+        self.changes = []
+        self.watcher = self.options.watch_config(self.config_file, self.changes.append, use_inotify=False)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, text, name='plots.cfg'):
+        file_name = os.path.join(self.directory, name)
+        with open(file_name, 'w') as config_file:
+            config_file.write(text)
+        # a later modification time for every write, even if the file system stores it in seconds only
+        self.n_writes += 1
+        os.utime(file_name, (1000000000 + self.n_writes, 1000000000 + self.n_writes))
+
+    def test_initial_load(self):
+        self.assertEqual((self.options['ratio_maximum'], self.options['draw_legend']), (1.5, True))
+        self.assertEqual(self.changes, [{'ratio_maximum': (2., 1.5), 'draw_legend': (False, True)}])
+        self.assertEqual(self.watcher.poll(), {})
+
+    def test_poll(self):
+        self.write('ratio_maximum;1.5;float\ndraw_legend;on;bool\ndraw_grid;off;bool\n')
+        self.assertEqual(self.watcher.poll(), {'draw_grid': (True, False)})
+        self.assertEqual(self.changes[-1], {'draw_grid': (True, False)})
+        self.assertEqual(self.watcher.poll(), {})
+
+        # options removed from the file get their previous value back
+        self.write('ratio_maximum;1.5;float\n')
+        self.assertEqual(self.watcher.poll(), {'draw_legend': (True, False), 'draw_grid': (False, True)})
+        self.assertEqual(len(self.changes), 3)
+
+    def test_type_change(self):
+        self.write('ratio_maximum;1.5;float\ndraw_legend;1;int\n')
+        self.assertEqual(self.watcher.poll(), {'draw_legend': (True, 1)})
+
+    def test_invalid_file(self):
+        self.write('ratio_maximum;1.5;int\n')
+        self.assertEqual(self.watcher.poll(), {})
+        self.assertEqual(self.options['ratio_maximum'], 1.5)
+
+        # rejected by the validator
+        self.write('ratio_maximum;20.;float\ndraw_legend;on;bool\n')
+        self.assertEqual(self.watcher.poll(), {})
+        self.assertEqual(self.options['ratio_maximum'], 1.5)
+
+        self.write('ratio_maximum;3.;float\ndraw_legend;on;bool\n')
+        self.assertEqual(self.watcher.poll(), {'ratio_maximum': (1.5, 3.)})
+
+    def test_included_file(self):
+        self.write('draw_grid;on;bool\n', 'included.cfg')
+        self.write('include included.cfg\n')
+        self.watcher.poll()
+        self.assertEqual(self.watcher.poll(), {})
+
+        self.write('draw_grid;off;bool\n', 'included.cfg')
+        self.assertEqual(self.watcher.poll(), {'draw_grid': (True, False)})
+
+
+if __name__ == '__main__':
+    unittest.main()
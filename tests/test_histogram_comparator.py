@@ -0,0 +1,107 @@
+__author__ = 'Christopher Bock'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from HistogramComparator import HistogramComparator, kolmogorov_probability
+from RatioHistogram import RatioHistogram
+
+
+class HistogramComparatorTest(unittest.TestCase):
+    """
+    Vectorised comparison of many pairs of histograms, plotting only those which disagree.
+    """
+
+    def setUp(self):
+        self.generator = random.Random(9)
+        self.edges = [0.5 * i for i in range(21)]
+        self.comparator = HistogramComparator(NULL_LOGGER)
+
+    def make_histogram(self, name, mean, n_entries=5000, weight=1.):
+        return make_histogram(ROOT, name, self.edges, [self.generator.gauss(mean, 2.) for i in range(n_entries)],
+                              [weight] * n_entries)
+
+    def test_kolmogorov_probability(self):
+        probabilities = kolmogorov_probability([0.1, 0.5, 1., 2.])
+        self.assertEqual(probabilities[0], 1.)
+        self.assertAlmostEqual(probabilities[1], 0.9639452436648751)
+        self.assertAlmostEqual(probabilities[2], 0.26999967167735456)
+        self.assertAlmostEqual(probabilities[3], 0.000670925255805695)
+
+    def test_compare(self):
+        self.comparator.add_comparison('same', [(self.make_histogram('reference', 5.), 'Reference'),
+                                                (self.make_histogram('candidate', 5.), 'Candidate')])
+        self.comparator.add_comparison('shifted', [(self.make_histogram('reference', 5.), 'Reference'),
+                                                   (self.make_histogram('candidate', 6.), 'Candidate')])
+        results = self.comparator.compare()
+
+        # failing pairs come first
+        self.assertEqual([result.output_file_name for result in results], ['shifted', 'same'])
+        shifted, same = results
+        self.assertEqual(sorted([shifted.numerator_name, shifted.denominator_name]), ['Candidate', 'Reference'])
+        self.assertFalse(shifted.passed)
+        self.assertTrue('chi2' in shifted.failed_tests and 'ks' in shifted.failed_tests)
+        self.assertTrue(same.passed)
+        self.assertEqual(same.failed_tests, ())
+        self.assertTrue(same.chi2_ndf < shifted.chi2_ndf)
+        self.assertTrue(same.ks_probability > shifted.ks_probability)
+
+    def test_chunks(self):
+        self.comparator.chunk_size = 2
+        for i in range(5):
+            self.comparator.add_comparison('plot_%i' % i, [(self.make_histogram('reference', 5.), 'Reference'),
+                                                           (self.make_histogram('candidate', 5. + i), 'Candidate')])
+        results = self.comparator.compare()
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[-1].output_file_name, 'plot_0')
+
+    def test_normalize(self):
+        histograms = [(self.make_histogram('reference', 5.), 'Reference'),
+                      (self.make_histogram('candidate', 5., weight=2.), 'Candidate')]
+        self.comparator.add_comparison('scaled', histograms)
+        self.assertFalse(self.comparator.compare()[0].passed)
+
+        self.comparator.normalize = True
+        self.assertTrue(self.comparator.compare()[0].passed)
+
+    def test_different_binning(self):
+        other = make_histogram(ROOT, 'other', [0., 1., 2.], [0.5, 1.5])
+        self.comparator.add_comparison('different', [(self.make_histogram('reference', 5.), 'Reference'),
+                                                     (other, 'Other')])
+        self.assertEqual(self.comparator.compare(), [])
+
+    def test_failed_jobs(self):
+        directory = tempfile.mkdtemp()
+        failing, passing = os.path.join(directory, 'failing'), os.path.join(directory, 'passing')
+        try:
+            self.comparator.add_comparison(failing, [(self.make_histogram('reference', 5.), 'A'),
+                                                     (self.make_histogram('same', 5.), 'B'),
+                                                     (self.make_histogram('shifted', 6.), 'C')],
+                                           sort_function=cmp, output_file_types='png')
+            self.comparator.add_comparison(passing, [(self.make_histogram('reference', 5.), 'A'),
+                                                     (self.make_histogram('same', 5.), 'B')])
+            results = self.comparator.compare()
+
+            # only the failing pair of the first comparison is drawn, the histograms being sorted by name
+            jobs = self.comparator.get_failed_jobs(results)
+            self.assertEqual([job['output_file_name'] for job in jobs], [failing])
+            self.assertEqual(jobs[0]['ratio_map'], {2: 0})
+            self.assertEqual(jobs[0]['output_file_types'], 'png')
+
+            plot_results = self.comparator.plot_failed(RatioHistogram(NULL_LOGGER), results)
+            self.assertEqual([plot_result.success for plot_result in plot_results], [True])
+            self.assertTrue(os.path.exists(failing + '.png'))
+            self.assertFalse(os.path.exists(passing + '.png'))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+__author__ = 'Christopher Bock'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from environment import make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+from HistogramStore import open_histogram_store, write_histogram_store
+
+
+class HistogramStoreTest(unittest.TestCase):
+    """
+    Writing histograms into a store and reading them back, including closing stores with histograms still in use.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'references.hist')
+
+        self.root_histogram = make_histogram(ROOT, 'reference', [0., 1., 2., 4., 8.], [0.5, 1.5, 1.7, 3., 5., 9., -1.])
+        self.root_histogram.SetTitle('Reference')
+        self.root_histogram.SetLineColor(4)
+        self.root_histogram.SetMaximum(12.)
+        self.root_histogram.GetXaxis().SetTitle('p_{T} [GeV]')
+        self.root_histogram.GetXaxis().SetTitleOffset(1.3)
+        self.root_histogram.GetXaxis().SetRange(2, 3)
+
+        self.array_histogram = ArrayHistogram('array', [0., 1., 3.], [1., 2., 3., 4.], [1., 1.5, 2., 2.5], 'Array')
+
+        write_histogram_store(self.file_name, [self.root_histogram, ('stored_array', self.array_histogram)])
+
+    def tearDown(self):
+        store = open_histogram_store(self.file_name)
+        store.close()
+        shutil.rmtree(self.directory)
+
+    def test_names(self):
+        store = open_histogram_store(self.file_name)
+
+        self.assertEqual(store.names(), ['reference', 'stored_array'])
+        self.assertTrue('reference' in store)
+        self.assertEqual(len(store), 2)
+        self.assertTrue(store is open_histogram_store(self.file_name))
+        self.assertRaises(KeyError, store.get_histogram, 'missing')
+
+    def test_root_histogram(self):
+        histogram = open_histogram_store(self.file_name).get_histogram('reference')
+
+        self.assertEqual(histogram.GetNbinsX(), 4)
+        for i in range(6):
+            self.assertEqual(histogram.GetBinContent(i), self.root_histogram.GetBinContent(i))
+            self.assertAlmostEqual(histogram.GetBinError(i), self.root_histogram.GetBinError(i), places=12)
+        self.assertEqual(list(histogram.edges), [0., 1., 2., 4., 8.])
+        self.assertEqual(histogram.GetTitle(), 'Reference')
+        self.assertEqual(histogram.GetLineColor(), 4)
+        self.assertEqual(histogram.maximum, 12.)
+
+        converted = histogram.to_root(ROOT)
+        self.assertEqual(converted.GetXaxis().GetTitle(), 'p_{T} [GeV]')
+        self.assertEqual(converted.GetXaxis().GetTitleOffset(), 1.3)
+        self.assertEqual((converted.GetXaxis().GetFirst(), converted.GetXaxis().GetLast()), (2, 3))
+
+    def test_array_histogram(self):
+        histogram = open_histogram_store(self.file_name).get_histogram('stored_array')
+
+        self.assertEqual(histogram.GetName(), 'stored_array')
+        self.assertEqual(list(histogram.contents), [1., 2., 3., 4.])
+        self.assertEqual(list(histogram.errors), [1., 1.5, 2., 2.5])
+        self.assertFalse(histogram.contents.flags.writeable)
+        # no axis attributes have been set on the histogram which has been stored
+        self.assertEqual((histogram.x_axis_attributes, histogram.y_axis_attributes), (None, None))
+
+        # Scale replaces the read-only arrays instead of modifying the store
+        histogram.Scale(2.)
+        self.assertEqual(histogram.GetBinContent(1), 4.)
+        self.assertEqual(open_histogram_store(self.file_name).get_histogram('stored_array').GetBinContent(1), 2.)
+
+    def test_close(self):
+        store = open_histogram_store(self.file_name)
+        histogram = store.get_histogram('reference')
+        store.close()
+
+        # histograms obtained before closing the store stay usable
+        self.assertEqual(histogram.GetBinContent(2), self.root_histogram.GetBinContent(2))
+        self.assertRaises(ValueError, store.get_histogram, 'reference')
+
+        reopened = open_histogram_store(self.file_name)
+        self.assertFalse(reopened is store)
+        self.assertEqual(list(reopened.get_histogram('reference').contents), list(histogram.contents))
+
+    def test_rewritten_file(self):
+        store = open_histogram_store(self.file_name)
+        write_histogram_store(self.file_name, {'other': self.array_histogram})
+        # the size of the file changed, hence a new store is opened
+        self.assertEqual(open_histogram_store(self.file_name).names(), ['other'])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
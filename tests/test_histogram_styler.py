@@ -0,0 +1,77 @@
+__author__ = 'Christopher Bock'
+
+import functools
+import unittest
+
+import environment
+
+from ArrayHistogram import ArrayHistogram
+from HistogramStyler import HistogramStyle, StyleTable, apply_histogram_styler, styler_takes_name
+
+
+def color_only(histogram):
+    histogram.SetLineColor(2)
+
+
+def color_and_name(histogram, name_in_legend):
+    histogram.SetTitle(name_in_legend)
+
+
+class Styler(object):
+    def __init__(self, color):
+        self.color = color
+
+    def __call__(self, histogram, name_in_legend):
+        histogram.SetLineColor(self.color)
+
+    def style(self, histogram):
+        histogram.SetLineColor(self.color)
+
+
+class HistogramStylerTest(unittest.TestCase):
+    """
+    Styling functions are called with the name in the legend only if they accept it.
+    """
+
+    def test_takes_name(self):
+        styler = Styler(3)
+        self.assertFalse(styler_takes_name(color_only))
+        self.assertTrue(styler_takes_name(color_and_name))
+        self.assertTrue(styler_takes_name(lambda *arguments: None))
+        self.assertTrue(styler_takes_name(styler))
+        self.assertFalse(styler_takes_name(styler.style))
+        self.assertFalse(styler_takes_name(functools.partial(color_and_name, name_in_legend='fixed')))
+        self.assertTrue(styler_takes_name(HistogramStyle(line_color=2)))
+        # builtins take only the histogram, unless their signature says otherwise
+        self.assertFalse(styler_takes_name(len))
+
+    def test_apply(self):
+        histogram = ArrayHistogram('histogram', [0., 1.])
+        apply_histogram_styler(color_only, histogram, 'Data')
+        apply_histogram_styler(color_and_name, histogram, 'Data')
+        self.assertEqual((histogram.GetLineColor(), histogram.GetTitle()), (2, 'Data'))
+
+        apply_histogram_styler(Styler(5).style, histogram, 'Data')
+        self.assertEqual(histogram.GetLineColor(), 5)
+
+    def test_style(self):
+        histogram = ArrayHistogram('histogram', [0., 1.])
+        HistogramStyle(line_color=4, marker_style=20)(histogram)
+        self.assertEqual((histogram.GetLineColor(), histogram.GetMarkerStyle()), (4, 20))
+        self.assertRaises(AttributeError, HistogramStyle, colour=4)
+
+    def test_style_table(self):
+        table = StyleTable({'Data': {'marker_style': 20}}, default={'line_width': 2}, line_color=[2, 4])
+        histograms = [ArrayHistogram(name, [0., 1.]) for name in ('a', 'b', 'c', 'Data')]
+        table.apply([(histogram, histogram.GetName()) for histogram in histograms])
+
+        self.assertEqual([histogram.GetLineColor() for histogram in histograms], [2, 4, 2, 1])
+        self.assertEqual([histogram.GetLineWidth() for histogram in histograms], [2, 2, 2, 1])
+        self.assertEqual(histograms[3].GetMarkerStyle(), 20)
+        # a name keeps its style
+        self.assertTrue(table.get_style('b') is table.get_style('b'))
+        self.assertEqual(table.get_style('b').attributes['line_color'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+__author__ = 'Christopher Bock'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+from RatioHistogram import RatioHistogram, RatioPlotLayout
+
+
+class LevelOfDetailTest(unittest.TestCase):
+    """
+    Merging neighbouring bins before drawing histograms with more bins than pixels.
+    """
+
+    def setUp(self):
+        generator = random.Random(8)
+        edges = [0.01 * i for i in range(1001)]
+        self.reference = make_histogram(ROOT, 'reference', edges, [generator.uniform(0., 10.) for i in range(2000)])
+        self.candidate = ArrayHistogram.from_root(
+            make_histogram(ROOT, 'candidate', edges, [generator.uniform(0., 10.) for i in range(2000)]))
+
+        self.ratio_histogram = RatioHistogram(NULL_LOGGER)
+        self.ratio_histogram.add_histogram(self.reference, 'reference')
+        self.ratio_histogram.add_histogram(self.candidate, 'candidate')
+
+    def get_draw_histograms(self, **options):
+        return self.ratio_histogram._get_draw_histograms(self.ratio_histogram.options.scope(**options).freeze(), True)
+
+    def test_disabled(self):
+        self.assertTrue(self.get_draw_histograms() is self.ratio_histogram.histograms)
+        self.assertTrue(self.get_draw_histograms(lod_rebinning=True, lod_target_bins=1000)
+                        is self.ratio_histogram.histograms)
+
+    def test_target_bins(self):
+        draw_histograms = self.get_draw_histograms(lod_rebinning=True, lod_target_bins=300)
+        # every 4 bins are merged
+        self.assertEqual([draw_histograms[name].GetNbinsX() for name in ('reference', 'candidate')], [250, 250])
+        self.assertTrue(isinstance(draw_histograms['candidate'], ArrayHistogram))
+        self.assertEqual(draw_histograms['reference'].GetName(), 'reference_lod')
+
+        for name, histogram in (('reference', self.reference), ('candidate', self.candidate)):
+            draw_histogram = draw_histograms[name]
+            self.assertAlmostEqual(draw_histogram.GetBinContent(1),
+                                   sum(histogram.GetBinContent(i) for i in range(1, 5)))
+            self.assertAlmostEqual(draw_histogram.GetBinError(2) ** 2,
+                                   sum(histogram.GetBinError(i) ** 2 for i in range(5, 9)))
+            self.assertAlmostEqual(draw_histogram.GetXaxis().GetBinUpEdge(1), 0.04)
+
+        # the histograms that have been added are left alone
+        self.assertEqual((self.reference.GetNbinsX(), self.candidate.GetNbinsX()), (1000, 1000))
+
+    def test_frame_width(self):
+        draw_histograms = self.get_draw_histograms(lod_rebinning=True)
+        n_group = -(-1000 // RatioPlotLayout.get_frame_width(True))
+        self.assertEqual(draw_histograms['reference'].GetNbinsX(), -(-1000 // n_group))
+
+    def test_range_kept(self):
+        self.reference.GetXaxis().SetRangeUser(2., 4.)
+        self.candidate.GetXaxis().SetRangeUser(2., 4.)
+        draw_histograms = self.get_draw_histograms(lod_rebinning=True, lod_target_bins=100)
+
+        for histogram in draw_histograms.values():
+            x_axis = histogram.GetXaxis()
+            self.assertAlmostEqual(x_axis.GetBinLowEdge(x_axis.GetFirst()), 2.)
+            self.assertAlmostEqual(x_axis.GetBinUpEdge(x_axis.GetLast()), 4.)
+
+    def test_plot(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.ratio_histogram.options['lod_rebinning'] = True
+            self.assertTrue(self.ratio_histogram.plot(os.path.join(directory, 'plot')))
+            self.assertTrue(os.path.exists(os.path.join(directory, 'plot.pdf')))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+__author__ = 'Christopher Bock'
+
+import unittest
+
+from environment import RecordingLogger
+
+from LoggingClass import LoggingClass
+
+
+class LoggingClassTest(unittest.TestCase):
+    """
+    Level threshold and deferred formatting of log messages.
+    """
+
+    def test_level(self):
+        logger = RecordingLogger()
+        logging_class = LoggingClass(logger, 'WARNING')
+
+        logging_class.print_log('Dropped')
+        logging_class.print_log('Kept %i', 'ERROR', args=(1,))
+        self.assertEqual(logger.messages, [('ERROR', 'Kept 1')])
+
+        logging_class.set_log_level('DEBUG')
+        self.assertTrue(logging_class.is_enabled('DEBUG'))
+
+    def test_deferred_formatting(self):
+        calls = []
+
+        def summary():
+            calls.append(True)
+            return 'summary'
+
+        logger = RecordingLogger()
+        logging_class = LoggingClass(logger, 'INFO')
+        logging_class.print_log(summary, 'DEBUG')
+        # the arguments of dropped messages are never formatted
+        logging_class.print_log('%s', 'DEBUG', args=(None, 'too many arguments'))
+        self.assertEqual(calls, [])
+
+        logging_class.print_log(summary)
+        self.assertEqual(calls, [True])
+        self.assertEqual(logger.messages, [('INFO', 'summary')])
+
+    def test_logger_is_enabled(self):
+        class QuietLogger(RecordingLogger):
+            def is_enabled(self, msg_type):
+                return msg_type == 'ERROR'
+
+        logger = QuietLogger()
+        logging_class = LoggingClass(logger)
+        logging_class.print_log('Dropped by the logger')
+        logging_class.print_log('Kept', 'ERROR')
+        self.assertEqual(logger.messages, [('ERROR', 'Kept')])
+
+
+if __name__ == '__main__':
+    unittest.main()
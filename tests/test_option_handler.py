@@ -0,0 +1,125 @@
+__author__ = 'Christopher Bock'
+
+import threading
+import unittest
+
+from environment import NULL_LOGGER
+
+from OptionHandler import FrozenOptions, OptionHandler
+from OptionValidators import RangeRule
+
+
+class FrozenOptionsTest(unittest.TestCase):
+    """
+    Read-only snapshots of the options, cached until an option is set.
+    """
+
+    def setUp(self):
+        self.handler = OptionHandler(NULL_LOGGER)
+        self.handler.load_defaults({'ratio_maximum': 2., 'draw_legend': True, 'not an identifier': 1, 'keys': 'x'})
+
+    def test_snapshot(self):
+        frozen = self.handler.freeze()
+        self.assertEqual(frozen.ratio_maximum, 2.)
+        self.assertEqual(frozen['not an identifier'], 1)
+        # names clashing with methods are only available via []
+        self.assertEqual(frozen['keys'], 'x')
+        self.assertTrue('draw_legend' in frozen)
+        self.assertRaises(AttributeError, setattr, frozen, 'ratio_maximum', 3.)
+        self.assertRaises(KeyError, frozen.__getitem__, 'missing')
+
+    def test_cached_until_set(self):
+        frozen = self.handler.freeze()
+        self.assertTrue(self.handler.freeze() is frozen)
+
+        self.handler['ratio_maximum'] = 3.
+        self.assertEqual(frozen.ratio_maximum, 2.)
+        self.assertEqual(self.handler.freeze().ratio_maximum, 3.)
+        self.assertTrue(type(self.handler.freeze()) is type(frozen))
+
+    def test_derive(self):
+        frozen = self.handler.freeze()
+        derived = frozen.derive({'ratio_maximum': 5.})
+        self.assertEqual((derived.ratio_maximum, frozen.ratio_maximum), (5., 2.))
+        self.assertTrue(type(derived) is type(frozen))
+
+        extended = frozen.derive({'new_option': 1})
+        self.assertEqual(extended.new_option, 1)
+        self.assertFalse(type(extended) is type(frozen))
+
+    def test_bounded_classes(self):
+        for i in range(FrozenOptions.max_classes + 10):
+            FrozenOptions.create({'option_%i' % i: i})
+        self.assertEqual(len(FrozenOptions._classes), FrozenOptions.max_classes)
+
+        # the snapshot of the handler is still usable once its class has been dropped from the cache
+        self.handler['ratio_maximum'] = 4.
+        self.assertEqual(self.handler.freeze().ratio_maximum, 4.)
+
+
+class OptionScopeTest(unittest.TestCase):
+    """
+    Overlays of the options which leave the handler untouched, active for the thread entering them.
+    """
+
+    def setUp(self):
+        self.handler = OptionHandler(NULL_LOGGER)
+        self.handler.load_defaults({'ratio_maximum': 2., 'draw_legend': True})
+        self.handler.set_validator('ratio_maximum', RangeRule(0., 10.))
+
+    def test_overrides(self):
+        scope = self.handler.scope(ratio_maximum=3.)
+        self.assertEqual((scope['ratio_maximum'], scope['draw_legend']), (3., True))
+        self.assertEqual(self.handler['ratio_maximum'], 2.)
+
+        # invalid values are not taken over
+        self.assertFalse(scope.set_option('ratio_maximum', 20.))
+        self.assertEqual(scope['ratio_maximum'], 3.)
+
+        # options of the parent are read through until overridden
+        self.handler['draw_legend'] = False
+        self.assertEqual(scope.freeze().draw_legend, False)
+        frozen = scope.freeze()
+        self.assertTrue(scope.freeze() is frozen)
+        scope['draw_legend'] = True
+        self.assertEqual((scope.freeze().draw_legend, self.handler['draw_legend']), (True, False))
+
+    def test_nesting(self):
+        with self.handler.scope(ratio_maximum=3.):
+            self.assertEqual(self.handler['ratio_maximum'], 3.)
+            with self.handler.scope(draw_legend=False) as inner:
+                self.assertEqual((self.handler['ratio_maximum'], self.handler['draw_legend']), (2., False))
+                with inner.scope(ratio_maximum=4.):
+                    self.assertEqual(self.handler.freeze().ratio_maximum, 4.)
+                    self.assertEqual(self.handler['draw_legend'], False)
+            self.assertEqual((self.handler['ratio_maximum'], self.handler['draw_legend']), (3., True))
+        self.assertEqual(self.handler.freeze().ratio_maximum, 2.)
+
+    def test_threads(self):
+        both_entered = threading.Event()
+        n_entered = []
+        results = {}
+
+        def plot(ratio_maximum):
+            with self.handler.scope(ratio_maximum=ratio_maximum):
+                n_entered.append(ratio_maximum)
+                if len(n_entered) == 2:
+                    both_entered.set()
+                both_entered.wait(5.)
+                results[ratio_maximum] = self.handler['ratio_maximum']
+
+        threads = [threading.Thread(target=plot, args=(ratio_maximum,)) for ratio_maximum in (3., 4.)]
+        with self.handler.scope(ratio_maximum=5.):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(self.handler['ratio_maximum'], 5.)
+
+        self.assertTrue(both_entered.is_set())
+        self.assertEqual(results, {3.: 3., 4.: 4.})
+        self.assertEqual(self.handler['ratio_maximum'], 2.)
+
+
+if __name__ == '__main__':
+    unittest.main()
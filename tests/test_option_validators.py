@@ -0,0 +1,79 @@
+__author__ = 'Christopher Bock'
+
+import unittest
+
+from environment import NULL_LOGGER
+
+from OptionHandler import OptionHandler
+from OptionValidators import AllOf, EnumRule, RangeRule, RegexRule, TypeRule, ValidationPlan
+
+
+class OptionRuleTest(unittest.TestCase):
+    """
+    Declarative validators, called like plain validator functions.
+    """
+
+    def test_rules(self):
+        self.assertTrue(TypeRule(int, float)(1.5))
+        self.assertFalse(TypeRule(int, float)('1.5'))
+        self.assertTrue(RangeRule(0., None)(3.))
+        self.assertFalse(RangeRule(0., 1.)(3.))
+        self.assertFalse(RangeRule(0., 1.)('a string'))
+        self.assertTrue(EnumRule('pdf', 'png')('png'))
+        self.assertFalse(EnumRule('pdf', 'png')(['pdf']))
+        self.assertTrue(EnumRule([1], [2])([2]))
+        self.assertTrue(RegexRule(r'\d+$')('42'))
+        self.assertFalse(RegexRule(r'\d+$')(42))
+
+    def test_all_of(self):
+        rule = AllOf(TypeRule(float), RangeRule(0., 1.))
+        self.assertTrue(rule(0.5))
+        self.assertFalse(rule(1))
+        self.assertEqual(rule.compile()(2.), 'expected a value in [0.0, 1.0]')
+
+
+class ValidationPlanTest(unittest.TestCase):
+    """
+    Validation of many options at once, returning a report instead of a boolean.
+    """
+
+    def test_report(self):
+        plan = ValidationPlan({'ratio_maximum': RangeRule(0., None), 'output_file_type': lambda value: value == 'pdf'})
+        report = plan.validate({'ratio_maximum': -1., 'output_file_type': 'png', 'draw_legend': True}, profile=True)
+
+        self.assertFalse(report)
+        self.assertEqual(report.n_checked, 2)
+        self.assertEqual(sorted(report.invalid_options()), ['output_file_type', 'ratio_maximum'])
+        self.assertEqual(report.missing_validators, ['draw_legend'])
+        self.assertEqual(sorted(report.timings), ['output_file_type', 'ratio_maximum'])
+
+        self.assertTrue(plan.validate({'ratio_maximum': 1., 'output_file_type': 'png'}, ['ratio_maximum']))
+
+    def test_deferred_validation(self):
+        handler = OptionHandler(NULL_LOGGER)
+        handler.set_validator('ratio_maximum', RangeRule(0., None))
+        handler.set_validator('output_file_type', EnumRule('pdf', 'png'))
+        handler['deferValidation'] = True
+
+        self.assertTrue(handler.set_option('ratio_maximum', -1.))
+        self.assertTrue(handler.set_option('output_file_type', 'pdf'))
+        report = handler.validate_pending_options()
+        self.assertEqual(report.invalid_options(), ['ratio_maximum'])
+
+        # pending options are only validated once
+        self.assertTrue(handler.validate_pending_options())
+        self.assertFalse(handler.validate_all_options())
+
+    def test_plan_rebuilt(self):
+        handler = OptionHandler(NULL_LOGGER)
+        handler.set_validator('ratio_maximum', RangeRule(0., None))
+        plan = handler.get_validation_plan()
+        self.assertTrue(handler.get_validation_plan() is plan)
+
+        handler.set_validator('output_file_type', EnumRule('pdf', 'png'))
+        self.assertFalse(handler.get_validation_plan() is plan)
+        self.assertEqual(sorted(handler.get_validation_plan().checks), ['output_file_type', 'ratio_maximum'])
+
+
+if __name__ == '__main__':
+    unittest.main()
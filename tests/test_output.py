@@ -0,0 +1,98 @@
+__author__ = 'Christopher Bock'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from RatioHistogram import RatioHistogram
+
+
+class OutputTest(unittest.TestCase):
+    """
+    Output in several formats, written in the background and into the shared ROOT file, finished by flush().
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root_file_name = os.path.join(self.directory, 'plots.root')
+
+        generator = random.Random(7)
+        edges = [0.5 * i for i in range(21)]
+        self.ratio_histogram = RatioHistogram(NULL_LOGGER)
+        self.ratio_histogram.options['root_output_file'] = self.root_file_name
+        for name in ('reference', 'candidate'):
+            self.ratio_histogram.add_histogram(
+                make_histogram(ROOT, name, edges, [generator.gauss(5., 2.) for i in range(200)]), name)
+
+    def tearDown(self):
+        self.ratio_histogram.close()
+        ROOT._files.pop(self.root_file_name, None)
+        shutil.rmtree(self.directory)
+
+    def output(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_file_types(self):
+        self.assertTrue(self.ratio_histogram.plot(self.output('option')))
+        self.assertTrue(self.ratio_histogram.plot(self.output('list'), output_file_types=['pdf', 'png']))
+        self.assertTrue(self.ratio_histogram.plot(self.output('string'), output_file_types='png, eps'))
+
+        for file_name in ('option.pdf', 'list.pdf', 'list.png', 'string.png', 'string.eps'):
+            self.assertTrue(os.path.exists(self.output(file_name)))
+        self.assertFalse(os.path.exists(self.output('string.pdf')))
+
+    def test_background_output(self):
+        self.ratio_histogram.options['background_output'] = True
+        for name in ('first', 'second'):
+            self.assertTrue(self.ratio_histogram.plot(self.output(name), output_file_types='pdf,png'))
+
+        self.assertEqual(self.ratio_histogram.flush(), {})
+        for file_name in ('first.pdf', 'first.png', 'second.pdf', 'second.png'):
+            self.assertTrue(os.path.exists(self.output(file_name)))
+        self.assertEqual(os.listdir(self.ratio_histogram.output_writer.temporary_directory), [])
+
+    def test_failed_background_output(self):
+        self.ratio_histogram.options['background_output'] = True
+        # the directory of the output can not be created as a file of that name exists
+        with open(os.path.join(self.directory, 'blocked'), 'w'):
+            pass
+        blocked_output = os.path.join(self.directory, 'blocked', 'plot')
+
+        self.assertTrue(self.ratio_histogram.plot(blocked_output))
+        self.assertEqual(list(self.ratio_histogram.flush()), [blocked_output])
+
+        results = self.ratio_histogram.plot_many([
+            {'output_file_name': blocked_output, 'histograms': dict(self.ratio_histogram.histograms)},
+            {'output_file_name': self.output('fine'), 'histograms': dict(self.ratio_histogram.histograms)},
+        ])
+        self.assertEqual([result.success for result in results], [False, True])
+        self.assertTrue(results[0].error)
+
+    def test_root_file_kept_open(self):
+        self.ratio_histogram.options['safe_to_root_file'] = True
+        open_count = ROOT.open_count[0]
+        self.ratio_histogram.plot(self.output('first'))
+        self.ratio_histogram.plot(self.output('second'))
+
+        root_file = ROOT._files[self.root_file_name]
+        self.assertEqual(ROOT.open_count[0], open_count + 1)
+        self.assertTrue(root_file.IsOpen())
+        self.assertEqual(sorted(root_file.GetListOfKeys()), ['first', 'second'])
+
+        # changing the file closes the previous one
+        other_file_name = os.path.join(self.directory, 'other.root')
+        self.ratio_histogram.options['root_output_file'] = other_file_name
+        self.ratio_histogram.plot(self.output('third'))
+        self.assertFalse(root_file.IsOpen())
+
+        self.ratio_histogram.flush()
+        self.assertFalse(ROOT._files.pop(other_file_name).IsOpen())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+__author__ = 'Christopher Bock'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+from ParallelPlotter import ParallelPlotter
+
+
+class ParallelPlotterTest(unittest.TestCase):
+    """
+    Plots rendered by the worker processes, using the fake ROOT inherited from this process.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        generator = random.Random(5)
+        edges = [0.5 * i for i in range(21)]
+        self.histograms = [make_histogram(ROOT, 'h%i' % i, edges, [generator.gauss(5., 2.) for j in range(200)])
+                           for i in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def output(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_run(self):
+        plotter = ParallelPlotter(NULL_LOGGER, n_processes=2, chunk_size=1)
+        plotter.add_plot(self.output('list'), [(self.histograms[0], 'A'), (self.histograms[1], 'B')])
+        plotter.add_plot(self.output('dict'), {'A': self.histograms[0], 'C': self.histograms[2]}, log_scale=True)
+        plotter.add_plot(self.output('styled'), [(self.histograms[1], 'B', lambda histogram: histogram.SetLineColor(2)),
+                                                 (self.histograms[2], 'C')])
+
+        # styling functions are applied right away, only arrays are sent to the workers
+        styled_histograms = plotter.plots[2][1]
+        self.assertTrue(isinstance(styled_histograms[0][0], ArrayHistogram))
+        self.assertEqual(styled_histograms[0][0].GetLineColor(), 2)
+
+        results = plotter.run()
+
+        self.assertEqual([result.output_file_name for result in results],
+                         [self.output('list'), self.output('dict'), self.output('styled')])
+        self.assertTrue(all([result.success for result in results]))
+        for result in results:
+            self.assertTrue(os.path.exists(result.output_file_name + '.pdf'))
+        self.assertEqual(plotter.plots, [])
+
+    def test_failing_plot(self):
+        plotter = ParallelPlotter(NULL_LOGGER, n_processes=1)
+        plotter.add_plot(self.output('broken'), [(self.histograms[0], 'A'), (self.histograms[1], 'B')],
+                         unknown_argument=True)
+        plotter.add_plot(self.output('fine'), [(self.histograms[0], 'A'), (self.histograms[1], 'B')])
+
+        results = plotter.run()
+
+        self.assertEqual([result.success for result in results], [False, True])
+        self.assertTrue('unknown_argument' in results[0].error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+__author__ = 'Christopher Bock'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, RecordingLogger, make_histogram
+
+import ROOT
+from PlotInstrumentation import PlotInstrumentation, PlotTimer
+from RatioHistogram import RatioHistogram
+
+
+class RecordingInstrumentation(PlotInstrumentation):
+    def __init__(self):
+        self.calls = []
+
+    def plot_started(self, output_file_name):
+        self.calls.append(('plot_started', output_file_name))
+
+    def plot_finished(self, output_file_name, success):
+        self.calls.append(('plot_finished', output_file_name, success))
+
+
+class PlotInstrumentationTest(unittest.TestCase):
+    """
+    Hooks called by RatioHistogram around every plot.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_file_name = os.path.join(self.directory, 'plot')
+
+        generator = random.Random(6)
+        edges = [0.5 * i for i in range(21)]
+        self.ratio_histogram = RatioHistogram(NULL_LOGGER)
+        for name in ('reference', 'candidate'):
+            self.ratio_histogram.add_histogram(
+                make_histogram(ROOT, name, edges, [generator.gauss(5., 2.) for i in range(200)]), name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_timer(self):
+        logger = RecordingLogger()
+        timer = PlotTimer(logger)
+        self.ratio_histogram.instrumentation = timer
+
+        self.assertTrue(self.ratio_histogram.plot(self.output_file_name))
+        self.assertEqual(timer.n_plots, 1)
+        for phase in ('layout', 'range', 'ratios', 'draw', 'output', 'total'):
+            self.assertTrue(phase in timer.phases)
+        self.assertEqual(timer.counters['layouts_created'], 1)
+
+        timer.print_summary()
+        self.assertEqual(timer.n_plots, 0)
+        self.assertEqual([message[0] for message in logger.messages], ['DEBUG', 'INFO'])
+
+    def test_failing_plot(self):
+        instrumentation = RecordingInstrumentation()
+        self.ratio_histogram.instrumentation = instrumentation
+
+        def sort_function(first, second):
+            raise RuntimeError('broken sort function')
+
+        self.assertRaises(RuntimeError, self.ratio_histogram.plot, self.output_file_name, sort_function=sort_function)
+        self.assertEqual(instrumentation.calls, [('plot_started', self.output_file_name),
+                                                 ('plot_finished', self.output_file_name, False)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+__author__ = 'Christopher Bock'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from RatioHistogram import RatioHistogram
+
+
+class PlotManyTest(unittest.TestCase):
+    """
+    Batch rendering reusing one canvas layout for all plots.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root_file_name = os.path.join(self.directory, 'plots.root')
+
+        generator = random.Random(4)
+        edges = [0.5 * i for i in range(21)]
+        self.histograms = [make_histogram(ROOT, 'h%i' % i, edges, [generator.gauss(5., 2.) for j in range(200)])
+                           for i in range(3)]
+
+        self.ratio_histogram = RatioHistogram(NULL_LOGGER)
+        self.ratio_histogram.options['root_output_file'] = self.root_file_name
+
+    def tearDown(self):
+        ROOT._files.pop(self.root_file_name, None)
+        shutil.rmtree(self.directory)
+
+    def output(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_jobs(self):
+        registered = make_histogram(ROOT, 'registered', [0., 1.], [0.5])
+        self.ratio_histogram.add_histogram(registered, 'Registered')
+
+        results = self.ratio_histogram.plot_many([
+            {'output_file_name': self.output('list'), 'histograms': [(self.histograms[0], 'A'),
+                                                                     (self.histograms[1], 'B')]},
+            {'output_file_name': self.output('dict'), 'histograms': {'A': self.histograms[0], 'C': self.histograms[2]},
+             'log_scale': True},
+            {'output_file_name': self.output('styled'), 'histograms': [
+                (self.histograms[1], 'B', lambda histogram: histogram.SetLineColor(2)), (self.histograms[2], 'C')]},
+        ])
+
+        self.assertEqual([result.output_file_name for result in results],
+                         [self.output('list'), self.output('dict'), self.output('styled')])
+        self.assertTrue(all([result.success for result in results]))
+        for result in results:
+            self.assertTrue(os.path.exists(result.output_file_name + '.pdf'))
+        # the histograms added before are restored
+        self.assertEqual(list(self.ratio_histogram.histograms.values()), [registered])
+
+    def test_failing_job(self):
+        results = self.ratio_histogram.plot_many([
+            {'output_file_name': self.output('broken'), 'histograms': [(self.histograms[0], 'A')],
+             'unknown_argument': True},
+            {'output_file_name': self.output('fine'), 'histograms': [(self.histograms[0], 'A'),
+                                                                     (self.histograms[1], 'B')]},
+        ])
+
+        self.assertEqual([result.success for result in results], [False, True])
+        self.assertTrue('unknown_argument' in results[0].error)
+        self.assertTrue(os.path.exists(self.output('fine') + '.pdf'))
+
+    def test_canvas_name(self):
+        self.ratio_histogram.options['safe_to_root_file'] = True
+        results = self.ratio_histogram.plot_many([
+            {'output_file_name': self.output('first'), 'histograms': [(self.histograms[0], 'A'),
+                                                                      (self.histograms[1], 'B')],
+             'name_of_canvas': 'first_canvas'},
+            {'output_file_name': self.output('second'), 'histograms': [(self.histograms[1], 'B'),
+                                                                       (self.histograms[2], 'C')],
+             'name_of_canvas': 'second_canvas'},
+        ])
+
+        self.assertTrue(all([result.success for result in results]))
+        root_file = ROOT._files[self.root_file_name]
+        self.assertTrue('first_canvas' in root_file.GetDirectory('first').GetListOfKeys())
+        self.assertTrue('second_canvas' in root_file.GetDirectory('second').GetListOfKeys())
+
+
+if __name__ == '__main__':
+    unittest.main()
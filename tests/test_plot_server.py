@@ -0,0 +1,119 @@
+__author__ = 'Christopher Bock'
+
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+from PlotServer import PlotClient, PlotServer, decode_histogram, encode_histogram
+
+
+class PlotServerTest(unittest.TestCase):
+    """
+    Plot requests sent to the server on a Unix domain socket and rendered by its workers.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, 'plots.sock')
+
+        generator = random.Random(10)
+        edges = [0.5 * i for i in range(21)]
+        self.histograms = [make_histogram(ROOT, 'h%i' % i, edges, [generator.gauss(5., 2.) for j in range(200)])
+                           for i in range(2)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def output(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_encode_histogram(self):
+        self.histograms[0].SetLineColor(4)
+        encoded = json.loads(json.dumps(encode_histogram(self.histograms[0], 'Reference')))
+        histogram, name_in_legend = decode_histogram(encoded)
+
+        self.assertEqual(name_in_legend, 'Reference')
+        self.assertTrue(isinstance(histogram, ArrayHistogram))
+        self.assertEqual(histogram.GetNbinsX(), 20)
+        self.assertEqual([histogram.GetBinContent(i) for i in range(22)],
+                         [self.histograms[0].GetBinContent(i) for i in range(22)])
+        self.assertEqual(histogram.GetLineColor(), 4)
+
+    def test_invalid_requests(self):
+        server = PlotServer(self.socket_path, NULL_LOGGER, n_processes=1)
+        self.assertFalse(server.handle_request('{not json')['success'])
+        self.assertFalse(server.handle_request('[1, 2]')['success'])
+        self.assertEqual(server.handle_request('{"command": "restart"}')['error'], 'Unknown command restart')
+
+    def test_stale_socket(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)
+        stale.close()
+
+        server = PlotServer(self.socket_path, NULL_LOGGER, n_processes=1)
+        server._remove_stale_socket()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_existing_file(self):
+        with open(self.socket_path, 'w'):
+            pass
+
+        server = PlotServer(self.socket_path, NULL_LOGGER, n_processes=1)
+        self.assertRaises(IOError, server._remove_stale_socket)
+        self.assertTrue(os.path.isfile(self.socket_path))
+
+    def test_serve(self):
+        server = PlotServer(self.socket_path, NULL_LOGGER, n_processes=1, options={'output_file_type': 'png'},
+                            max_pending=1)
+        thread = server.start()
+        client = PlotClient(self.socket_path, timeout=60.)
+        try:
+            self.assertEqual(client.ping(), {'success': True, 'pid': os.getpid()})
+            # a second server does not take over the socket of a running one
+            self.assertRaises(IOError, PlotServer(self.socket_path, NULL_LOGGER, n_processes=1)._remove_stale_socket)
+
+            result = client.plot(self.output('single'), [(self.histograms[0], 'A'), (self.histograms[1], 'B')],
+                                 log_scale=True)
+            self.assertTrue(result['success'], result['error'])
+            self.assertEqual(result['output_files'], [self.output('single.png')])
+            self.assertTrue(os.path.exists(self.output('single.png')))
+
+            results = client.plot_many([
+                {'output_file_name': self.output('first'), 'histograms': {'A': self.histograms[0],
+                                                                          'B': self.histograms[1]},
+                 'output_file_types': 'pdf'},
+                {'output_file_name': self.output('invalid'), 'histograms': [(self.histograms[0], 'A')],
+                 'unknown_argument': True},
+                {'output_file_name': self.output('second'), 'histograms': [(self.histograms[0], 'A'),
+                                                                           (self.histograms[1], 'B')],
+                 'ratio_map': {1: 0}},
+            ])
+            self.assertEqual([result['success'] for result in results], [True, False, True])
+            self.assertEqual([result['output_file_name'] for result in results],
+                             [self.output('first'), self.output('invalid'), self.output('second')])
+            self.assertTrue(os.path.exists(self.output('first.pdf')))
+            self.assertTrue(os.path.exists(self.output('second.png')))
+
+            status = client.status()
+            self.assertEqual((status['n_plots'], status['n_failed']), (4, 1))
+
+            self.assertTrue(client.shutdown()['success'])
+        finally:
+            client.close()
+            server.shutdown()
+            thread.join(60.)
+
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
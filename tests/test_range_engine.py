@@ -0,0 +1,67 @@
+__author__ = 'Christopher Bock'
+
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+from RangeEngine import RangeEngine
+
+
+class RangeEngineTest(unittest.TestCase):
+    """
+    Minimum and maximum of the bins shown on the x axis.
+    """
+
+    def setUp(self):
+        # bin contents 1, 10, 2, 3, 0.5 plus under- and overflow
+        self.histogram = make_histogram(ROOT, 'peaked', [0., 1., 2., 3., 4., 5.], [-1., 0.5, 1.5, 2.5, 3.5, 4.5, 9.],
+                                        [50., 1., 10., 2., 3., 0.5, 100.])
+        self.range_engine = RangeEngine(NULL_LOGGER)
+
+    def assert_range(self, histogram, minimum, maximum):
+        histogram_range = self.range_engine.compute([histogram])
+        self.assertAlmostEqual(histogram_range.minimum, minimum)
+        self.assertAlmostEqual(histogram_range.maximum, maximum)
+        self.assertEqual(RangeEngine._scan_bins(histogram, RangeEngine._get_visible_bins(histogram))[:2],
+                         (histogram_range.minimum, histogram_range.maximum))
+
+    def test_all_bins(self):
+        self.assert_range(self.histogram, 0.5, 10.)
+        self.assert_range(ArrayHistogram.from_root(self.histogram), 0.5, 10.)
+
+    def test_root_axis_range(self):
+        self.histogram.GetXaxis().SetRange(3, 4)
+        self.assert_range(self.histogram, 2., 3.)
+
+        self.histogram.GetXaxis().SetRangeUser(2.5, 5.)
+        self.assert_range(self.histogram, 0.5, 3.)
+
+    def test_array_histogram_range(self):
+        histogram = ArrayHistogram.from_root(self.histogram)
+        self.assert_range(histogram, 0.5, 10.)
+
+        # the cached range of the histogram is not used once the range shown changes
+        histogram.GetXaxis().SetRange(3, 4)
+        self.assert_range(histogram, 2., 3.)
+
+        histogram.GetXaxis().SetRangeUser(2.5, 5.)
+        self.assertEqual((histogram.GetXaxis().GetFirst(), histogram.GetXaxis().GetLast()), (3, 5))
+        self.assert_range(histogram, 0.5, 3.)
+
+        # ranges ending on a bin edge do not include the next bin
+        histogram.GetXaxis().SetRangeUser(1., 3.)
+        self.assertEqual((histogram.GetXaxis().GetFirst(), histogram.GetXaxis().GetLast()), (2, 3))
+
+        histogram.GetXaxis().SetRange()
+        self.assert_range(histogram, 0.5, 10.)
+
+    def test_rebinned_range(self):
+        histogram = ArrayHistogram.from_root(self.histogram)
+        histogram.GetXaxis().SetRange(3, 4)
+        self.assert_range(histogram.rebinned(2), 5., 5.)
+
+
+if __name__ == '__main__':
+    unittest.main()
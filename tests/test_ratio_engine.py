@@ -0,0 +1,66 @@
+__author__ = 'Christopher Bock'
+
+import random
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+from RatioEngine import RatioEngine
+
+
+class RatioEngineTest(unittest.TestCase):
+    """
+    The ratios computed by the RatioEngine have to agree with cloning the numerator and calling TH1::Divide.
+    """
+
+    edges = [0., 1., 2., 3., 5., 8., 10.]
+
+    def setUp(self):
+        generator = random.Random(1)
+        self.histograms = []
+        for mean in (5., 4.5, 6.):
+            values = [generator.gauss(mean, 3.) for i in range(500)]
+            weights = [generator.uniform(0.5, 1.5) for value in values]
+            self.histograms.append(make_histogram(ROOT, 'h%i' % len(self.histograms), self.edges, values, weights))
+        # empty bins in the denominator result in a ratio of zero
+        self.histograms[0].SetBinContent(2, 0.)
+        self.histograms[0].SetBinError(2, 0.)
+
+    def assert_matches_divide(self, pairs, ratios, errors):
+        for (numerator, denominator), ratio_row, error_row in zip(pairs, ratios, errors):
+            expected = self.histograms[numerator].Clone('expected')
+            expected.Divide(self.histograms[denominator])
+            for i in range(len(self.edges) + 1):
+                self.assertAlmostEqual(ratio_row[i], expected.GetBinContent(i), places=10)
+                self.assertAlmostEqual(error_row[i], expected.GetBinError(i), places=10)
+
+    def test_root_histograms(self):
+        engine = RatioEngine(NULL_LOGGER)
+        engine.load(self.histograms)
+        pairs, ratios, errors = engine.compute({1: 0, 2: 0})
+
+        self.assertEqual(sorted(pairs), [(1, 0), (2, 0)])
+        self.assert_matches_divide(pairs, ratios, errors)
+
+    def test_array_histograms(self):
+        engine = RatioEngine(NULL_LOGGER)
+        engine.load([ArrayHistogram.from_root(histogram) for histogram in self.histograms])
+        pairs, ratios, errors = engine.compute([(2, 1), (0, 2), (1, 5)])
+
+        # pairs referring to histograms which have not been loaded are skipped
+        self.assertEqual(pairs, [(2, 1), (0, 2)])
+        self.assert_matches_divide(pairs, ratios, errors)
+
+    def test_different_binning(self):
+        engine = RatioEngine(NULL_LOGGER)
+        other = make_histogram(ROOT, 'other', [0., 5., 10.], [1., 6.])
+        self.assertRaises(ValueError, engine.load, [self.histograms[0], other])
+
+    def test_compute_before_load(self):
+        self.assertRaises(ValueError, RatioEngine(NULL_LOGGER).compute, {1: 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+__author__ = 'Christopher Bock'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from environment import NULL_LOGGER, RecordingLogger, make_histogram
+
+import ROOT
+from ArrayHistogram import ArrayHistogram
+from RatioHistogram import RatioHistogram
+from RenderCache import RenderCache
+
+
+class RenderCacheTest(unittest.TestCase):
+    """
+    Plots are rendered again whenever anything shown in them changes, and only then.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest_file_name = os.path.join(self.directory, 'manifest.json')
+        self.output_file_name = os.path.join(self.directory, 'plot')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_histograms(self):
+        generator = random.Random(3)
+        edges = [0.5 * i for i in range(21)]
+        return [make_histogram(ROOT, name, edges, [generator.gauss(5., 2.) for i in range(300)])
+                for name in ('reference', 'candidate')]
+
+    def plot(self, modify=None, **options):
+        """
+        Plots two histograms, after calling modify with the first one, and returns whether the plot was up to date.
+        """
+        ratio_histogram = RatioHistogram(log_level='ERROR')
+        ratio_histogram.render_cache = RenderCache(self.manifest_file_name, NULL_LOGGER)
+        ratio_histogram.options['root_output_file'] = os.path.join(self.directory, 'plots.root')
+        for name, value in options.items():
+            ratio_histogram.options[name] = value
+
+        reference, candidate = self.make_histograms()
+        if modify is not None:
+            reference = modify(reference) or reference
+        ratio_histogram.add_histogram(reference, 'Reference')
+        ratio_histogram.add_histogram(candidate, 'Candidate')
+        self.assertTrue(ratio_histogram.plot(self.output_file_name))
+
+        return ratio_histogram.render_cache.hits == 1
+
+    def assert_invalidates(self, modify):
+        self.plot()
+        self.assertTrue(self.plot())
+        self.assertFalse(self.plot(modify))
+        self.assertTrue(self.plot(modify))
+
+    def test_unchanged(self):
+        self.assertFalse(self.plot())
+        self.assertTrue(self.plot())
+        self.assertTrue(os.path.exists(self.manifest_file_name))
+
+    def test_summary(self):
+        self.plot()
+        logger = RecordingLogger()
+        ratio_histogram = RatioHistogram(NULL_LOGGER)
+        ratio_histogram.render_cache = RenderCache(self.manifest_file_name, logger)
+        ratio_histogram.options['root_output_file'] = os.path.join(self.directory, 'plots.root')
+        ratio_histogram.add_histograms(list(zip(self.make_histograms(), ['Reference', 'Candidate'])))
+
+        self.assertTrue(ratio_histogram.plot(self.output_file_name))
+        self.assertEqual(logger.messages, [('DEBUG', 'Render cache: 1 hits, 0 misses (100.0% hit rate).')])
+
+    def test_missing_output_file(self):
+        self.plot()
+        os.remove(self.output_file_name + '.pdf')
+        self.assertFalse(self.plot())
+
+    def test_bin_contents(self):
+        self.assert_invalidates(lambda histogram: histogram.SetBinContent(3, 100.))
+
+    def test_style(self):
+        self.assert_invalidates(lambda histogram: histogram.SetLineColor(2))
+
+    def test_options(self):
+        self.plot()
+        self.assertFalse(self.plot(ratio_maximum=3.))
+        self.assertTrue(self.plot(ratio_maximum=3.))
+
+    def test_axis_title(self):
+        self.assert_invalidates(lambda histogram: histogram.GetXaxis().SetTitle('m [GeV]'))
+
+    def test_axis_attributes(self):
+        self.assert_invalidates(lambda histogram: histogram.GetYaxis().SetTitleOffset(1.4))
+
+    def test_axis_range(self):
+        self.assert_invalidates(lambda histogram: histogram.GetXaxis().SetRange(3, 10))
+
+    def test_limits(self):
+        self.assert_invalidates(lambda histogram: histogram.SetMaximum(50.))
+        self.assert_invalidates(lambda histogram: histogram.SetMinimum(0.1))
+
+    def test_array_histogram_axis(self):
+        def convert(histogram):
+            histogram = ArrayHistogram.from_root(histogram)
+            histogram.x_title = 'm [GeV]'
+            return histogram
+
+        self.assert_invalidates(convert)
+
+    def test_root_file_output(self):
+        # the contents of the ROOT file are not tracked, such plots are always rendered
+        self.plot(safe_to_root_file=True)
+        del ROOT._files[os.path.join(self.directory, 'plots.root')]
+        self.assertFalse(self.plot(safe_to_root_file=True))
+        self.assertTrue(os.path.join(self.directory, 'plots.root') in ROOT._files)
+
+
+if __name__ == '__main__':
+    unittest.main()
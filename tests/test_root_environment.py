@@ -0,0 +1,78 @@
+__author__ = 'Christopher Bock'
+
+import sys
+import unittest
+
+from environment import NULL_LOGGER
+
+import ROOT
+from RootEnvironment import RootEnvironment
+
+
+class RootEnvironmentTest(unittest.TestCase):
+    """
+    Importing ROOT in the background and applying batch mode and style settings only when they change.
+    """
+
+    def setUp(self):
+        ROOT.gStyle.calls = []
+        ROOT.gROOT.SetBatch(False)
+
+    def test_preload(self):
+        environment = RootEnvironment(NULL_LOGGER)
+        environment.preload()
+        environment.wait()
+
+        self.assertTrue(environment.is_loaded())
+        self.assertTrue(environment.get_root() is ROOT)
+
+    def test_failed_import(self):
+        saved_root = sys.modules['ROOT']
+        # a None entry makes every import of the module fail
+        sys.modules['ROOT'] = None
+        try:
+            environment = RootEnvironment(NULL_LOGGER)
+            environment.preload()
+            environment.wait()
+            self.assertFalse(environment.is_loaded())
+            self.assertRaises(ImportError, environment.get_root)
+        finally:
+            sys.modules['ROOT'] = saved_root
+
+        # the import is tried again
+        self.assertTrue(environment.get_root() is ROOT)
+
+    def test_batch_mode(self):
+        environment = RootEnvironment(NULL_LOGGER)
+        environment.get_root(True)
+        self.assertTrue(ROOT.gROOT.IsBatch())
+
+        # not applied again, hence changes made to ROOT directly are kept
+        ROOT.gROOT.SetBatch(False)
+        environment.get_root(True)
+        self.assertFalse(ROOT.gROOT.IsBatch())
+        environment.get_root(False)
+        environment.get_root(True)
+        self.assertTrue(ROOT.gROOT.IsBatch())
+
+    def test_apply_style(self):
+        environment = RootEnvironment(NULL_LOGGER)
+        environment.apply_style(OptStat=0, OptTitle=1)
+        environment.apply_style(OptStat=0, OptTitle=0)
+        environment.apply_style(OptStat=0)
+
+        self.assertEqual(ROOT.gStyle.calls, [('SetOptStat', (0,)), ('SetOptTitle', (1,)), ('SetOptTitle', (0,))])
+
+    def test_import_module(self):
+        environment = RootEnvironment(NULL_LOGGER)
+        self.assertTrue(environment.import_module('unittest') is unittest)
+        self.assertEqual(list(environment.import_timings), [])
+
+        sys.modules.pop('colorsys', None)
+        colorsys = environment.import_module('colorsys')
+        self.assertTrue(colorsys is sys.modules['colorsys'])
+        self.assertEqual(list(environment.import_timings), ['colorsys'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+__author__ = 'Christopher Bock'
+
+import unittest
+
+from environment import NULL_LOGGER, make_histogram
+
+import ROOT
+from RootFilePool import LazyHistogram, RootFilePool
+
+
+class RootFilePoolTest(unittest.TestCase):
+    """
+    Files are opened once and closed least recently used first, histograms are read on first use.
+    """
+
+    file_names = ['pool_a.root', 'pool_b.root', 'pool_c.root']
+
+    def setUp(self):
+        for file_name in self.file_names:
+            root_file = ROOT.TFile(file_name, 'RECREATE')
+            directory = root_file.mkdir('plots')
+            directory.WriteTObject(make_histogram(ROOT, 'histogram', [0., 1., 2.], [0.5, 1.5, 1.5]))
+            root_file.Close()
+
+        self.file_pool = RootFilePool(NULL_LOGGER, max_open_files=2)
+
+    def tearDown(self):
+        for file_name in self.file_names:
+            ROOT._files.pop(file_name, None)
+
+    def test_least_recently_used(self):
+        open_count = ROOT.open_count[0]
+        first_file = self.file_pool.get_file('pool_a.root')
+        self.file_pool.get_file('pool_b.root')
+        self.assertTrue(self.file_pool.get_file('pool_a.root') is first_file)
+        self.assertEqual(ROOT.open_count[0], open_count + 2)
+
+        # pool_b.root has been used least recently
+        self.file_pool.get_file('pool_c.root')
+        self.assertEqual(list(self.file_pool._files), ['pool_a.root', 'pool_c.root'])
+        self.assertTrue(first_file.IsOpen())
+
+        self.file_pool.close_all()
+        self.assertFalse(first_file.IsOpen())
+        self.assertRaises(NameError, self.file_pool.get_file, 'missing.root')
+
+    def test_lazy_histogram(self):
+        histogram = LazyHistogram(self.file_pool, 'pool_a.root', 'histogram', 'plots', histogram_scale=-1)
+        histogram.defer(lambda loaded: loaded.SetLineColor(4))
+        self.assertEqual(histogram.GetName(), 'histogram')
+        self.assertFalse(histogram.is_loaded())
+
+        self.assertAlmostEqual(histogram.Integral(), 1.)
+        self.assertTrue(histogram.is_loaded())
+        self.assertEqual(histogram.GetLineColor(), 4)
+        self.assertRaises(NameError, self.file_pool.get_histogram, 'pool_a.root', 'missing', 'plots')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+__author__ = 'Christopher Bock'
+
+import random
+import unittest
+from collections import deque
+
+from environment import NULL_LOGGER, make_histogram
+
+import numpy
+import ROOT
+from StreamFiller import StreamFiller
+
+
+class StreamFillerTest(unittest.TestCase):
+    """
+    Filling with the StreamFiller has to put every value into the same bin as TH1::Fill.
+    """
+
+    def setUp(self):
+        generator = random.Random(2)
+        self.values = [generator.gauss(5., 4.) for i in range(5000)]
+        # values on bin edges and on the limits of the axis
+        self.values += [0., 1., 2.5, 7., 10., -1e-9, 10. - 1e-9]
+        self.weights = [generator.uniform(0., 2.) for value in self.values]
+
+    def assert_matches_fill(self, edges, weights=None):
+        expected = make_histogram(ROOT, 'expected', edges, self.values, weights)
+
+        filler = StreamFiller(edges, NULL_LOGGER, chunk_size=777)
+        n_values = filler.consume('h', iter(self.values), None if weights is None else iter(weights))
+        histogram = filler.get_histogram('h')
+
+        self.assertEqual(n_values, len(self.values))
+        self.assertEqual(histogram.GetEntries(), len(self.values))
+        for i in range(len(edges) + 1):
+            self.assertAlmostEqual(histogram.GetBinContent(i), expected.GetBinContent(i), places=9)
+            self.assertAlmostEqual(histogram.GetBinError(i), expected.GetBinError(i), places=9)
+
+    def test_uniform_binning(self):
+        self.assert_matches_fill([float(edge) for edge in range(11)])
+
+    def test_variable_binning(self):
+        self.assert_matches_fill([0., 0.5, 1., 2.5, 7., 10.])
+
+    def test_weights(self):
+        self.assert_matches_fill([float(edge) for edge in range(11)], self.weights)
+        self.assert_matches_fill([0., 0.5, 1., 2.5, 7., 10.], self.weights)
+
+    def test_nan_in_overflow(self):
+        filler = StreamFiller([0., 5., 10.], NULL_LOGGER)
+        filler.fill('h', [float('nan'), -1., 11., 5.])
+        self.assertEqual(list(filler.get_histogram('h').contents), [1., 0., 1., 2.])
+
+    def test_chunked_streams(self):
+        filler = StreamFiller([0., 5., 10.], NULL_LOGGER)
+        self.assertEqual(filler.consume('arrays', [numpy.arange(3.), numpy.array([6., 12.])], chunked=True), 5)
+        self.assertEqual(filler.consume('array', numpy.array([0., 1., 2., 6., 12.])), 5)
+        self.assertEqual(list(filler.get_histogram('arrays').contents), list(filler.get_histogram('array').contents))
+
+    def test_chunks_read_lazily(self):
+        read_chunks = []
+
+        def chunks(name):
+            for i in range(3):
+                read_chunks.append((name, i))
+                yield numpy.full(4, 2. * i)
+
+        filler = StreamFiller([0., 2., 4., 6.], NULL_LOGGER)
+        fill = filler.fill
+        filled_chunks = []
+
+        def checked_fill(name, values, weights=None):
+            # every chunk is filled before the next one is read
+            self.assertEqual(sorted(read_chunks), sorted([('values', i) for i in range(len(filled_chunks) + 1)] +
+                                                         [('weights', i) for i in range(len(filled_chunks) + 1)]))
+            filled_chunks.append(values)
+            fill(name, values, weights)
+        filler.fill = checked_fill
+
+        self.assertEqual(filler.consume('h', chunks('values'), chunks('weights'), chunked=True), 12)
+        self.assertEqual(list(filler.get_histogram('h').contents), [0., 0., 8., 16., 0.])
+
+    def test_array_with_weight_sequence(self):
+        filler = StreamFiller([0., 5., 10.], NULL_LOGGER, chunk_size=2)
+        filler.consume('h', numpy.array([1., 2., 6., 12.]), deque([1., 2., 3., 4.]))
+        self.assertEqual(list(filler.get_histogram('h').contents), [0., 3., 3., 4.])
+
+    def test_invalid_input(self):
+        self.assertRaises(ValueError, StreamFiller, [0.])
+        self.assertRaises(ValueError, StreamFiller, [0., 2., 1.])
+        self.assertRaises(ValueError, StreamFiller([0., 1.]).fill, 'h', [0.5, 0.6], [1.])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+__author__ = 'Christopher Bock'
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import environment
+
+from LoggingClass import LoggingClass
+from StructuredLogger import StructuredLogger
+
+
+class PlotterLike(LoggingClass):
+    pass
+
+
+class StructuredLoggerTest(unittest.TestCase):
+    """
+    JSON-lines records written to a stream, a rotated file or a unix socket.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_records(self):
+        stream = StringIO()
+        logger = StructuredLogger(stream=stream, level='INFO')
+        logging_class = PlotterLike(logger)
+
+        logging_class.print_log('Plotted %s', args=('ratio',), fields={'duration': 0.5})
+        logging_class.print_log('Dropped', 'DEBUG')
+        logger.print_log('Plain', 'WARNING')
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual((records[0]['level'], records[0]['source'], records[0]['message']),
+                         ('INFO', 'PlotterLike', 'Plotted ratio'))
+        self.assertEqual(records[0]['fields'], {'duration': 0.5})
+        self.assertEqual(records[1]['source'], None)
+        self.assertFalse('fields' in records[1])
+
+    def test_rotation(self):
+        file_name = os.path.join(self.directory, 'plots.jsonl')
+        logger = StructuredLogger(file_name, max_bytes=300, backup_count=2)
+        for i in range(20):
+            logger.log_record('message %i' % i)
+        logger.close()
+
+        self.assertTrue(os.path.exists(file_name + '.1'))
+        self.assertTrue(os.path.exists(file_name + '.2'))
+        self.assertFalse(os.path.exists(file_name + '.3'))
+        for name in (file_name, file_name + '.1', file_name + '.2'):
+            self.assertTrue(os.path.getsize(name) <= 300)
+        with open(file_name) as log_file:
+            self.assertEqual(json.loads(log_file.readlines()[-1])['message'], 'message 19')
+
+    def test_socket(self):
+        socket_path = os.path.join(self.directory, 'log.sock')
+        logger = StructuredLogger(socket_path=socket_path)
+        # nobody is listening yet, the record is dropped
+        logger.log_record('dropped')
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(socket_path)
+        server.listen(1)
+        try:
+            logger.log_record('received', 'ERROR')
+            connection = server.accept()[0]
+            logger.close()
+
+            data = b''
+            while not data.endswith(b'\n'):
+                data += connection.recv(4096)
+            connection.close()
+        finally:
+            server.close()
+
+        self.assertEqual(json.loads(data.decode('utf-8'))['message'], 'received')
+
+
+if __name__ == '__main__':
+    unittest.main()